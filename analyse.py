@@ -1,20 +1,47 @@
 """
 This file includes all functions for the analysis module, i.e.:
-(1) A list of all currently tracked habits,
+(1) A list of all currently tracked habits (also sorted and page by page),
 (2) A list of all habits with the same periodicity,
 (3) The longest run streak of all defined habits,
-(4) The longest run streak for a given habit
-
+(4) The longest run streak for a given habit as well as its streak profile (longest and current run streak and all
+runs),
+(5) The current run streak of all habits,
+(6) The habits whose current run streak breaks if they are not checked-off in the current period,
+(7) The completion rate of all habits within a window of days,
+(8) The distribution of check-offs per weekday,
+(9) A monthly check-off calendar (heatmap) for a given habit and
+(10) Point-in-time and range queries on the run streaks (run streak on a date, runs longer than N, longest runs within
+a range of days) and
+(11) A leaderboard of the k longest run streaks
+
+All run streaks are calculated by the streak kernel in periodicity which handles all types of schedules in one pass
+over the check-offs of a habit; itertools is imported to group the check-offs by habit. The run streaks of all habits
+are calculated from the check-offs read in batches of bounded size (see iter_streak_runs), so that the memory needed
+for reading does not grow with the length of the tracking history; iter_streak_runs also streams the runs themselves.
+The longest run streaks and the point-in-time and range queries read the run index (table "habit_runs") which is kept
+up to date with each check-off and holds one row per run. heapq is imported to select the k longest runs for the
+leaderboard without sorting all runs.
+The current run streak functions only read the most recent check-offs of each habit and therefore do not depend on
+the length of the tracking history. datetime is imported for the reference date of these functions.
+The completion rate, weekday distribution and monthly calendar only read the daily rollup table which holds one row
+per habit and day, independent of the number of check-offs. calendar is imported to lay out the monthly calendar.
 The database file is imported in order to refer back to the sqlite SELECT statements for the habit and tracking data.
-Pandas and NumPy are imported as a basis for manipulating the data and performing the respective analysis functions.
+All functions accept a storage backend instead of a database connection (see storage.reader).
+Pandas is imported as a basis for manipulating the data and performing the respective analysis functions.
 """
 
+import calendar
+import datetime
+import heapq
+import itertools
 import database
+import periodicity
+import storage
 import pandas as pd
-import numpy as np
 
 
 # Function to return a list of all currently tracked habits
+@storage.reader
 def all_habits(db):
 
     """
@@ -30,7 +57,30 @@ def all_habits(db):
     return data_all
 
 
+# Function to return a page of a sorted list of habits
+@storage.reader
+def habits_page(db, periodicity=None, sort="name", descending=False, limit=None, offset=0):
+
+    """
+    Shows a page of all habits (or of all habits with the selected periodicity) without reading the other habits, as
+    sorting and paging is done by the database.
+
+    :param db: initialized sqlite3 database connection
+    :param periodicity: optional periodicity of the habits to be displayed
+    :param sort: "name", "periodicity", "creation_date", "update_date" or "habit_id"
+    :param descending: whether the habits should be sorted in descending order
+    :param limit: optional maximum number of habits on the page
+    :param offset: number of habits before the page
+
+    :return: Generator of the name, task/specification, periodicity, creation datetime and last update datetime of the
+    habits on the page
+    """
+
+    return database.get_habit_page(db, periodicity, sort, descending, limit, offset)
+
+
 # Function to return a list of all habits with the same periodicity
+@storage.reader
 def all_habits_periodicity(db, periodicity):
 
     """
@@ -50,189 +100,174 @@ def all_habits_periodicity(db, periodicity):
     return df
 
 
-# Support functions and function to return the longest run streak of all defined habits
-def daily_streak_count(db):
+# Support function and function to return the longest run streak of all defined habits
+def run_rows(habit_id, name, schedule, days):
+
+    """
+    This function is a support function passing the check-off days of one habit once through the streak kernel (see
+    periodicity.StreakKernel) which groups them into the periods of the habit's schedule and collects the runs of
+    subsequent completed periods. A period is completed if the habit has been checked-off at least once (or on the
+    required number of days for habits scheduled N times per week) within it.
+
+    :param habit_id: habit_id of the habit
+    :param name: name of the habit
+    :param schedule: schedule (periodicity.Schedule) of the habit
+    :param days: check-off days of the habit as proleptic Gregorian ordinals in ascending order
+
+    :return: List of all runs of the habit showing the habit id, name, periodicity, first and last day of the run's
+    periods and the run streak in number of periods
+    """
+
+    return format_runs(habit_id, name, schedule, periodicity.streak_runs(days, schedule))
+
+
+def format_runs(habit_id, name, schedule, runs):
 
     """
-    This function is a support function for defining the longest run streak of all defined habits by
-    (1) creating a sorted list of all unique combinations of daily habits and respective check-off dates and
-    (2) calculating the difference in days between two subsequent check-off events so that
-    (3) a cumulated streak count can be calculated for the period where the difference between two subsequent dates
-    is equal to 1
+    This function is a support function turning the runs calculated by the streak kernel into rows (see run_rows).
 
-    :param db: initialized sqlite3 database connection
+    :param habit_id: habit_id of the habit
+    :param name: name of the habit
+    :param schedule: schedule (periodicity.Schedule) of the habit
+    :param runs: runs as tuples of the first and last period index of the run
 
-    :return: List of daily habits and check-off date history with the cumulated streak count. If no tracking data is
-    available for a daily habit, "No data" is returned to be respectively considered in the subsequent function to
-    avoid any unintended program errors and/or exit.
+    :return: List of the runs showing the habit id, name, periodicity, first and last day of the run's periods and the
+    run streak in number of periods
     """
 
-    data_tracking = pd.DataFrame(database.get_tracking_data(db))
-    if len(data_tracking) == 0:
-        return "No data"
-    else:
-        data_tracking.columns = ['habit_id', 'check_off_date']
-        data_habits = pd.DataFrame(database.get_habit_data(db))
-        data_habits.columns = ['habit_id', 'name', 'task', 'periodicity', 'creation_date', 'update_date']
-        data_all = pd.merge(data_tracking, data_habits[['habit_id', 'name', 'periodicity']], how="left",
-                            left_on='habit_id', right_on='habit_id')
-        tracking_daily = (data_all[data_all['periodicity'] == 'daily']).sort_values(by=['name', 'check_off_date'])
-        if len(tracking_daily) == 0:
-            return "No data"
-        else:
-            df = tracking_daily
-            df.drop_duplicates(subset=['name', 'check_off_date'], inplace=True)
-            df['check_off_date'] = df[['check_off_date']].apply(pd.to_datetime)
-            for _ in df.itertuples():
-                df['day_diff'] = df['check_off_date'].diff()
-                x = df.day_diff.ne('1 days')
-                df['streak_helper'] = df[~x].groupby(x.cumsum()).cumcount().add(1)
-                mask = (df['name'] != df.shift()['name']) | (df['day_diff'] != '1 days')
-                v1 = 1
-                v2 = df['streak_helper']+1
-                df['streak_cum_count'] = np.where(mask, v1, v2)
-            return df
-
-
-def weekly_streak_count(db):
-
-    """
-    This function is having the same purpose as the function "daily_streak_count" but is focusing on the weekly
-    habits, i.e. it
-    (1) creates a sorted list of all unique combinations of weekly habits and respective check-off weeks and
-    (2) calculates the difference between two subsequent check-off weeks so that
-    (3) a cumulated streak count can be calculated for the period where the difference between two subsequent weeks
-    is equal to 1
+    return [[habit_id, name, schedule.label(), datetime.date.fromordinal(schedule.period_start(start)).isoformat(),
+             datetime.date.fromordinal(schedule.period_end(end)).isoformat(), end - start + 1] for start, end in runs]
+
+
+@storage.reader
+def chunked_run_rows(db, chunk_rows=database.TRACKING_CHUNK_ROWS):
+
+    """
+    This function is a support function listing the run streaks of all habits from the check-offs read in batches of a
+    fixed number of rows (see database.get_tracking_day_chunks). The streak kernel of the current habit is carried over
+    from one batch to the next, so that a habit whose check-offs are split across batches is calculated in one pass as
+    well. The runs of a habit are yielded as soon as its last check-off has been read.
 
     :param db: initialized sqlite3 database connection
+    :param chunk_rows: maximum number of check-off rows held in memory at once
 
-    :return: List of weekly habits and check-off week history with the cumulated streak count. If no tracking data is
-    available for a weekly habit, "No data" is returned to be respectively considered in the subsequent function to
-    avoid any unintended program errors and/or exit.
+    :return: Generator of the runs (see run_rows) of all habits ordered by habit
     """
 
-    data_tracking = pd.DataFrame(database.get_tracking_data(db))
-    if len(data_tracking) == 0:
-        return "No data"
-    else:
-        data_tracking.columns = ['habit_id', 'check_off_date']
-        data_habits = pd.DataFrame(database.get_habit_data(db))
-        data_habits.columns = ['habit_id', 'name', 'task', 'periodicity', 'creation_date', 'update_date']
-        data_all = pd.merge(data_tracking, data_habits[['habit_id', 'name', 'periodicity']], how="left",
-                            left_on='habit_id', right_on='habit_id')
-        tracking_weekly = (data_all[data_all['periodicity'] == 'weekly']).sort_values(by=['name', 'check_off_date'])
-        if len(tracking_weekly) == 0:
-            return "No data"
-        else:
-            df = tracking_weekly
-            df['check_off_date'] = df[['check_off_date']].apply(pd.to_datetime)
-            df['check_off_week'] = df['check_off_date'].dt.isocalendar().week
-            df.drop_duplicates(subset=['name', 'check_off_week'], inplace=True)
-            for _ in df.itertuples():
-                mask_1 = (df['check_off_week'] == 1) & (df.shift()['check_off_week'] == 52)
-                v1_1 = 1
-                v2_1 = df['check_off_week'].diff()
-                df['week_diff'] = np.where(mask_1, v1_1, v2_1)
-                x = df.week_diff.ne(1)
-                df['streak_helper'] = df[~x].groupby(x.cumsum()).cumcount().add(1)
-                mask_2 = (df['name'] != df.shift()['name']) | (df['week_diff'] != 1)
-                v1_2 = 1
-                v2_2 = df['streak_helper']+1
-                df['streak_cum_count'] = np.where(mask_2, v1_2, v2_2)
-            return df
-
-
-def max_daily_streak(db):
-
-    """
-    This function is the second-layer support function for identifying the habit(s) with the maximum run streak over
-    all habits based on the output of the "daily_streak_count" function. As the same habit could appear several times
-    with the same longest run streak in cases where the max run streak has been achieved multiple times, the function
-    removes duplicates in the table.
+    schedules = database.get_habit_schedules(db)
+    habit_id = None
+    kernel = None
+    for chunk in database.get_tracking_day_chunks(db, chunk_rows):
+        for row_id, day in chunk:
+            if row_id != habit_id:
+                if kernel is not None:
+                    yield from format_runs(habit_id, schedules[habit_id][0], kernel.schedule, kernel.finish())
+                habit_id = row_id
+                kernel = periodicity.StreakKernel(schedules[habit_id][1]) if habit_id in schedules else None
+            if kernel is not None:
+                kernel.feed(day)
+    if kernel is not None:
+        yield from format_runs(habit_id, schedules[habit_id][0], kernel.schedule, kernel.finish())
+
+
+@storage.reader
+def iter_streak_runs(db, memory_budget=None):
+
+    """
+    This function lists the run streaks of all habits without holding them in memory: the check-offs are read ordered
+    by habit and date in batches within the memory budget (see chunked_run_rows) and the runs of a habit are yielded
+    as soon as its last check-off has been read. Besides one batch of check-offs, only the runs of the current habit
+    are held in memory, so that the consumer decides how many runs are kept.
 
     :param db: initialized sqlite3 database connection
+    :param memory_budget: optional memory in bytes the batches of check-offs may take, by default batches of
+    database.TRACKING_CHUNK_ROWS rows are read
 
-    :return: Daily habit with the longest run streak. If more than one habit has the same maximum run streak, all
-    respective habits are displayed. Based on the "daily_streak_count" function, "No data" is carried along to be
-    respectively considered in the subsequent function to avoid any unintended program errors and/or exit.
+    :return: Generator of the runs showing the habit id, name, periodicity, first and last day of the run's periods
+    and the run streak in number of periods, ordered by habit
     """
 
-    data_all = daily_streak_count(db)
-    if str(data_all) == "No data":
-        return "No data"
-    else:
-        df = pd.DataFrame(data_all)
-        data_max = df['streak_cum_count'].max()
-        df = df.loc[df['streak_cum_count'] == data_max]
-        df.drop(columns=['habit_id', 'check_off_date', 'day_diff', 'streak_helper'], inplace=True)
-        df.drop_duplicates(inplace=True)
-        return df
+    chunk_rows = database.TRACKING_CHUNK_ROWS
+    if memory_budget is not None:
+        chunk_rows = max(memory_budget // database.TRACKING_ROW_BYTES, 1)
+    yield from chunked_run_rows(db, chunk_rows)
 
 
-def max_weekly_streak(db):
+@storage.reader
+def streak_runs(db, memory_budget=None):
 
     """
-    This function is having the same purpose and functionality as the function "max_daily_streak" but related to the
-    weekly habits.
+    This function is a support function listing the run streaks of all habits in one table (see iter_streak_runs).
+    The memory budget only bounds the batches of check-offs read; the returned table holds all runs. Consumers which
+    must stay within the budget as a whole read the runs from iter_streak_runs instead.
 
     :param db: initialized sqlite3 database connection
+    :param memory_budget: optional memory in bytes the batches of check-offs may take, by default batches of
+    database.TRACKING_CHUNK_ROWS rows are read
 
-    :return: Weekly habit with the longest run streak. If more than one habit has the same maximum run streak, all
-    respective habits are displayed. Based on the "weekly_streak_count" function, "No data" is carried along to be
-    respectively considered in the subsequent function to avoid any unintended program errors and/or exit.
+    :return: List of all runs showing the habit id, name, periodicity, first and last day of the run's periods and the
+    run streak in number of periods. If no tracking data is available, "No data" is returned to be respectively
+    considered in the subsequent functions to avoid any unintended program errors and/or exit.
     """
 
-    data_all = weekly_streak_count(db)
-    if str(data_all) == "No data":
+    rows = list(iter_streak_runs(db, memory_budget))
+    if len(rows) == 0:
         return "No data"
-    else:
-        df = pd.DataFrame(data_all)
-        data_max = df['streak_cum_count'].max()
-        df = df.loc[df['streak_cum_count'] == data_max]
-        df.drop(columns=['habit_id', 'check_off_date', 'week_diff', 'check_off_week', 'streak_helper'], inplace=True)
-        df.drop_duplicates(inplace=True)
-        return df
+    return pd.DataFrame(rows, columns=['habit_id', 'name', 'periodicity', 'run_start', 'run_end', 'streak_cum_count'])
 
 
+@storage.reader
 def max_streak(db):
 
     """
-    Identifies the habit(s) with the maximum run streak over all habits and irrespective of their periodicity.
+    Identifies the habit(s) with the maximum run streak over all habits and irrespective of their periodicity. The
+    runs are read from the run index (table "habit_runs") so that the check-offs do not need to be read.
 
     :param db: initialized sqlite3 database connection
 
     :return: Habit and its periodicity with the longest run streak. If more than one habit has the same maximum run
-    streak, all respective habits are displayed. If there is no tracking data for neither the daily nor the weekly
-    habits, the message "There is currently no tracking data available" is printed out.
+    streak, all respective habits are displayed. If there is no tracking data for any habit, the message "There is
+    currently no tracking data available" is printed out.
     """
 
-    df1 = max_daily_streak(db)
-    df2 = max_weekly_streak(db)
-    if (str(df1) == "No data") & (str(df2) == "No data"):
+    data_max = database.get_habit_runs(db, limit=1)
+    if len(data_max) == 0:
         return "There is currently no tracking data available"
-    elif (str(df1) == "No data") & (str(df2) != "No data"):
-        df = pd.DataFrame(df2)
-        max_streak_count = df['streak_cum_count'].max()
-        df = df.loc[df['streak_cum_count'] == max_streak_count]
-        return df
-    elif (str(df1) != "No data") & (str(df2) == "No data"):
-        df = pd.DataFrame(df1)
-        max_streak_count = df['streak_cum_count'].max()
-        df = df.loc[df['streak_cum_count'] == max_streak_count]
-        return df
-    elif (str(df1) != "No data") & (str(df2) != "No data"):
-        frames = [df1, df2]
-        df = pd.concat(frames)
-        max_streak_count = df['streak_cum_count'].max()
-        df = df.loc[df['streak_cum_count'] == max_streak_count]
-        return df
+    df = pd.DataFrame(database.get_habit_runs(db, min_length=data_max[0][5]),
+                      columns=['habit_id', 'name', 'periodicity', 'run_start', 'run_end', 'streak_cum_count'])
+    return df[['name', 'periodicity', 'streak_cum_count']].drop_duplicates()
+
+
+# Functions to return the run streaks of a habit
+@storage.reader
+def streak_runs_habit(db, name):
+
+    """
+    Lists all run streaks of the selected habit. Only the check-offs of the selected habit are read, so that the cost
+    is proportional to the habit's own tracking history.
 
+    :param db: initialized sqlite3 database connection
+    :param name: name of the habit for which the run streaks should be displayed
+
+    :return: List of all runs of the habit showing the habit id, name, periodicity, first and last day of the run's
+    periods and the run streak in number of periods. If there is no tracking data available for the selected habit,
+    the message "There is no tracking data available for the habit x" is returned.
+    """
+
+    habit = database.get_habit_schedule(db, name)
+    rows = []
+    if habit is not None:
+        rows = run_rows(habit[0], name, habit[1], database.get_tracking_days_habit(db, habit[0]))
+    if len(rows) == 0:
+        return f"There is no tracking data available for the habit {name}"
+    return pd.DataFrame(rows, columns=['habit_id', 'name', 'periodicity', 'run_start', 'run_end', 'streak_cum_count'])
 
-# Function to return the longest run streak of a habit
+
+@storage.reader
 def max_streak_habit(db, name):
 
     """
-    Identifies the maximum run streak of the selected habit.
+    Identifies the maximum run streak of the selected habit based on the run index (table "habit_runs").
 
     :param db: initialized sqlite3 database connection
     :param name: name of the habit for which the maximum run streak should be displayed
@@ -241,27 +276,362 @@ def max_streak_habit(db, name):
     for the selected habit, the message "There is no tracking data available for the habit x" is printed out.
     """
 
-    habit_name_id = int("".join(str(x) for x in
-                                list(map(lambda x: x[0],
-                                         (filter(lambda y: y[1] == name, database.get_habit_data(db)))))))
-    list_tracking_ids = list(map(lambda x: x[0], database.get_tracking_data(db)))
-    if habit_name_id not in list_tracking_ids:
+    habit = database.get_habit_schedule(db, name)
+    data = [] if habit is None else database.get_habit_runs(db, habit_id=habit[0], limit=1)
+    if len(data) == 0:
         return f"There is no tracking data available for the habit {name}"
-    else:
-        data_all = database.get_habit_data(db)
-        data_filtered = list(filter(lambda x: x[1] == name, data_all))
-        if 'daily' in str(data_filtered):
-            df = pd.DataFrame(daily_streak_count(db))
-            df = df.loc[df['name'] == name]
-            df.drop(columns=['habit_id', 'check_off_date', 'day_diff', 'streak_helper'], inplace=True)
-            max_streak_count = df['streak_cum_count'].max()
-            df = df.loc[df['streak_cum_count'] == max_streak_count]
-            return df
-        else:
-            df = pd.DataFrame(weekly_streak_count(db))
-            df = df.loc[df['name'] == name]
-            df.drop(columns=['habit_id', 'check_off_date', 'check_off_week', 'week_diff', 'streak_helper'],
-                    inplace=True)
-            max_streak_count = df['streak_cum_count'].max()
-            df = df.loc[df['streak_cum_count'] == max_streak_count]
-            return df
+    return pd.DataFrame([[name, data[0][2], data[0][5]]], columns=['name', 'periodicity', 'streak_cum_count'])
+
+
+@storage.reader
+def streak_profile(db, name, as_of=None):
+
+    """
+    Shows the streak profile of the selected habit, i.e. its longest and current run streak, whether the current run
+    streak is at risk and the number of runs. Only the check-offs of the selected habit are read.
+
+    :param db: initialized sqlite3 database connection
+    :param name: name of the habit for which the streak profile should be displayed
+    :param as_of: reference date (datetime.date) of the current run streak, by default today
+
+    :return: Selected habit showing the name, periodicity, longest run streak, current run streak, whether the current
+    run streak is at risk, the last day of the current period and the number of runs. If there is no tracking data
+    available for the selected habit, the message "There is no tracking data available for the habit x" is returned.
+    """
+
+    if as_of is None:
+        as_of = datetime.date.today()
+    elif isinstance(as_of, datetime.datetime):
+        as_of = as_of.date()
+    df = streak_runs_habit(db, name)
+    if str(df) == f"There is no tracking data available for the habit {name}":
+        return df
+    habit_id, schedule = database.get_habit_schedule(db, name)
+    current = current_streak_habit(db, habit_id, schedule, as_of) or (0, False, None)
+    return pd.DataFrame([[name, schedule.label(), df['streak_cum_count'].max(), *current, len(df)]],
+                        columns=['name', 'periodicity', 'longest_streak', 'current_streak', 'at_risk', 'deadline',
+                                 'runs'])
+
+
+# Support function and functions to return the current run streaks and the habits at risk
+@storage.reader
+def current_streak_habit(db, habit_id, schedule, as_of):
+
+    """
+    This function is a support function calculating the current run streak of one habit by walking its check-offs
+    from the latest one backwards until the first missing period is found. Only the check-offs of the current run
+    streak are read, independent of the length of the habit's history.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: habit_id of the habit
+    :param schedule: schedule (periodicity.Schedule) of the habit
+    :param as_of: reference date (datetime.date) for which the current run streak is calculated
+
+    :return: Tuple of the current run streak, whether the run streak breaks if the habit is not (sufficiently)
+    checked-off in the current period and the last day of the current period. The run streak is 0 if the habit has
+    been missed in the last completed period. None is returned if no tracking data is available for the habit.
+    """
+
+    as_of_day = as_of.toordinal()
+    today = schedule.bucket(as_of_day)
+    days = filter(lambda x: x <= as_of_day, database.get_recent_tracking_days(db, habit_id))
+    streak = 0
+    expected = today - 1
+    has_data = False
+    is_today_completed = False
+    for bucket, _, completed in periodicity.periods(days, schedule):
+        has_data = True
+        if bucket == today:
+            is_today_completed = completed
+            streak += int(completed)
+            continue
+        if bucket != expected or not completed:
+            break
+        streak += 1
+        expected -= 1
+    if not has_data:
+        return None
+    deadline = datetime.date.fromordinal(schedule.period_end(today)).isoformat()
+    return streak, streak > 0 and not is_today_completed, deadline
+
+
+@storage.reader
+def current_streaks(db, as_of=None):
+
+    """
+    Shows the current run streak of all habits, i.e. the number of subsequent periods up to the current period (or the
+    last completed period) in which the habit has been checked-off.
+
+    :param db: initialized sqlite3 database connection
+    :param as_of: reference date (datetime.date), by default today
+
+    :return: List of all habits with tracking data showing the name, periodicity, current run streak, whether the
+    habit still needs to be checked-off in the current period to keep the run streak and the last day of the current
+    period. If there is no tracking data available for any habit, the message "There is currently no tracking data
+    available" is returned.
+    """
+
+    if as_of is None:
+        as_of = datetime.date.today()
+    elif isinstance(as_of, datetime.datetime):
+        as_of = as_of.date()
+    rows = []
+    for habit_id, (name, schedule) in database.get_habit_schedules(db).items():
+        current = current_streak_habit(db, habit_id, schedule, as_of)
+        if current is not None:
+            rows.append([name, schedule.label(), *current])
+    if not rows:
+        return "There is currently no tracking data available"
+    return pd.DataFrame(rows, columns=['name', 'periodicity', 'current_streak', 'at_risk', 'deadline'])
+
+
+@storage.reader
+def habits_at_risk(db, as_of=None):
+
+    """
+    Identifies the habits with a running streak which have not yet been (sufficiently) checked-off in the current
+    period, i.e. whose run streak breaks at the end of the current period, e.g. today for daily habits or this week for
+    weekly habits.
+
+    :param db: initialized sqlite3 database connection
+    :param as_of: reference date (datetime.date), by default today
+
+    :return: List of the habits at risk showing the name, periodicity, current run streak and the last date on which
+    the habit can be checked-off to keep the run streak. If no habit is at risk, an empty list is returned.
+    """
+
+    df = current_streaks(db, as_of)
+    if str(df) == "There is currently no tracking data available":
+        return pd.DataFrame(columns=['name', 'periodicity', 'current_streak', 'deadline'])
+    return df.loc[df['at_risk']].drop(columns=['at_risk'])
+
+
+# Functions to return completion rates, weekday distributions and monthly calendars based on the rollup tables
+@storage.reader
+def completion_rate(db, start=None, end=None):
+
+    """
+    Shows for each habit the share of periods within the window in which the habit has been completed, e.g. the share
+    of days for daily habits or the share of weeks (Monday to Sunday) for weekly habits. All periods overlapping the
+    window are taken into account, including check-offs before the start of the window within its first period.
+
+    :param db: initialized sqlite3 database connection
+    :param start: first day of the window (datetime.date), by default 27 days before the end of the window
+    :param end: last day of the window (datetime.date), by default today
+
+    :return: List of all habits showing the name, periodicity, number of completed periods, number of periods in the
+    window and the completion rate in percent.
+    """
+
+    if end is None:
+        end = datetime.date.today()
+    if start is None:
+        start = end - datetime.timedelta(days=27)
+    schedules = database.get_habit_schedules(db)
+    first = min([x[1].period_start(x[1].bucket(start.toordinal())) for x in schedules.values()] + [start.toordinal()])
+    rollup = database.get_daily_rollup(db, datetime.date.fromordinal(first), end)
+    days = dict((habit_id, list(map(lambda x: datetime.date.fromisoformat(x[1]).toordinal(), rows)))
+                for habit_id, rows in itertools.groupby(rollup, key=lambda x: x[0]))
+    rows = []
+    for habit_id, (name, schedule) in schedules.items():
+        first_bucket = schedule.bucket(start.toordinal())
+        last_bucket = schedule.bucket(end.toordinal())
+        completed = len([x for x in periodicity.periods(days.get(habit_id, []), schedule)
+                         if x[2] and first_bucket <= x[0] <= last_bucket])
+        total = last_bucket - first_bucket + 1
+        rows.append([name, schedule.label(), completed, total, round(100 * completed / total, 1)])
+    return pd.DataFrame(rows, columns=['name', 'periodicity', 'completed', 'periods', 'completion_rate'])
+
+
+@storage.reader
+def weekday_distribution(db):
+
+    """
+    Shows for each habit how many check-offs have been made on each weekday.
+
+    :param db: initialized sqlite3 database connection
+
+    :return: Table with one row per habit (name) and one column per weekday (Mon to Sun) showing the number of
+    check-offs. Habits without tracking data are shown with 0 check-offs.
+    """
+
+    weekdays = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    names = dict((x[0], x[1]) for x in database.get_habit_data(db))
+    df = pd.DataFrame(0, index=list(names.values()), columns=weekdays)
+    for habit_id, weekday, count in database.get_weekday_rollup(db):
+        if habit_id in names:
+            df.loc[names[habit_id], weekdays[(weekday - 1) % 7]] = count
+    df.index.name = 'name'
+    return df
+
+
+@storage.reader
+def monthly_heatmap(db, name, year, month):
+
+    """
+    Shows a calendar of the given month with the number of check-offs of the selected habit on each day.
+
+    :param db: initialized sqlite3 database connection
+    :param name: name of the habit for which the calendar should be displayed
+    :param year: year of the month
+    :param month: month (1 to 12)
+
+    :return: Table with one row per week and one column per weekday (Mon to Sun) showing the number of check-offs on
+    each day of the month. Days outside of the month are left empty. If there is no habit with the name, the message
+    "There is no tracking data available for the habit x" is returned.
+    """
+
+    habit = database.get_habit_schedule(db, name)
+    if habit is None:
+        return f"There is no tracking data available for the habit {name}"
+    habit_id = habit[0]
+    first = datetime.date(year, month, 1)
+    last = datetime.date(year, month, calendar.monthrange(year, month)[1])
+    counts = dict((x[1], x[2]) for x in database.get_daily_rollup(db, first, last, habit_id))
+    rows = []
+    for week in calendar.monthcalendar(year, month):
+        rows.append(["" if day == 0 else counts.get(datetime.date(year, month, day).isoformat(), 0) for day in week])
+    return pd.DataFrame(rows, columns=['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
+
+
+# Functions to return run streaks based on the run index
+@storage.reader
+def streak_on_date(db, name, date):
+
+    """
+    Shows the run streak of the selected habit on a given date, i.e. the number of subsequent completed periods up to
+    and including the period of the date. The run is looked up in the run index (table "habit_runs").
+
+    :param db: initialized sqlite3 database connection
+    :param name: name of the habit
+    :param date: date (datetime.date) for which the run streak should be displayed
+
+    :return: Run streak on the given date in number of periods, 0 if the period of the date has not been completed
+    """
+
+    habit = database.get_habit_schedule(db, name)
+    if habit is None:
+        return 0
+    bucket = habit[1].bucket(date.toordinal())
+    run = database.get_habit_run_at(db, habit[0], bucket)
+    if run is None:
+        return 0
+    return bucket - run[0] + 1
+
+
+@storage.reader
+def runs_longer_than(db, length, name=None):
+
+    """
+    Lists all runs which are longer than the given number of periods, longest first.
+
+    :param db: initialized sqlite3 database connection
+    :param length: number of periods a run has to exceed
+    :param name: optional name of a habit to list its runs only
+
+    :return: List of runs showing the name, periodicity, first and last day of the run's periods and the run streak
+    """
+
+    habit_id = None
+    if name is not None:
+        habit = database.get_habit_schedule(db, name)
+        habit_id = habit[0] if habit is not None else -1
+    df = pd.DataFrame(database.get_habit_runs(db, habit_id=habit_id, min_length=length + 1),
+                      columns=['habit_id', 'name', 'periodicity', 'run_start', 'run_end', 'streak_cum_count'])
+    return df.drop(columns=['habit_id'])
+
+
+@storage.reader
+def top_runs(db, start, end, k=10):
+
+    """
+    Lists the k longest runs which overlap with the given range of days, longest first.
+
+    :param db: initialized sqlite3 database connection
+    :param start: first day of the range (datetime.date)
+    :param end: last day of the range (datetime.date)
+    :param k: maximum number of runs
+
+    :return: List of runs showing the name, periodicity, first and last day of the run's periods and the run streak
+    """
+
+    df = pd.DataFrame(database.get_habit_runs(db, start=start, end=end, limit=k),
+                      columns=['habit_id', 'name', 'periodicity', 'run_start', 'run_end', 'streak_cum_count'])
+    return df.drop(columns=['habit_id'])
+
+
+# Function to return a leaderboard of the longest run streaks
+def push_bounded(heap, item, size):
+
+    """
+    This function is a support function keeping the largest items in a heap of a bounded size.
+
+    :param heap: heap (list) of at most size items
+    :param item: new item
+    :param size: maximum number of items of the heap
+
+    :return: Item which is not (or no longer) part of the heap, None if the heap has not been full
+    """
+
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+        return None
+    if item > heap[0]:
+        return heapq.heapreplace(heap, item)
+    return item
+
+
+def descending(text):
+
+    """
+    This function is a support function turning a text into a key which orders texts in descending order, so that the
+    smallest item of a heap is the text which comes last in ascending order: the negated code points are followed by
+    a terminator larger than all of them, as a text comes before all texts starting with it.
+
+    :param text: text, e.g. the name of a habit
+
+    :return: Tuple of integers
+    """
+
+    return tuple(-ord(x) for x in text) + (1,)
+
+
+@storage.reader
+def top_streaks(db, k=10, periodicity=None, per_habit=True, ties=False):
+
+    """
+    Ranks the k longest run streaks, selected with a heap of at most k runs (plus a heap of at most k runs tied with
+    the last one) while the runs are read from the run index, i.e. without sorting all runs. Runs of the same length
+    are ranked by the habit's name (see descending) and by their first day.
+
+    :param db: initialized sqlite3 database connection
+    :param k: number of ranked run streaks
+    :param periodicity: optional periodicity of the habits to be ranked
+    :param per_habit: whether only the longest run of each habit is ranked (otherwise a habit can hold several ranks)
+    :param ties: whether up to k further runs as long as the k-th run are ranked as well
+
+    :return: List of runs ordered by rank showing the rank (runs of the same length share a rank), name, periodicity,
+    first and last day of the run's periods and the run streak. Runs of the same length are ordered by name and first
+    day. If there is no tracking data, the message "There is currently no tracking data available" is returned, for k
+    less than 1 an empty DataFrame.
+    """
+
+    if k <= 0:
+        return pd.DataFrame(columns=['rank', 'name', 'periodicity', 'run_start', 'run_end', 'streak_cum_count'])
+    heap = []
+    tied = []
+    for row in database.get_best_runs(db, periodicity, per_habit):
+        item = (row[5], descending(row[1]), -datetime.date.fromisoformat(row[3]).toordinal(), row)
+        dropped = push_bounded(heap, item, k)
+        if ties and dropped is not None and dropped[0] == heap[0][0]:
+            push_bounded(tied, dropped, k)
+    tied = [x for x in tied if heap and x[0] == heap[0][0]]
+    runs = [x[3] for x in sorted(heap + tied, reverse=True)]
+    if len(runs) == 0:
+        return "There is currently no tracking data available"
+    ranks = [1]
+    for index in range(1, len(runs)):
+        ranks.append(ranks[-1] if runs[index][5] == runs[index - 1][5] else index + 1)
+    df = pd.DataFrame(runs, columns=['habit_id', 'name', 'periodicity', 'run_start', 'run_end', 'streak_cum_count'])
+    df.insert(0, 'rank', ranks)
+    return df.drop(columns=['habit_id'])
@@ -0,0 +1,557 @@
+"""
+This file includes benchmarks for the storage and analysis functions of the Habit Tracker. The benchmarks are run on
+temporary database files and do not touch the main database:
+
+(1) Check-offs committed one by one (database.tracking_habit) compared to the buffered writer with group commits
+(2) Size of the database file and duration of the streak calculation with all check-offs in the tracking table, in
+    archive tables per year (database.archive_tracking_data) and in compressed blobs (database.compress_archive)
+(3) Duration of an online backup (database.backup_db) of a large database in one step and in small steps while
+    check-offs are stored by another connection
+(4) Time until the first row of the habit list is printed with tabulate and with the paged renderer (render.print_table)
+(5) Stress test of check-offs and new habits stored by several processes at once (busy timeout and retries of
+    database.retry_locked): throughput, time waited for the lock of other processes and lost writes
+(6) Duration of analyses read from the database file and from the in-memory read replica (replica.ReadReplica) and
+    the time check-offs stored by another connection at the same time are blocked
+(7) Peak memory (tracemalloc) and duration of the calculation of all streak runs with all check-offs read at once and
+    read in batches within a memory budget, with all runs collected (analyse.streak_runs) and streamed
+    (analyse.iter_streak_runs)
+(8) Throughput of the storage backends (storage.SQLiteStorage, storage.MemoryStorage and storage.LogStorage) for
+    single and bulk check-offs and for reading the check-offs, and the duration of the first streak calculation
+(9) Duration of storing many new habits one by one (Habit.store_habit) and at once (Habit.store_habits_many)
+
+Type "python benchmark.py" into your console to run all benchmarks.
+
+tempfile and os are imported for the temporary database files, time for measuring the durations, random for
+generating check-off histories, threading for storing check-offs during a backup and multiprocessing for the stress
+test. tracemalloc is imported for measuring the peak memory of the streak calculation.
+Tabulate supports the displaying of the results in a clean tabular structure.
+"""
+
+import datetime
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from tabulate import tabulate
+
+import itertools
+
+import analyse
+import database
+import render
+from habits import Habit
+from replica import ReadReplica
+from storage import SQLiteStorage, MemoryStorage, LogStorage
+from writer import BufferedWriter
+
+
+# Support function to create a temporary database with one habit
+def temporary_db(directory, name):
+
+    """
+    This function creates a database file with the habit and tracking table as well as one daily habit.
+
+    :param directory: directory of the database file
+    :param name: name of the database file
+
+    :return: path of the database file
+    """
+
+    path = os.path.join(directory, name)
+    db = database.get_db(path)
+    database.create_table_habit(db)
+    database.create_table_tracking(db)
+    database.add_habit_data(db, "Benchmark", "Check off as often as possible", "daily")
+    db.close()
+    return path
+
+
+# Benchmark (1)
+def benchmark_writer(n=2000):
+
+    """
+    Stores n check-offs once with one commit per check-off and once with the buffered writer.
+
+    :param n: number of check-offs
+
+    :return: List of the storage path, the mean and maximum time in milliseconds a producer is blocked per check-off,
+    the total time in seconds until all check-offs are committed and the throughput in check-offs per second
+    """
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        db = database.get_db(temporary_db(directory, "per_call.db"))
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(n):
+            t = time.perf_counter()
+            database.tracking_habit(db, 1, "2021-11-01 06:00")
+            latencies.append(time.perf_counter() - t)
+        total = time.perf_counter() - start
+        db.close()
+        results.append(["Commit per check-off", 1000 * sum(latencies) / n, 1000 * max(latencies), total, n / total])
+
+        writer = BufferedWriter(temporary_db(directory, "buffered.db"))
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(n):
+            t = time.perf_counter()
+            writer.tracking_habit(1, "2021-11-01 06:00")
+            latencies.append(time.perf_counter() - t)
+        writer.close()
+        total = time.perf_counter() - start
+        results.append([f"Buffered writer ({writer.commits} commits)", 1000 * sum(latencies) / n,
+                        1000 * max(latencies), total, n / total])
+    return results
+
+
+# Benchmark (2)
+def benchmark_archive(habits=10, years=5):
+
+    """
+    Stores a random check-off history of daily habits (a check-off on 80 % of the days) and measures the database
+    file and the calculation of all streak runs once all check-offs are stored in the tracking table, once they have
+    been moved to archive tables and once the archive has been compressed.
+
+    :param habits: number of habits
+    :param years: number of years of check-offs
+
+    :return: List of the storage, the size of the database file and of the check-offs (tables and indexes) in KB, the
+    bytes per check-off and the duration of the calculation of all streak runs in milliseconds
+    """
+
+    generator = random.Random(1)
+    first = datetime.date.today().toordinal() - 365 * years
+    checkoffs = [(habit_id, f"{datetime.date.fromordinal(day).isoformat()} {generator.randrange(24):02d}:"
+                            f"{generator.randrange(60):02d}")
+                 for habit_id in range(1, habits + 1) for day in range(first, first + 365 * years)
+                 if generator.random() < 0.8]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = temporary_db(directory, "archive.db")
+        db = database.get_db(path)
+        for habit_id in range(2, habits + 1):
+            database.add_habit_data(db, f"Benchmark {habit_id}", "Check off every day", "daily")
+        db.executemany("INSERT INTO tracking(habit_tracker_id, checkoff_date) VALUES(?, ?)", checkoffs)
+        database.rebuild_habit_runs(db)
+
+        def measure(storage):
+            db.execute("VACUUM")
+            start = time.perf_counter()
+            analyse.streak_runs(db)
+            duration = time.perf_counter() - start
+            size = db.execute("SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master "
+                              "WHERE tbl_name IN ('tracking', 'tracking_archive_blob') "
+                              "OR tbl_name GLOB 'tracking_archive_[0-9]*')").fetchone()[0]
+            results.append([storage, os.path.getsize(path) / 1024, size / 1024, size / len(checkoffs),
+                            1000 * duration])
+        measure("Tracking table")
+        database.archive_tracking_data(db, datetime.date.today())
+        measure("Archive tables per year")
+        database.compress_archive(db)
+        measure("Compressed blobs per habit and year")
+        db.close()
+    return results
+
+
+# Benchmark (3)
+def benchmark_backup(n=200000, interval=0.01):
+
+    """
+    Backs up a database with n check-offs while another connection stores a check-off every interval seconds, once
+    with all pages copied in one step and once in steps of 256 pages.
+
+    :param n: number of check-offs of the database
+    :param interval: time in seconds between two check-offs stored during the backup
+
+    :return: List of the backup mode, the size of the database in MB, the duration of the backup in seconds, the number
+    of restarts of the backup caused by stored check-offs, the number of check-offs stored during the backup and the
+    maximum time in milliseconds a check-off has been blocked
+    """
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = temporary_db(directory, "large.db")
+        db = database.get_db(path)
+        db.executemany("INSERT INTO tracking(habit_tracker_id, checkoff_date) VALUES(1, ?)",
+                       ([(datetime.datetime(2000, 1, 1) + datetime.timedelta(hours=x)).isoformat(" ", "minutes")]
+                        for x in range(n)))
+        db.commit()
+        for mode, pages, sleep in [("All pages in one step", -1, 0), ("256 pages per step", 256, 0.005)]:
+            stop = threading.Event()
+            latencies = []
+            copied = []
+
+            def store_checkoffs():
+                writer = database.get_db(path)
+                while not stop.is_set():
+                    t = time.perf_counter()
+                    database.tracking_habit(writer, 1, datetime.datetime.now().isoformat(" ", "minutes"))
+                    latencies.append(time.perf_counter() - t)
+                    time.sleep(interval)
+                writer.close()
+            thread = threading.Thread(target=store_checkoffs)
+            thread.start()
+            start = time.perf_counter()
+            database.backup_db(db, os.path.join(directory, "backup.db"), pages, sleep, lambda x, y: copied.append(x))
+            duration = time.perf_counter() - start
+            stored = len(latencies)
+            stop.set()
+            thread.join()
+            restarts = len([x for x, y in zip(copied, copied[1:]) if y < x])
+            results.append([mode, os.path.getsize(path) / 1024 ** 2, duration, restarts, stored,
+                            1000 * max(latencies, default=0)])
+        db.close()
+    return results
+
+
+# Benchmark (4)
+def benchmark_rendering(sizes=(1000, 10000, 50000)):
+
+    """
+    Lists databases with the given numbers of habits once by formatting the whole list with tabulate and once with the
+    paged renderer which stops after the first page.
+
+    :param sizes: numbers of habits
+
+    :return: List of the number of habits and the time in milliseconds until the first row is printed with tabulate and
+    with the paged renderer
+    """
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            db = database.get_db(os.path.join(directory, f"habits_{size}.db"))
+            database.create_table_habit(db)
+            db.executemany("INSERT INTO habit(name, task, periodicity, creation_date, update_date) "
+                           "VALUES(?, 'Benchmark', 'daily', '2021-11-01 06:00', '2021-11-01 06:00')",
+                           ([f"Habit {x:06d}"] for x in range(size)))
+            db.commit()
+            start = time.perf_counter()
+            tabulate([x[1:] for x in analyse.all_habits(db)], tablefmt='psql')
+            full = time.perf_counter() - start
+            start = time.perf_counter()
+            render.print_table(analyse.habits_page(db), ["Name", "Specification", "Periodicity", "Creation Time",
+                                                         "Last Update Date"], more=lambda: False, output=lambda x: x)
+            paged = time.perf_counter() - start
+            results.append([size, 1000 * full, 1000 * paged])
+            db.close()
+    return results
+
+
+# Benchmark (5)
+def stress_writes(path, worker, n, start, timeout):
+
+    """
+    This function is a support function run by each process of the stress test: from the given start time on, it
+    stores n writes as fast as possible, each tenth write a new habit and all others a check-off of the first habit.
+
+    :param path: path of the database file
+    :param worker: number of the process (part of the names of its habits)
+    :param n: number of writes
+    :param start: start time (time.time) shared by all processes
+    :param timeout: busy timeout of the connection in seconds
+
+    :return: Tuple of the durations in seconds of the committed writes and the number of failed writes
+    """
+
+    db = database.get_db(path, timeout)
+    latencies = []
+    failed = 0
+    time.sleep(max(start - time.time(), 0))
+    for i in range(n):
+        t = time.perf_counter()
+        try:
+            if i % 10 == 9:
+                database.add_habit_data(db, f"Stress {worker}-{i}", "Stored by the stress test", "daily")
+            else:
+                database.tracking_habit(db, 1, datetime.date.fromordinal(738000 + i).isoformat() + " 06:00")
+        except sqlite3.OperationalError:
+            failed += 1
+        else:
+            latencies.append(time.perf_counter() - t)
+    db.close()
+    return latencies, failed
+
+
+def benchmark_concurrency(processes=(1, 2, 4, 8), n=200, timeout=database.BUSY_TIMEOUT):
+
+    """
+    Stores n writes from each of the given numbers of processes at once. The time a write waited for the lock of other
+    processes is estimated as its duration beyond the mean duration of a write of a single process. Lost writes are
+    writes which have been committed without an error but are missing in the database afterwards.
+
+    :param processes: numbers of processes writing at once (the first one should be 1 for the estimate of lock wait)
+    :param n: number of writes per process
+    :param timeout: busy timeout of the connections in seconds
+
+    :return: List of the number of processes, writes, failed writes, lost writes, the throughput in writes per second,
+    the mean and maximum duration of a write and the mean lock wait per write in milliseconds
+    """
+
+    results = []
+    single = None
+    with tempfile.TemporaryDirectory() as directory:
+        for count in processes:
+            path = temporary_db(directory, f"stress_{count}.db")
+            start = time.time() + 0.5
+            with multiprocessing.Pool(count) as pool:
+                outcomes = pool.starmap(stress_writes, [(path, x, n, start, timeout) for x in range(count)])
+            total = time.time() - start
+            latencies = [x for y in outcomes for x in y[0]]
+            failed = sum(x[1] for x in outcomes)
+            db = database.get_db(path)
+            stored = db.execute("SELECT COUNT(*) FROM tracking").fetchone()[0] + \
+                db.execute("SELECT COUNT(*) FROM habit WHERE name LIKE 'Stress %'").fetchone()[0]
+            db.close()
+            mean = sum(latencies) / max(len(latencies), 1)
+            if single is None:
+                single = mean
+            results.append([count, count * n, failed, len(latencies) - stored, stored / total, 1000 * mean,
+                            1000 * max(latencies, default=0), 1000 * max(mean - single, 0)])
+    return results
+
+
+# Benchmark (6)
+def benchmark_replica(habits=20, years=3, repeat=20, interval=0.05):
+
+    """
+    Runs the longest run streaks, the current run streaks and the completion rates of all habits on a random check-off
+    history, once on the database file and once on the read replica, while another connection stores a check-off every
+    interval seconds. The replica is refreshed before each run if check-offs have been stored in the meantime.
+
+    :param habits: number of daily habits
+    :param years: number of years of check-offs
+    :param repeat: number of runs of the analyses
+    :param interval: time in seconds between two check-offs stored during the analyses
+
+    :return: List of the reading connection, the mean duration of the analyses in milliseconds (including the refresh
+    of the replica), the maximum time in milliseconds a check-off has been blocked and the number of full and
+    incremental refreshes
+    """
+
+    generator = random.Random(1)
+    first = datetime.date.today().toordinal() - 365 * years
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = temporary_db(directory, "replica.db")
+        db = database.get_db(path)
+        for habit_id in range(2, habits + 1):
+            database.add_habit_data(db, f"Benchmark {habit_id}", "Check off every day", "daily")
+        for habit_id in range(1, habits + 1):
+            for day in range(first, first + 365 * years):
+                if generator.random() < 0.8:
+                    database.tracking_habit(db, habit_id, datetime.date.fromordinal(day).isoformat() + " 06:00",
+                                            commit=False)
+        db.commit()
+        read_replica = ReadReplica(path)
+        for mode, read in [("Database file", lambda: db), ("Read replica", read_replica.read)]:
+            stop = threading.Event()
+            latencies = []
+
+            def store_checkoffs():
+                writer = database.get_db(path)
+                while not stop.is_set():
+                    t = time.perf_counter()
+                    database.tracking_habit(writer, 1, datetime.datetime.now().isoformat(" ", "minutes"))
+                    latencies.append(time.perf_counter() - t)
+                    time.sleep(interval)
+                writer.close()
+            thread = threading.Thread(target=store_checkoffs)
+            thread.start()
+            durations = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                reader = read()
+                analyse.max_streak(reader)
+                analyse.current_streaks(reader)
+                analyse.completion_rate(reader)
+                durations.append(time.perf_counter() - start)
+            stop.set()
+            thread.join()
+            refreshes = f"{read_replica.full_refreshes} / {read_replica.incremental_refreshes}" \
+                if mode == "Read replica" else ""
+            results.append([mode, 1000 * sum(durations) / repeat, 1000 * max(latencies, default=0), refreshes])
+        read_replica.close()
+        db.close()
+    return results
+
+# Benchmark (7)
+def benchmark_memory(habits=20, years=10, budgets=(64 * 1024, 1024 * 1024, 16 * 1024 * 1024)):
+
+    """
+    Calculates all streak runs of daily habits on a random check-off history (a check-off on 80 % of the days), once
+    with all check-offs read into memory at once and for each memory budget with the check-offs read in batches, once
+    collecting all runs in a table (analyse.streak_runs) and once streaming the runs to a consumer which compares them
+    one by one (analyse.iter_streak_runs). The peak memory allocated by Python is measured with tracemalloc (the page
+    cache of sqlite is not included).
+
+    :param habits: number of habits
+    :param years: number of years of check-offs
+    :param budgets: memory budgets in bytes of the batches of check-offs
+
+    :return: List of the reading mode, the memory budget in KB, the peak memory in KB, the peak memory in KB beyond the
+    memory still held by the returned runs, the duration in milliseconds and whether the runs equal the runs calculated
+    from all check-offs at once
+    """
+
+    generator = random.Random(1)
+    first = datetime.date.today().toordinal() - 365 * years
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = temporary_db(directory, "memory.db")
+        db = database.get_db(path)
+        for habit_id in range(2, habits + 1):
+            database.add_habit_data(db, f"Benchmark {habit_id}", "Check off every day", "daily")
+        db.executemany("INSERT INTO tracking(habit_tracker_id, checkoff_date) VALUES(?, ?)",
+                       ((habit_id, datetime.date.fromordinal(day).isoformat() + " 06:00")
+                        for habit_id in range(1, habits + 1) for day in range(first, first + 365 * years)
+                        if generator.random() < 0.8))
+        db.commit()
+
+        def all_at_once():
+            schedules = database.get_habit_schedules(db)
+            checkoffs = list(database.get_tracking_days(db))
+            return [row for habit_id, days in itertools.groupby(checkoffs, key=lambda x: x[0])
+                    for row in analyse.run_rows(habit_id, schedules[habit_id][0], schedules[habit_id][1],
+                                                [x[1] for x in days])]
+
+        def measure(mode, budget, function):
+            tracemalloc.start()
+            start = time.perf_counter()
+            rows = function()
+            duration = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if not isinstance(rows, bool):
+                rows = (rows if isinstance(rows, list) else rows.values.tolist()) == expected
+            results.append([mode, budget and budget / 1024, peak / 1024, (peak - current) / 1024, 1000 * duration,
+                            rows])
+
+        def streamed(budget):
+            pairs = itertools.zip_longest(analyse.iter_streak_runs(db, budget), expected)
+            return all(row == run for row, run in pairs)
+        expected = all_at_once()
+        measure("All check-offs at once", None, all_at_once)
+        for budget in budgets:
+            measure("Batches within memory budget", budget, lambda: analyse.streak_runs(db, budget))
+        for budget in budgets:
+            measure("Runs streamed within memory budget", budget, lambda: streamed(budget))
+        db.close()
+    return results
+
+
+# Benchmark (8)
+def benchmark_storage(habits=10, single=2000, bulk=100000):
+
+    """
+    Stores check-offs one by one and in bulk (Storage.add_checkoffs) with each storage backend, reads all check-offs
+    and calculates all streak runs from the backend.
+
+    :param habits: number of daily habits
+    :param single: number of check-offs stored one by one
+    :param bulk: number of check-offs stored at once
+
+    :return: List of the backend, the single, bulk and read check-offs per second and the duration of the calculation of
+    all streak runs in milliseconds (including copying the check-offs into the in-memory database)
+    """
+
+    first = datetime.date.today().toordinal() - bulk // habits - single
+    checkoffs = [(habit_id, datetime.date.fromordinal(first + day).isoformat() + " 06:00")
+                 for day in range(bulk // habits) for habit_id in range(1, habits + 1)]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        stores = [("SQLite", SQLiteStorage(database.get_db(os.path.join(directory, "storage.db")))),
+                  ("Memory", MemoryStorage()), ("Log file", LogStorage(os.path.join(directory, "storage.log")))]
+        for backend, store in stores:
+            for habit_id in range(1, habits + 1):
+                store.add_habit(f"Benchmark {habit_id}", "Check off every day", "daily")
+            start = time.perf_counter()
+            store.add_checkoffs(checkoffs)
+            bulk_duration = time.perf_counter() - start
+            start = time.perf_counter()
+            for day in range(single):
+                store.add_checkoff(day % habits + 1,
+                                   datetime.date.fromordinal(first + bulk // habits + day).isoformat() + " 07:00")
+            single_duration = time.perf_counter() - start
+            start = time.perf_counter()
+            count = sum(1 for _ in store.get_checkoffs())
+            read_duration = time.perf_counter() - start
+            start = time.perf_counter()
+            analyse.streak_runs(store)
+            results.append([backend, single / single_duration, len(checkoffs) / bulk_duration, count / read_duration,
+                            1000 * (time.perf_counter() - start)])
+            store.close()
+    return results
+
+
+# Benchmark (9)
+def benchmark_habits(sizes=(100, 1000, 5000)):
+
+    """
+    Stores new habits in an empty database, once one by one and once at once.
+
+    :param sizes: numbers of habits
+
+    :return: List of the number of habits and the duration in milliseconds of storing them one by one and at once
+    """
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            durations = []
+            for mode in ("single", "many"):
+                path = temporary_db(directory, f"habits_{mode}_{size}.db")
+                db = database.get_db(path)
+                habits = [Habit(f"Habit {x}", "Check off every day", "daily") for x in range(size)]
+                start = time.perf_counter()
+                if mode == "single":
+                    for habit in habits:
+                        habit.store_habit(db)
+                else:
+                    Habit.store_habits_many(db, habits)
+                durations.append(1000 * (time.perf_counter() - start))
+                db.close()
+            results.append([size] + durations)
+    return results
+
+
+if __name__ == '__main__':
+    print("(1) Storing 2000 check-offs")
+    print(tabulate(benchmark_writer(), headers=["Storage Path", "Mean Enqueue/Call (ms)", "Max Enqueue/Call (ms)",
+                                                "Total (s)", "Check-offs per Second"], tablefmt='psql',
+                   floatfmt=".3f"))
+    print("(2) Archiving 5 years of check-offs of 10 daily habits")
+    print(tabulate(benchmark_archive(), headers=["Storage", "File Size (KB)", "Check-offs (KB)", "Bytes per Check-off",
+                                                 "Streak Runs of all Habits (ms)"], tablefmt='psql', floatfmt=".1f"))
+    print("(3) Online backup of 200000 check-offs while a check-off is stored every 10 ms")
+    print(tabulate(benchmark_backup(), headers=["Backup Mode", "Size (MB)", "Duration (s)", "Restarts",
+                                                "Check-offs Stored", "Max Check-off Wait (ms)"], tablefmt='psql',
+                   floatfmt=".3f"))
+    print("(4) Listing all habits")
+    print(tabulate(benchmark_rendering(), headers=["Habits", "First Row with Tabulate (ms)",
+                                                   "First Row with Paged Renderer (ms)"], tablefmt='psql',
+                   floatfmt=".1f"))
+    print("(5) 200 writes per process from several processes at once")
+    print(tabulate(benchmark_concurrency(), headers=["Processes", "Writes", "Failed", "Lost", "Writes per Second",
+                                                     "Mean Write (ms)", "Max Write (ms)", "Mean Lock Wait (ms)"],
+                   tablefmt='psql', floatfmt=".1f"))
+    print("(6) Analyses of 3 years of check-offs of 20 daily habits while a check-off is stored every 50 ms")
+    print(tabulate(benchmark_replica(), headers=["Reading Connection", "Mean Analyses (ms)", "Max Check-off Wait (ms)",
+                                                 "Full / Incremental Refreshes"], tablefmt='psql', floatfmt=".1f"))
+    print("(7) Streak runs of 10 years of check-offs of 20 daily habits")
+    print(tabulate(benchmark_memory(), headers=["Reading Mode", "Memory Budget (KB)", "Peak Memory (KB)",
+                                                "Peak beyond Runs (KB)", "Duration (ms)", "Identical Runs"],
+                   tablefmt='psql', floatfmt=".1f"))
+    print("(8) Storage backends with 10 daily habits, 2000 single and 100000 bulk check-offs")
+    print(tabulate(benchmark_storage(), headers=["Backend", "Single Check-offs per Second",
+                                                 "Bulk Check-offs per Second", "Read Check-offs per Second",
+                                                 "First Streak Runs (ms)"], tablefmt='psql', floatfmt=".0f"))
+    print("(9) Storing new habits")
+    print(tabulate(benchmark_habits(), headers=["Habits", "One by One (ms)", "At Once (ms)"], tablefmt='psql',
+                   floatfmt=".1f"))
@@ -0,0 +1,189 @@
+"""
+This file implements the compact storage format of archived check-offs (see database.compress_archive).
+
+The check-offs of one habit within one year are stored as one blob. Each check-off consists of its day as proleptic
+Gregorian ordinal (see periodicity), its time as minutes after midnight and its number of check-offs (more than 1 only
+if the deduplication of check-offs is enabled). The check-offs are sorted by day and time and stored column by column:
+the first day, the differences between subsequent days, the minutes and the counts, each as unsigned 16 bit integers
+in little endian byte order. As the day differences are mostly 1 and the counts are mostly 1 as well, zlib compresses
+the columns to a fraction of their size. Blobs with a count above 65535 store the counts as unsigned 32 bit integers
+instead (format version 2), larger counts raise a ValueError.
+
+Days are decoded into plain integers only, so that they can be fed into the streak kernel (periodicity.StreakKernel)
+without creating date objects. The minutes and counts are only decoded if they are needed.
+
+The tracking ids of the check-offs are stored in a separate blob (see encode_ids) in the order of the sorted check-offs,
+so that deleted and changed compressed check-offs can still be recorded in the changelog by their ids.
+
+zlib is imported for the compression, struct and array for converting between integers and bytes, itertools for
+decoding the days from their differences and sys for the byte order of the platform.
+"""
+
+import array
+import itertools
+import struct
+import sys
+import zlib
+
+# Version of the format, stored as first byte of each blob, and the type codes of the counts of each version
+FORMAT_VERSION = 1
+WIDE_FORMAT_VERSION = 2
+COUNT_TYPES = {FORMAT_VERSION: "H", WIDE_FORMAT_VERSION: "I"}
+HEADER = struct.Struct("<BII")
+
+
+def to_bytes(values, typecode="H"):
+
+    """
+    This function is a support function converting integers into unsigned 16 (or 32) bit integers in little endian
+    byte order.
+
+    :param values: list of integers between 0 and 65535 (or 4294967295)
+    :param typecode: array type code of the integers, "I" for unsigned 32 bit integers
+
+    :return: bytes of the integers
+    """
+
+    column = array.array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def from_bytes(data, start, count, typecode="H"):
+
+    """
+    This function is a support function converting unsigned 16 (or 32) bit integers in little endian byte order into
+    integers.
+
+    :param data: decompressed blob
+    :param start: position of the first integer within the blob
+    :param count: number of integers
+    :param typecode: array type code of the integers, "I" for unsigned 32 bit integers
+
+    :return: array of the integers
+    """
+
+    column = array.array(typecode)
+    column.frombytes(data[start:start + column.itemsize * count])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def encode_checkoffs(checkoffs):
+
+    """
+    This function encodes the check-offs of one habit within one year.
+
+    :param checkoffs: iterable of tuples of day (proleptic Gregorian ordinal), minutes after midnight and number of
+    check-offs; the days of the check-offs must not span more than 65535 days
+
+    :return: compressed blob
+    """
+
+    checkoffs = sorted(checkoffs)
+    if not checkoffs:
+        return zlib.compress(HEADER.pack(FORMAT_VERSION, 0, 0), 9)
+    days = [x[0] for x in checkoffs]
+    deltas = [y - x for x, y in zip(days, days[1:])]
+    counts = [x[2] for x in checkoffs]
+    version = FORMAT_VERSION if max(counts) <= 65535 else WIDE_FORMAT_VERSION
+    try:
+        columns = to_bytes(counts, COUNT_TYPES[version])
+    except OverflowError:
+        raise ValueError(f"A check-off count of {max(counts)} cannot be archived") from None
+    data = HEADER.pack(version, len(checkoffs), days[0]) + to_bytes(deltas) + to_bytes([x[1] for x in checkoffs]) + \
+        columns
+    return zlib.compress(data, 9)
+
+
+def decode_header(blob):
+
+    """
+    This function is a support function decompressing a blob and reading its header.
+
+    :param blob: compressed blob (see encode_checkoffs)
+
+    :return: Tuple of the decompressed blob, the number of check-offs, the first day and the type code of the counts
+    """
+
+    data = zlib.decompress(blob)
+    version, count, first = HEADER.unpack_from(data)
+    if version not in COUNT_TYPES:
+        raise ValueError(f"Unknown format version {version} of archived check-offs")
+    return data, count, first, COUNT_TYPES[version]
+
+
+def decode_days(blob, reverse=False):
+
+    """
+    This function decodes the days of the check-offs of a blob only.
+
+    :param blob: compressed blob (see encode_checkoffs)
+    :param reverse: whether the days should be returned latest first
+
+    :return: Iterator of the check-off days as proleptic Gregorian ordinals in ascending (or descending) order
+    """
+
+    data, count, first, _ = decode_header(blob)
+    if count == 0:
+        return iter(())
+    days = itertools.accumulate(itertools.chain((first,), from_bytes(data, HEADER.size, count - 1)))
+    if reverse:
+        return reversed(list(days))
+    return days
+
+
+def decode_checkoffs(blob):
+
+    """
+    This function decodes all check-offs of a blob.
+
+    :param blob: compressed blob (see encode_checkoffs)
+
+    :return: Iterator of tuples of day (proleptic Gregorian ordinal), minutes after midnight and number of check-offs
+    in ascending order
+    """
+
+    data, count, first, typecode = decode_header(blob)
+    if count == 0:
+        return iter(())
+    days = itertools.accumulate(itertools.chain((first,), from_bytes(data, HEADER.size, count - 1)))
+    minutes = from_bytes(data, HEADER.size + 2 * (count - 1), count)
+    counts = from_bytes(data, HEADER.size + 2 * (2 * count - 1), count, typecode)
+    return zip(days, minutes, counts)
+
+
+def encode_ids(ids):
+
+    """
+    This function encodes the tracking ids of the check-offs of one blob as the differences between subsequent ids
+    (signed 64 bit integers in little endian byte order), which zlib compresses well as ids are mostly increasing.
+
+    :param ids: list of the tracking ids in the order of the sorted check-offs (see encode_checkoffs)
+
+    :return: compressed blob of the ids
+    """
+
+    column = array.array("q", [y - x for x, y in zip([0] + ids, ids)])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return zlib.compress(column.tobytes(), 9)
+
+
+def decode_ids(blob):
+
+    """
+    This function decodes the tracking ids of the check-offs of one blob.
+
+    :param blob: compressed blob of the ids (see encode_ids)
+
+    :return: List of the tracking ids in the order of the decoded check-offs (see decode_checkoffs)
+    """
+
+    column = array.array("q")
+    column.frombytes(zlib.decompress(blob))
+    if sys.byteorder == "big":
+        column.byteswap()
+    return list(itertools.accumulate(column))
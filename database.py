@@ -2,33 +2,266 @@
 This file includes all functions related to the storage, modification, deletion and extraction of data in the database.
 For this purpose, sqlite3 is imported as a database engine.
 The imported datetime module is used for the automatic storage of creation, update and check-off dates.
+The Schedule class is imported from periodicity to validate periodicities and store them as structured schedules,
+the ScheduleHistory class for habits whose periodicity has been modified; the streak kernel (streak_runs) is imported
+to (re-)build the run index of habits.
+Archived check-offs can be stored in the compact format implemented in compression; heapq and itertools are imported
+for reading them together with the check-offs stored in tables, pathlib for opening backup files read-only.
+As several processes can write to the same database file, write transactions are started with BEGIN IMMEDIATE and
+retried if the database stays locked (see retry_locked); functools, inspect, random and time are imported for the
+retries.
+Every inserted, updated and deleted habit and check-off is recorded in the table "changelog" by triggers (and for
+compressed check-offs by record_tracking_changes), so that systems mirroring the habits and check-offs can read only
+the changes since their last sync (see changes_since).
 """
 
 import sqlite3
 import datetime
+import functools
+import heapq
+import inspect
+import itertools
+import pathlib
+import random
+import time
+import compression
+from periodicity import Schedule, ScheduleHistory, streak_runs, day_ordinal
+
+
+# Time in seconds a connection waits for a lock held by another connection, number of retries of a write transaction
+# which still could not get the lock and the pause before the first retry (doubled per retry up to the maximum pause)
+BUSY_TIMEOUT = 5.0
+LOCK_RETRIES = 5
+LOCK_BACKOFF = 0.05
+LOCK_MAX_BACKOFF = 1.0
+
+# Number of check-off rows read per batch by the chunked readers (see get_tracking_day_chunks) and the approximate
+# memory in bytes one row (tuple of habit id and day) takes in a batch
+TRACKING_CHUNK_ROWS = 10000
+TRACKING_ROW_BYTES = 96
+
+
+# Statement creating the tracking table ({name}), whose tracking ids are never reused
+TRACKING_TABLE = """CREATE TABLE IF NOT EXISTS {name}(
+        tracking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        habit_tracker_id INTEGER,
+        checkoff_date DATETIME,
+        period_key TEXT,
+        checkoff_count INTEGER DEFAULT 1,
+        last_checkoff_date DATETIME,
+        FOREIGN KEY(habit_tracker_id) REFERENCES habit(habit_id))"""
 
 
 # Connecting to the database
-def get_db(name="main.db"):
+def get_db(name="main.db", timeout=BUSY_TIMEOUT):
 
     """
-    This function is used establish a connection to the database.
+    This function is used establish a connection to the database. Write transactions of the connection are started
+    with BEGIN IMMEDIATE, i.e. the write lock is taken with the first write of a transaction instead of when it is
+    committed, so that concurrent transactions wait for each other (busy timeout) instead of failing halfway.
 
     :param name: name of the database
+    :param timeout: time in seconds a statement waits for a lock held by another connection before "database is
+    locked" is raised
 
     :return: database
     """
 
-    db = sqlite3.connect(name)
+    db = sqlite3.connect(name, timeout=timeout, isolation_level="IMMEDIATE")
     return db
 
 
+def retry_locked(function):
+
+    """
+    This function is a decorator for the write functions: if the database is still locked by another connection after
+    the busy timeout, the write transaction is rolled back and retried after a pause which is doubled per retry (with
+    random jitter, at most LOCK_MAX_BACKOFF seconds). After LOCK_RETRIES retries, the sqlite3.OperationalError is
+    raised. Writes which are part of a transaction of the caller (commit=False, passed by keyword or position, or a
+    transaction already open) are not retried, as the rollback would discard the other writes of the caller as well.
+
+    :param function: write function taking the database connection as first argument
+
+    :return: Write function with retries
+    """
+
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(db, *args, **kwargs):
+        if db.in_transaction or not signature.bind(db, *args, **kwargs).arguments.get("commit", True):
+            return function(db, *args, **kwargs)
+        for retry in range(LOCK_RETRIES + 1):
+            try:
+                return function(db, *args, **kwargs)
+            except sqlite3.OperationalError as error:
+                db.rollback()
+                if retry == LOCK_RETRIES or not is_locked_error(error):
+                    raise
+                time.sleep(lock_backoff(retry))
+    return wrapper
+
+
+def lock_backoff(retry):
+
+    """
+    This function is a support function returning the pause before a retry of a write transaction which could not get
+    the database lock: LOCK_BACKOFF doubled per retry (at most LOCK_MAX_BACKOFF) with random jitter.
+
+    :param retry: number of the retry, starting with 0
+
+    :return: Pause in seconds
+    """
+
+    return min(LOCK_BACKOFF * 2 ** retry, LOCK_MAX_BACKOFF) * random.uniform(0.5, 1)
+
+
+def is_locked_error(error):
+
+    """
+    This function is a support function checking whether an error has been raised because the database was locked.
+
+    :param error: sqlite3.OperationalError
+
+    :return: True if the database was locked or busy
+    """
+
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+# Functions for backing up, restoring and verifying the database
+def backup_db(db, target, pages=256, sleep=0.005, progress=None):
+
+    """
+    This function copies the database into a backup file while it is in use (online backup, see
+    sqlite3.Connection.backup). The pages are copied in steps of the given number of pages; between two steps the
+    database is unlocked for the given time so that check-offs stored in the meantime are not stalled. If the database
+    is changed by another connection during the backup, the copying starts again, so the backup is always a consistent
+    snapshot; after three restarts, the remaining copy is done in one step (see copy_pages).
+
+    :param db: initialized sqlite3 database connection
+    :param target: name of the backup file (an existing file is overwritten)
+    :param pages: number of pages copied per step, -1 or 0 to copy all pages in one step
+    :param sleep: time in seconds between two steps
+    :param progress: optional function called after each step with the number of copied and the total number of pages
+
+    :return: Total number of pages of the backup
+    """
+
+    backup = sqlite3.connect(target)
+    try:
+        return copy_pages(db, backup, pages, sleep, progress)
+    finally:
+        backup.close()
+
+
+def restore_db(db, source, pages=256, sleep=0.005, progress=None):
+
+    """
+    This function replaces the content of the database by a backup file (see backup_db). The backup is verified before
+    it is restored.
+
+    :param db: initialized sqlite3 database connection
+    :param source: name of the backup file
+    :param pages: number of pages copied per step, -1 or 0 to copy all pages in one step
+    :param sleep: time in seconds between two steps
+    :param progress: optional function called after each step with the number of copied and the total number of pages
+
+    :return: Total number of pages of the restored database. A ValueError is raised if the backup is damaged.
+    """
+
+    problems = verify_db(source)
+    if problems:
+        raise ValueError(f"Backup {source} is damaged: {problems[0]}")
+    backup = sqlite3.connect(source)
+    try:
+        return copy_pages(backup, db, pages, sleep, progress)
+    finally:
+        backup.close()
+
+
+def copy_pages(source, target, pages, sleep, progress, max_restarts=3):
+
+    """
+    This function is a support function copying all pages of one open database connection into another one. Each time
+    the source is changed by another connection, the copying starts again; after the given number of restarts, the
+    remaining copy is done in one step so that frequent check-offs cannot delay the backup without end.
+
+    :param source: initialized sqlite3 database connection to be copied
+    :param target: initialized sqlite3 database connection to be overwritten
+    :param pages: number of pages copied per step
+    :param sleep: time in seconds between two steps
+    :param progress: optional function called after each step with the number of copied and the total number of pages
+    :param max_restarts: number of restarts before all pages are copied in one step
+
+    :return: Total number of pages
+    """
+
+    state = {"total": 0, "copied": 0, "restarts": 0}
+
+    def report(status, remaining, count):
+        state["total"] = count
+        if count - remaining < state["copied"]:
+            state["restarts"] += 1
+            if state["restarts"] > max_restarts:
+                raise BackupRestarted()
+        state["copied"] = count - remaining
+        if progress is not None:
+            progress(count - remaining, count)
+    target.commit()
+    try:
+        source.backup(target, pages=pages, progress=report, sleep=sleep)
+    except BackupRestarted:
+        state["copied"] = 0
+        source.backup(target, pages=-1, progress=report)
+    return state["total"]
+
+
+class BackupRestarted(Exception):
+
+    """
+    This exception is raised by copy_pages to stop a backup which has been restarted too often.
+    """
+
+
+def verify_db(name):
+
+    """
+    This function checks the integrity of a database file (PRAGMA integrity_check).
+
+    :param name: name of the database file
+
+    :return: List of the problems found, empty if the database is intact
+    """
+
+    try:
+        db = sqlite3.connect(pathlib.Path(name).resolve().as_uri() + "?mode=ro", uri=True)
+    except sqlite3.Error as error:
+        return [str(error)]
+    try:
+        rows = [x[0] for x in db.execute("PRAGMA integrity_check").fetchall()]
+    except sqlite3.DatabaseError as error:
+        rows = [str(error)]
+    finally:
+        db.close()
+    return [] if rows == ["ok"] else rows
+
+
 # Creating the main habit table
 def create_table_habit(db):
 
     """
     This function is used to create the habit table in which the id, name, task, periodicity as well as creation and
-    update date of each habit is stored.
+    update date of each habit is stored. Besides the textual periodicity, the schedule of each habit is stored in the
+    columns schedule_type, schedule_interval, schedule_days and schedule_anchor (see periodicity.Schedule); habit tables
+    of older databases are extended by them. The anchor is the first day of a period of habits scheduled every N days,
+    i.e. the day the habit has been created or its periodicity has been modified (NULL for other periodicities).
+    An index on the name allows looking up a single habit by its name, an index on periodicity and name listing the
+    habits of one periodicity in the order of their names.
+    Once the periodicity of a habit is modified, its former and new schedule are stored with the day from which on they
+    apply in the table "habit_schedule_history" (see update_habit_periodicity), so that the check-offs before the
+    modification keep counting with the former periodicity.
 
     :param db: initialized sqlite3 database connection
     """
@@ -40,7 +273,33 @@ def create_table_habit(db):
         task TEXT,
         periodicity TEXT,
         creation_date DATETIME,
-        update_date DATETIME)""")
+        update_date DATETIME,
+        schedule_type TEXT,
+        schedule_interval INTEGER,
+        schedule_days INTEGER,
+        schedule_anchor DATE)""")
+    cur.execute("PRAGMA table_info(habit)")
+    columns = list(map(lambda x: x[1], cur.fetchall()))
+    if "schedule_type" not in columns:
+        cur.execute("ALTER TABLE habit ADD COLUMN schedule_type TEXT")
+        cur.execute("ALTER TABLE habit ADD COLUMN schedule_interval INTEGER")
+        cur.execute("ALTER TABLE habit ADD COLUMN schedule_days INTEGER")
+    if "schedule_anchor" not in columns:
+        cur.execute("ALTER TABLE habit ADD COLUMN schedule_anchor DATE")
+    cur.execute("CREATE INDEX IF NOT EXISTS habit_name ON habit(name)")
+    cur.execute("CREATE INDEX IF NOT EXISTS habit_periodicity_name ON habit(periodicity, name)")
+    cur.execute("""CREATE TABLE IF NOT EXISTS habit_schedule_history(
+        habit_id INTEGER,
+        effective_from DATE,
+        periodicity TEXT,
+        schedule_type TEXT,
+        schedule_interval INTEGER,
+        schedule_days INTEGER,
+        schedule_anchor DATE,
+        PRIMARY KEY(habit_id, effective_from))""")
+    cur.execute("PRAGMA table_info(habit_schedule_history)")
+    if "schedule_anchor" not in list(map(lambda x: x[1], cur.fetchall())):
+        cur.execute("ALTER TABLE habit_schedule_history ADD COLUMN schedule_anchor DATE")
     db.commit()
 
 
@@ -50,176 +309,2029 @@ def create_table_tracking(db):
     """
         This function is used to create the habit tracking table in which each checkoff date including the tracking id
         and respective habit id is stored. The habit id is a foreign key referencing the primary key of the habit table.
+        An index on habit id and checkoff date allows reading the check-offs of a single habit in date order.
+        The columns period_key, checkoff_count and last_checkoff_date are only filled once the deduplication of
+        check-offs has been enabled (see enable_tracking_dedup); tracking tables of older databases are extended by them.
+        The tracking ids are never reused, also not after the check-offs have been archived or deleted (see
+        migrate_tracking_ids).
 
         :param db: initialized sqlite3 database connection
         """
 
     cur = db.cursor()
-    cur.execute("""CREATE TABLE IF NOT EXISTS tracking(
-        tracking_id INTEGER PRIMARY KEY,
-        habit_tracker_id INTEGER,
-        checkoff_date DATETIME,
-        FOREIGN KEY(habit_tracker_id) REFERENCES habit(habit_id))""")
+    cur.execute(TRACKING_TABLE.format(name="tracking"))
+    cur.execute("PRAGMA table_info(tracking)")
+    columns = list(map(lambda x: x[1], cur.fetchall()))
+    if "period_key" not in columns:
+        cur.execute("ALTER TABLE tracking ADD COLUMN period_key TEXT")
+        cur.execute("ALTER TABLE tracking ADD COLUMN checkoff_count INTEGER DEFAULT 1")
+        cur.execute("ALTER TABLE tracking ADD COLUMN last_checkoff_date DATETIME")
     db.commit()
+    create_table_archive(db)
+    cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tracking'")
+    if "AUTOINCREMENT" not in cur.fetchone()[0].upper():
+        migrate_tracking_ids(db)
+    cur.execute("CREATE INDEX IF NOT EXISTS tracking_habit_date ON tracking(habit_tracker_id, checkoff_date)")
+    db.commit()
+    create_table_rollups(db)
+    create_table_habit_runs(db)
+    create_table_changelog(db)
 
 
-# Function for storing a new habit
-def add_habit_data(db, name, task, periodicity):
+def migrate_tracking_ids(db):
 
     """
-    This function stores any new habit in the table "habit".
+    This function is a support function which recreates the tracking table of an older database with its tracking id
+    declared as AUTOINCREMENT, so that SQLite never gives the id of an archived or deleted check-off to a new one. The
+    highest id of the archive tables is kept as well. The triggers of the tracking table are recreated by the caller.
 
     :param db: initialized sqlite3 database connection
-    :param name: name of the habit
-    :param task: task specification of the habit
-    :param periodicity: periodicity (daily or weekly)
     """
 
     cur = db.cursor()
-    date_time = datetime.datetime.today()
-    cur.execute("INSERT INTO habit VALUES(null,?,?,?,?,?)", (name, task, periodicity, date_time, date_time))
+    columns = "tracking_id, habit_tracker_id, checkoff_date, period_key, checkoff_count, last_checkoff_date"
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'tracking_all'")
+    has_view = cur.fetchone() is not None
+    dedup = is_tracking_dedup(db)
+    try:
+        cur.execute("DROP VIEW IF EXISTS tracking_all")
+        cur.execute(TRACKING_TABLE.format(name="tracking_migrated"))
+        cur.execute("INSERT INTO tracking_migrated(" + columns + ") SELECT " + columns + " FROM tracking")
+        cur.execute("DROP TABLE tracking")
+        cur.execute("ALTER TABLE tracking_migrated RENAME TO tracking")
+        last = max([0] + [cur.execute("SELECT COALESCE(MAX(tracking_id), 0) FROM " + x).fetchone()[0]
+                          for x in get_archive_tables(db) + ["tracking"]])
+        cur.execute("DELETE FROM sqlite_sequence WHERE name = 'tracking'")
+        cur.execute("INSERT INTO sqlite_sequence(name, seq) VALUES('tracking', ?)", (last,))
+        if dedup:
+            cur.execute("CREATE UNIQUE INDEX tracking_period_unique ON tracking(habit_tracker_id, period_key)")
+        if has_view:
+            create_tracking_view(db)
+    except sqlite3.Error:
+        db.rollback()
+        raise
     db.commit()
 
 
-# Function for checking-off an existing habit
-def tracking_habit(db, habit_tracker_id: int, date_tracking: datetime):
+# Creating the archive tables
+def create_table_archive(db):
 
     """
-    This function stores any new check-off date in the table "tracking".
+    This function is used to create the tables describing the archive of old check-offs (see archive_tracking_data):
+    the table "tracking_archive" lists the archive table of each year together with its number of check-offs and the
+    date until which check-offs have been archived, the table "tracking_archive_summary" keeps the number of archived
+    check-offs as well as the first and last archived check-off time of each habit. Years whose archive has been
+    compressed (see compress_archive) are stored as one blob per habit in the table "tracking_archive_blob" together
+    with the tracking ids of the check-offs (see compression.encode_ids) and their lowest and highest tracking id;
+    blobs of older databases are extended by them.
 
     :param db: initialized sqlite3 database connection
-    :param habit_tracker_id: habit_id as a foreign key referencing the primary key "habit_id" of the habit table
-    :param date_tracking: check-off date when the user has completed the habit which can either be the current datetime
-    or a manually entered datetime in the past
     """
 
     cur = db.cursor()
-    cur.execute("INSERT INTO tracking VALUES (null, ?, ?)", (int(habit_tracker_id), date_tracking))
+    cur.execute("""CREATE TABLE IF NOT EXISTS tracking_archive(
+        year INTEGER PRIMARY KEY,
+        table_name TEXT,
+        checkoff_count INTEGER,
+        archived_until DATE,
+        compressed INTEGER DEFAULT 0)""")
+    cur.execute("PRAGMA table_info(tracking_archive)")
+    if "compressed" not in list(map(lambda x: x[1], cur.fetchall())):
+        cur.execute("ALTER TABLE tracking_archive ADD COLUMN compressed INTEGER DEFAULT 0")
+    cur.execute("""CREATE TABLE IF NOT EXISTS tracking_archive_summary(
+        habit_id INTEGER PRIMARY KEY,
+        checkoff_count INTEGER,
+        first_checkoff DATETIME,
+        last_checkoff DATETIME)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS tracking_archive_blob(
+        habit_id INTEGER,
+        year INTEGER,
+        checkoff_count INTEGER,
+        data BLOB,
+        tracking_ids BLOB,
+        min_tracking_id INTEGER,
+        max_tracking_id INTEGER,
+        PRIMARY KEY(habit_id, year))""")
+    cur.execute("PRAGMA table_info(tracking_archive_blob)")
+    columns = list(map(lambda x: x[1], cur.fetchall()))
+    if "tracking_ids" not in columns:
+        cur.execute("ALTER TABLE tracking_archive_blob ADD COLUMN tracking_ids BLOB")
+    if "min_tracking_id" not in columns:
+        cur.execute("ALTER TABLE tracking_archive_blob ADD COLUMN min_tracking_id INTEGER")
+        cur.execute("ALTER TABLE tracking_archive_blob ADD COLUMN max_tracking_id INTEGER")
+        cur.execute("SELECT habit_id, year, tracking_ids FROM tracking_archive_blob WHERE tracking_ids IS NOT NULL")
+        cur.executemany("UPDATE tracking_archive_blob SET min_tracking_id = ?, max_tracking_id = ? "
+                        "WHERE habit_id = ? AND year = ?",
+                        [tracking_id_range(compression.decode_ids(x[2])) + x[:2] for x in cur.fetchall()])
+    cur.execute("CREATE INDEX IF NOT EXISTS tracking_archive_blob_ids ON tracking_archive_blob(min_tracking_id)")
     db.commit()
 
 
-# Functions for updating habits
-def update_habit_task(db, task, name):
+def tracking_id_range(tracking_ids):
 
     """
-    This function is used for updating the task of a selected habit in the database. The datetime of modification will
-    be stored in the column "update_date".
+    This function is a support function determining the lowest and highest tracking id of compressed check-offs,
+    ignoring the check-offs compressed before their tracking ids were kept (tracking id 0).
+
+    :param tracking_ids: iterable of tracking ids
+
+    :return: Tuple of the lowest and highest tracking id, (None, None) if there is none
+    """
+
+    tracking_ids = [x for x in tracking_ids if x]
+    return (min(tracking_ids), max(tracking_ids)) if tracking_ids else (None, None)
+
+
+# SQL statements shared by the rollup triggers: recalculating the first and last check-off time of the day and week of
+# a tracking row ({row} is either OLD or NEW) and removing rollup rows without any check-off. The week is recalculated
+# from its days so that archived check-offs of the week (see archive_tracking_data) are taken into account as well.
+ROLLUP_REFRESH = """
+        UPDATE tracking_daily_rollup SET
+            first_checkoff = (SELECT MIN(checkoff_date) FROM tracking WHERE habit_tracker_id = habit_id
+                AND checkoff_date >= day AND checkoff_date < date(day, '+1 day')),
+            last_checkoff = (SELECT MAX(COALESCE(last_checkoff_date, checkoff_date)) FROM tracking
+                WHERE habit_tracker_id = habit_id AND checkoff_date >= day AND checkoff_date < date(day, '+1 day'))
+            WHERE habit_id = {row}.habit_tracker_id AND day = date({row}.checkoff_date);
+        UPDATE tracking_weekly_rollup SET
+            first_checkoff = (SELECT MIN(first_checkoff) FROM tracking_daily_rollup AS daily
+                WHERE daily.habit_id = tracking_weekly_rollup.habit_id AND day >= week_start
+                AND day < date(week_start, '+7 days')),
+            last_checkoff = (SELECT MAX(last_checkoff) FROM tracking_daily_rollup AS daily
+                WHERE daily.habit_id = tracking_weekly_rollup.habit_id AND day >= week_start
+                AND day < date(week_start, '+7 days'))
+            WHERE habit_id = {row}.habit_tracker_id AND week_start = date({row}.checkoff_date, '-6 days', 'weekday 1');
+        DELETE FROM tracking_daily_rollup WHERE checkoff_count <= 0
+            AND habit_id = {row}.habit_tracker_id AND day = date({row}.checkoff_date);
+        DELETE FROM tracking_weekly_rollup WHERE checkoff_count <= 0
+            AND habit_id = {row}.habit_tracker_id AND week_start = date({row}.checkoff_date, '-6 days', 'weekday 1');"""
+
+# Adding the check-offs of a tracking row to the rollup tables
+ROLLUP_ADD = """
+        INSERT INTO tracking_daily_rollup VALUES(
+            NEW.habit_tracker_id, date(NEW.checkoff_date), COALESCE(NEW.checkoff_count, 1), NEW.checkoff_date,
+            COALESCE(NEW.last_checkoff_date, NEW.checkoff_date))
+            ON CONFLICT(habit_id, day) DO UPDATE SET
+            checkoff_count = checkoff_count + excluded.checkoff_count,
+            first_checkoff = min(first_checkoff, excluded.first_checkoff),
+            last_checkoff = max(last_checkoff, excluded.last_checkoff);
+        INSERT INTO tracking_weekly_rollup VALUES(
+            NEW.habit_tracker_id, date(NEW.checkoff_date, '-6 days', 'weekday 1'),
+            STRFTIME('%Y', NEW.checkoff_date, '-3 days', 'weekday 4'),
+            (STRFTIME('%j', NEW.checkoff_date, '-3 days', 'weekday 4') - 1) / 7 + 1,
+            COALESCE(NEW.checkoff_count, 1), NEW.checkoff_date, COALESCE(NEW.last_checkoff_date, NEW.checkoff_date))
+            ON CONFLICT(habit_id, week_start) DO UPDATE SET
+            checkoff_count = checkoff_count + excluded.checkoff_count,
+            first_checkoff = min(first_checkoff, excluded.first_checkoff),
+            last_checkoff = max(last_checkoff, excluded.last_checkoff);"""
+
+# Removing the check-offs of a tracking row from the rollup tables
+ROLLUP_REMOVE = """
+        UPDATE tracking_daily_rollup SET checkoff_count = checkoff_count - COALESCE(OLD.checkoff_count, 1)
+            WHERE habit_id = OLD.habit_tracker_id AND day = date(OLD.checkoff_date);
+        UPDATE tracking_weekly_rollup SET checkoff_count = checkoff_count - COALESCE(OLD.checkoff_count, 1)
+            WHERE habit_id = OLD.habit_tracker_id AND week_start = date(OLD.checkoff_date, '-6 days', 'weekday 1');"""
+
+
+# Creating the daily and weekly rollup tables
+def create_table_rollups(db):
+
+    """
+    This function is used to create the rollup tables in which the number of check-offs as well as the first and last
+    check-off time of each habit is stored per day (tracking_daily_rollup) and per ISO week (tracking_weekly_rollup).
+    Weeks are identified by the date of their Monday. Triggers on the tracking table keep both tables up to date for
+    every inserted, updated and deleted check-off. If the rollup tables did not exist before, they are filled with the
+    already stored tracking data.
 
     :param db: initialized sqlite3 database connection
-    :param task: updated task specification
-    :param name: name of the habit for which the task specification should be modified
     """
+
     cur = db.cursor()
-    date_update = datetime.datetime.today()
-    cur.execute("UPDATE habit SET task = ? WHERE name = ?", (task, name))
-    cur.execute("UPDATE habit SET update_date = ? WHERE name = ?", (date_update, name))
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tracking_daily_rollup'")
+    is_new = cur.fetchone() is None
+    cur.execute("""CREATE TABLE IF NOT EXISTS tracking_daily_rollup(
+        habit_id INTEGER,
+        day DATE,
+        checkoff_count INTEGER,
+        first_checkoff DATETIME,
+        last_checkoff DATETIME,
+        PRIMARY KEY(habit_id, day))""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS tracking_weekly_rollup(
+        habit_id INTEGER,
+        week_start DATE,
+        iso_year INTEGER,
+        iso_week INTEGER,
+        checkoff_count INTEGER,
+        first_checkoff DATETIME,
+        last_checkoff DATETIME,
+        PRIMARY KEY(habit_id, week_start))""")
+    create_rollup_triggers(db)
     db.commit()
+    if is_new:
+        backfill_rollups(db)
 
 
-def update_habit_periodicity(db, periodicity, name):
+def create_rollup_triggers(db):
 
     """
-    This function is used for updating the periodicity of a selected habit in the database. The datetime of modification
-    will be stored in the column "update_date".
+    This function creates the triggers keeping the rollup tables up to date. A changed check-off (e.g. a repeated
+    check-off merged into an existing row in deduplication mode) is removed from its previous day and week and added to
+    its new day and week.
 
     :param db: initialized sqlite3 database connection
-    :param periodicity: updated periodicity in terms of daily or weekly
-    :param name: name of the habit for which the periodicity should be modified
     """
 
     cur = db.cursor()
-    date_update = datetime.datetime.today()
-    cur.execute("UPDATE habit SET periodicity = ? WHERE name = ?", (periodicity, name))
-    cur.execute("UPDATE habit SET update_date = ? WHERE name = ?", (date_update, name))
-    db.commit()
+    cur.execute("CREATE TRIGGER IF NOT EXISTS tracking_rollup_insert AFTER INSERT ON tracking BEGIN"
+                + ROLLUP_ADD + "\n        END")
+    cur.execute("CREATE TRIGGER IF NOT EXISTS tracking_rollup_delete AFTER DELETE ON tracking BEGIN"
+                + ROLLUP_REMOVE + ROLLUP_REFRESH.format(row="OLD") + "\n        END")
+    cur.execute("CREATE TRIGGER IF NOT EXISTS tracking_rollup_update AFTER UPDATE OF checkoff_date, checkoff_count, "
+                "last_checkoff_date ON tracking BEGIN" + ROLLUP_REMOVE + ROLLUP_ADD + ROLLUP_REFRESH.format(row="OLD")
+                + ROLLUP_REFRESH.format(row="NEW") + "\n        END")
 
 
-def update_habit(db, task, periodicity, name):
+def drop_rollup_triggers(db):
 
     """
-    This function is used for updating the task and periodicity of a selected habit in the database. The datetime of
-    modification will be stored in the column "update_date".
+    This function drops the triggers keeping the rollup tables up to date, e.g. before tracking rows are moved or merged
+    in bulk and the rollup tables are rebuilt afterwards.
 
     :param db: initialized sqlite3 database connection
-    :param task: updated task specification
-    :param periodicity: updated periodicity in terms of daily or weekly
-    :param name: name of the habit for which the task and periodicity should be modified
     """
 
     cur = db.cursor()
-    date_update = datetime.datetime.today()
-    cur.execute("UPDATE habit SET task = ?, periodicity = ? WHERE name = ?", (task, periodicity, name))
-    cur.execute("UPDATE habit SET update_date = ? WHERE name = ?", (date_update, name))
-    db.commit()
+    cur.execute("DROP TRIGGER IF EXISTS tracking_rollup_insert")
+    cur.execute("DROP TRIGGER IF EXISTS tracking_rollup_delete")
+    cur.execute("DROP TRIGGER IF EXISTS tracking_rollup_update")
 
 
-# Functions for deleting habits
-def delete_habit_data(db, name):
+# Function for (re-)building the rollup tables from the tracking table
+def backfill_rollups(db):
 
     """
-    This function deletes a selected habit from the table "habit"
+    This function rebuilds the daily and weekly rollup tables from all check-offs stored in the tracking table and the
+    archive. It is needed for databases whose tracking data has been stored before the rollup tables existed.
 
     :param db: initialized sqlite3 database connection
-    :param name: name of the habit which should be deleted
     """
 
     cur = db.cursor()
-    cur.execute("DELETE FROM habit WHERE name=?", (name,))
+    cur.execute("DELETE FROM tracking_daily_rollup")
+    cur.execute("DELETE FROM tracking_weekly_rollup")
+    cur.execute("""INSERT INTO tracking_daily_rollup
+        SELECT habit_tracker_id, date(checkoff_date), SUM(COALESCE(checkoff_count, 1)), MIN(checkoff_date),
+        MAX(COALESCE(last_checkoff_date, checkoff_date)) FROM """ + get_tracking_source(db) +
+                """ GROUP BY habit_tracker_id, date(checkoff_date)""")
+    for habit_id, year, data in get_archive_blobs(db):
+        for day, checkoffs in itertools.groupby(compression.decode_checkoffs(data), key=lambda x: x[0]):
+            checkoffs = list(checkoffs)
+            cur.execute("""INSERT INTO tracking_daily_rollup VALUES(?, ?, ?, ?, ?)
+                ON CONFLICT(habit_id, day) DO UPDATE SET
+                checkoff_count = checkoff_count + excluded.checkoff_count,
+                first_checkoff = min(first_checkoff, excluded.first_checkoff),
+                last_checkoff = max(last_checkoff, excluded.last_checkoff)""",
+                        (habit_id, datetime.date.fromordinal(day).isoformat(), sum(x[2] for x in checkoffs),
+                         format_checkoff(day, checkoffs[0][1]), format_checkoff(day, checkoffs[-1][1])))
+    cur.execute("""INSERT INTO tracking_weekly_rollup
+        SELECT habit_id, week_start, STRFTIME('%Y', week_start, '+3 days'),
+        (STRFTIME('%j', week_start, '+3 days') - 1) / 7 + 1, SUM(checkoff_count), MIN(first_checkoff),
+        MAX(last_checkoff) FROM (SELECT habit_id, date(day, '-6 days', 'weekday 1') AS week_start, checkoff_count,
+        first_checkoff, last_checkoff FROM tracking_daily_rollup) GROUP BY habit_id, week_start""")
     db.commit()
 
 
-def delete_tracking_data(db, name):
+# Creating the changelog of the habit and tracking table
+def create_table_changelog(db):
 
     """
-    This function deletes all check off dates and related data from the table "tracking" for a selected habit
+    This function is used to create the changelog (table "changelog") in which every insert, update and delete of a
+    habit or check-off is stored with a sequence number, the table, the kind of change and the id of the changed row.
+    The sequence numbers only increase, also after old entries have been compacted (see compact_changelog), whose
+    highest sequence number is stored in the table "changelog_compaction". Triggers on the habit and tracking table
+    record the changes; updates and deletes of archived check-offs are recorded as changes of the tracking table.
 
     :param db: initialized sqlite3 database connection
-    :param name: name of the habit for which the tracking data should be deleted
     """
 
     cur = db.cursor()
-    habit_tracking_id = str(cur.execute("SELECT DISTINCT habit_id FROM habit WHERE name = ?", (name,)))
-    habit_tracking_id = cur.fetchone()[0]
-    cur.execute("DELETE FROM tracking WHERE habit_tracker_id=?", (habit_tracking_id,))
+    cur.execute("""CREATE TABLE IF NOT EXISTS changelog(
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT,
+        operation TEXT,
+        row_id INTEGER,
+        changed_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+    cur.execute("CREATE TABLE IF NOT EXISTS changelog_compaction(compacted_until INTEGER)")
+    create_changelog_triggers(db)
     db.commit()
 
 
-def delete_all_habit_tracking_data(db):
+def create_changelog_triggers(db, table_names=("habit", "tracking")):
 
     """
-    This function deletes all data from the habit as well as tracking table.
+    This function creates the triggers recording the inserts, updates and deletes of the habit and/or tracking table in
+    the changelog. Together with the tracking table, the updates and deletes of the archive tables are recorded as
+    changes of the tracking table, as the archived check-offs keep their tracking ids (moving check-offs into the
+    archive inserts them without a trigger, see archive_tracking_data). Deletes and updates of compressed check-offs
+    are recorded by the functions changing them (see record_tracking_changes).
 
     :param db: initialized sqlite3 database connection
+    :param table_names: tables whose changes should be recorded
     """
 
     cur = db.cursor()
-    cur.execute("DELETE FROM tracking")
-    cur.execute("DELETE FROM habit")
+    watched = [(x, x, ("insert", "update", "delete")) for x in table_names]
+    if "tracking" in table_names:
+        watched += [(x, "tracking", ("update", "delete")) for x in get_archive_tables(db)]
+    for table_name, changed_table, operations in watched:
+        key = "habit_id" if changed_table == "habit" else "tracking_id"
+        for operation in operations:
+            row = "OLD" if operation == "delete" else "NEW"
+            cur.execute("CREATE TRIGGER IF NOT EXISTS " + table_name + "_changelog_" + operation + " AFTER " +
+                        operation.upper() + " ON " + table_name + " BEGIN INSERT INTO changelog(table_name, operation, "
+                        "row_id) VALUES('" + changed_table + "', '" + operation + "', " + row + "." + key + "); END")
+
+
+def record_tracking_changes(db, operation, tracking_ids):
+
+    """
+    This function is a support function recording changes of archived check-offs in the changelog which are not
+    watched by triggers, i.e. of compressed check-offs and of archive tables which are dropped. Check-offs compressed
+    before their tracking ids were kept (tracking id 0) cannot be recorded.
+
+    :param db: initialized sqlite3 database connection
+    :param operation: kind of change ("update" or "delete")
+    :param tracking_ids: iterable of the tracking ids of the changed check-offs
+    """
+
+    db.cursor().executemany("INSERT INTO changelog(table_name, operation, row_id) VALUES('tracking', ?, ?)",
+                            [(operation, x) for x in tracking_ids if x])
+
+
+def drop_changelog_triggers(db, table_names=("habit", "tracking")):
+
+    """
+    This function drops the triggers recording the changes of the habit and/or tracking table (together with the
+    archive tables), e.g. before check-offs are moved into the archive, which is not a change of the check-offs.
+
+    :param db: initialized sqlite3 database connection
+    :param table_names: tables whose changes should no longer be recorded
+    """
+
+    cur = db.cursor()
+    if "tracking" in table_names:
+        table_names = list(table_names) + get_archive_tables(db)
+    for table_name in table_names:
+        for operation in ("insert", "update", "delete"):
+            cur.execute("DROP TRIGGER IF EXISTS " + table_name + "_changelog_" + operation)
+
+
+# Creating the run index of all habits
+def create_table_habit_runs(db):
+
+    """
+    This function is used to create the run index (table "habit_runs") in which each run of subsequent completed periods
+    of a habit is stored with the index of its first and last period (see periodicity.Schedule), the first and last day
+    of these periods and its length. The run index is kept up to date by the functions checking-off habits and deleting
+    check-offs, which merge or split the adjacent runs. If the table did not exist before, it is built from the already
+    stored tracking data.
+
+    :param db: initialized sqlite3 database connection
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'habit_runs'")
+    is_new = cur.fetchone() is None
+    cur.execute("""CREATE TABLE IF NOT EXISTS habit_runs(
+        habit_id INTEGER,
+        start_bucket INTEGER,
+        end_bucket INTEGER,
+        run_start DATE,
+        run_end DATE,
+        length INTEGER,
+        PRIMARY KEY(habit_id, start_bucket))""")
+    cur.execute("CREATE INDEX IF NOT EXISTS habit_runs_end ON habit_runs(habit_id, end_bucket)")
+    cur.execute("CREATE INDEX IF NOT EXISTS habit_runs_length ON habit_runs(length)")
     db.commit()
+    if is_new:
+        rebuild_habit_runs(db)
 
 
-# Functions for the analysis module
-def get_habit_data(db):
+def insert_habit_run(cur, habit_id, schedule, start_bucket, end_bucket):
 
     """
-    This function selects all data entries from the table "habit" as a basis for the analysis modules.
+    This function is a support function storing one run in the run index.
+
+    :param cur: cursor of an initialized sqlite3 database connection
+    :param habit_id: habit_id of the habit
+    :param schedule: schedule (periodicity.Schedule) of the habit
+    :param start_bucket: index of the first period of the run
+    :param end_bucket: index of the last period of the run
+    """
+
+    cur.execute("INSERT INTO habit_runs VALUES(?, ?, ?, ?, ?, ?)",
+                (habit_id, start_bucket, end_bucket,
+                 datetime.date.fromordinal(schedule.period_start(start_bucket)).isoformat(),
+                 datetime.date.fromordinal(schedule.period_end(end_bucket)).isoformat(), end_bucket - start_bucket + 1))
+
+
+def rebuild_habit_runs(db, habit_id=None, commit=True, start=None):
+
+    """
+    This function rebuilds the run index of all habits (or of one selected habit) from the tracking data, e.g. after the
+    periodicity of a habit has been modified. If a start day is given, only the runs from the period before the start
+    day on are rebuilt from the check-offs since the first of these runs, as the earlier runs remain unchanged.
 
     :param db: initialized sqlite3 database connection
+    :param habit_id: optional habit_id to rebuild the run index of one habit only
+    :param commit: whether the run index should be committed immediately or together with further writes by the caller
+    :param start: optional first day (datetime.date or YYYY-MM-DD) whose period may have changed, only together with
+    habit_id
     """
 
     cur = db.cursor()
-    cur.execute("SELECT habit_id, name, task, periodicity, STRFTIME('%Y-%m-%d %H:%M', creation_date), "
-                "STRFTIME('%Y-%m-%d %H:%M',update_date) FROM habit")
-    return cur.fetchall()
+    if habit_id is None:
+        cur.execute("DELETE FROM habit_runs")
+        schedules = get_habit_schedules(db)
+    else:
+        schedules = dict((x, y) for x, y in get_habit_schedules(db).items() if x == int(habit_id))
+    for row_id, (name, schedule) in schedules.items():
+        if start is None:
+            cur.execute("DELETE FROM habit_runs WHERE habit_id = ?", (row_id,))
+            days = get_tracking_days_habit(db, row_id)
+        else:
+            bucket = schedule.bucket(datetime.date.fromisoformat(str(start)[:10]).toordinal() - 1)
+            cur.execute("SELECT MIN(start_bucket) FROM habit_runs WHERE habit_id = ? AND end_bucket >= ?",
+                        (row_id, bucket - 1))
+            first_bucket = min(bucket, cur.fetchone()[0] or bucket)
+            cur.execute("DELETE FROM habit_runs WHERE habit_id = ? AND end_bucket >= ?", (row_id, bucket - 1))
+            days = get_tracking_days_habit(db, row_id, datetime.date.fromordinal(schedule.period_start(first_bucket)))
+        for start_bucket, end_bucket in streak_runs(days, schedule):
+            insert_habit_run(cur, row_id, schedule, start_bucket, end_bucket)
+    if commit:
+        db.commit()
+
+
+def update_habit_runs(db, habit_tracker_id, date_tracking):
+
+    """
+    This function updates the run index of a habit after check-offs have been stored or deleted for a day. If the
+    period of the day has become completed, it is added to the run index and merged with the runs ending right before
+    and starting right after it. If the period is no longer completed, the run containing it is split. The archive is
+    only read if the period starts before the archived check-offs end. The changes are committed together with the
+    check-offs by the caller.
 
+    :param db: initialized sqlite3 database connection
+    :param habit_tracker_id: habit_id of the habit
+    :param date_tracking: datetime or date (YYYY-MM-DD ...) of the stored or deleted check-offs
+    """
+
+    cur = db.cursor()
+    habit_id = int(habit_tracker_id)
+    schedule = get_habit_schedule_by_id(db, habit_id)
+    if schedule is None:
+        return
+    bucket = schedule.bucket(datetime.date.fromisoformat(str(date_tracking)[:10]).toordinal())
+    first_day, last_day = schedule.period_start(bucket), schedule.period_end(bucket)
+    period_start = datetime.date.fromordinal(first_day).isoformat()
+    period_end = datetime.date.fromordinal(last_day + 1).isoformat()
+    if get_tracking_source(db, period_start, habit_id) == "tracking":
+        cur.execute("SELECT COUNT(DISTINCT date(checkoff_date)) FROM tracking WHERE habit_tracker_id = ? "
+                    "AND checkoff_date >= ? AND checkoff_date < ?", (habit_id, period_start, period_end))
+        days = cur.fetchone()[0]
+    else:
+        cur.execute("SELECT DISTINCT CAST(julianday(date(checkoff_date)) - 1721424.5 AS INTEGER) FROM tracking_all "
+                    "WHERE habit_tracker_id = ? AND checkoff_date >= ? AND checkoff_date < ?",
+                    (habit_id, period_start, period_end))
+        days = set(map(lambda x: x[0], cur.fetchall()))
+        for blob in get_archive_blobs(db, habit_id, int(period_start[:4]), int(period_end[:4])):
+            days.update(x for x in compression.decode_days(blob[2]) if first_day <= x <= last_day)
+        days = len(days)
+    completed = days >= schedule.required_days(bucket)
+    run = get_habit_run_at(db, habit_id, bucket)
+    if completed and run is None:
+        start_bucket = end_bucket = bucket
+        cur.execute("SELECT start_bucket FROM habit_runs WHERE habit_id = ? AND end_bucket = ?", (habit_id, bucket - 1))
+        left = cur.fetchone()
+        if left is not None:
+            start_bucket = left[0]
+        cur.execute("SELECT end_bucket FROM habit_runs WHERE habit_id = ? AND start_bucket = ?", (habit_id, bucket + 1))
+        right = cur.fetchone()
+        if right is not None:
+            end_bucket = right[0]
+        cur.execute("DELETE FROM habit_runs WHERE habit_id = ? AND start_bucket IN (?, ?)",
+                    (habit_id, start_bucket, bucket + 1))
+        insert_habit_run(cur, habit_id, schedule, start_bucket, end_bucket)
+    elif not completed and run is not None:
+        cur.execute("DELETE FROM habit_runs WHERE habit_id = ? AND start_bucket = ?", (habit_id, run[0]))
+        if run[0] < bucket:
+            insert_habit_run(cur, habit_id, schedule, run[0], bucket - 1)
+        if bucket < run[1]:
+            insert_habit_run(cur, habit_id, schedule, bucket + 1, run[1])
+
+
+# Function for storing a new habit
+@retry_locked
+def add_habit_data(db, name, task, periodicity, commit=True, anchor=None):
 
-def get_tracking_data(db):
     """
-    This function selects all data entries from the table "tracking" as a basis for the analysis modules.
+    This function stores any new habit in the table "habit".
 
     :param db: initialized sqlite3 database connection
+    :param name: name of the habit
+    :param task: task specification of the habit
+    :param periodicity: periodicity, e.g. daily, weekly, every 3 days, 3 times per week, monthly or weekdays: Mon, Fri
+    (see periodicity.Schedule.parse); a ValueError is raised for an unknown periodicity
+    :param commit: whether the habit should be committed immediately or together with further writes by the caller
+    :param anchor: first day (datetime.date or YYYY-MM-DD) of a period of a habit scheduled every N days, by default
+    the day the habit is created
     """
 
     cur = db.cursor()
-    cur.execute("SELECT habit_tracker_id AS habit_id, STRFTIME('%Y-%m-%d', checkoff_date) FROM tracking")
-    return cur.fetchall()
+    date_time = datetime.datetime.today()
+    schedule = Schedule.parse(periodicity, day_ordinal(anchor or date_time))
+    cur.execute("INSERT INTO habit(habit_id, name, task, periodicity, creation_date, update_date, schedule_type, "
+                "schedule_interval, schedule_days, schedule_anchor) VALUES(null,?,?,?,?,?,?,?,?,?)",
+                (name, task, schedule.label(), date_time, date_time) + schedule_columns(schedule))
+    if commit:
+        db.commit()
+
+
+def schedule_columns(schedule):
+
+    """
+    This function is a support function returning the values of the structured schedule columns of a habit.
+
+    :param schedule: schedule (periodicity.Schedule)
+
+    :return: Tuple of schedule type, interval, weekday bit mask and anchor day (YYYY-MM-DD, None unless the habit is
+    scheduled every N days)
+    """
+
+    anchor = None
+    if schedule.schedule_type == "every_n_days":
+        anchor = datetime.date.fromordinal(schedule.anchor).isoformat()
+    return schedule.schedule_type, schedule.interval, schedule.days, anchor
+
+
+def modified_schedule(previous, periodicity, effective_from):
+
+    """
+    This function is a support function returning the schedule of a modified periodicity: an unchanged periodicity keeps
+    its schedule, the periods of a new periodicity of N days are counted from the day of the modification.
+
+    :param previous: schedule (periodicity.Schedule) of the habit before the modification
+    :param periodicity: updated periodicity (see add_habit_data)
+    :param effective_from: first day (datetime.date, datetime or YYYY-MM-DD) of the new periodicity
+
+    :return: Schedule (periodicity.Schedule) of the modified periodicity
+    """
+
+    schedule = Schedule.parse(periodicity, day_ordinal(effective_from))
+    return previous if schedule.label() == previous.label() else schedule
+
+
+@retry_locked
+def store_habits_many(db, habits, commit=True):
+
+    """
+    This function stores many new habits in the table "habit" with one statement (executemany) and one transaction.
+    All periodicities are validated before any habit is stored and the names are checked against the stored habits
+    once: habits whose name already exists (or is repeated within the new habits) are not stored but reported.
+
+    :param db: initialized sqlite3 database connection
+    :param habits: list of tuples of name, task and periodicity of the new habits (see add_habit_data); a ValueError is
+    raised for an unknown periodicity
+    :param commit: whether the habits should be committed immediately or together with further writes by the caller
+
+    :return: List of the names of the habits which have not been stored as a habit with the name already exists
+    """
+
+    cur = db.cursor()
+    date_time = datetime.datetime.today()
+    cur.execute("SELECT name FROM habit")
+    habits, conflicts = split_new_habits(habits, map(lambda x: x[0], cur.fetchall()), day_ordinal(date_time))
+    rows = [(name, task, schedule.label(), date_time, date_time) + schedule_columns(schedule)
+            for name, task, schedule in habits]
+    cur.executemany("INSERT INTO habit(habit_id, name, task, periodicity, creation_date, update_date, schedule_type, "
+                    "schedule_interval, schedule_days, schedule_anchor) VALUES(null,?,?,?,?,?,?,?,?,?)", rows)
+    if commit:
+        db.commit()
+    return conflicts
+
+
+def split_new_habits(habits, names, anchor=1):
+
+    """
+    This function is a support function validating the periodicities of many new habits before any of them is stored
+    and separating the habits which can be stored from the habits whose name already exists or is repeated within the
+    new habits.
+
+    :param habits: iterable of tuples of name, task and periodicity of the new habits; a ValueError is raised for an
+    unknown periodicity
+    :param names: iterable of the names of the stored habits
+    :param anchor: first day of the periods of the new habits (see periodicity.Schedule.parse)
+
+    :return: Tuple of the list of the habits to be stored (tuples of name, task and schedule) and the list of the names
+    of the habits which cannot be stored as a habit with the name already exists
+    """
+
+    habits = [(name, task, Schedule.parse(periodicity, anchor)) for name, task, periodicity in habits]
+    names = set(names)
+    new = []
+    conflicts = []
+    for name, task, schedule in habits:
+        if name in names:
+            conflicts.append(name)
+            continue
+        names.add(name)
+        new.append((name, task, schedule))
+    return new, conflicts
+
+
+# Function for checking-off an existing habit
+@retry_locked
+def tracking_habit(db, habit_tracker_id: int, date_tracking: datetime, commit=True):
+
+    """
+    This function stores any new check-off date in the table "tracking" and updates the run index of the habit. If the
+    deduplication of check-offs is enabled, only one row is kept per habit and period (see tracking_period_key): a
+    repeated check-off within the same period increases the check-off count of the existing row, which keeps its
+    checkoff date, and updates its last check-off time. This also applies to a row of the period which has already
+    been archived (see merge_archived_checkoff).
+
+    :param db: initialized sqlite3 database connection
+    :param habit_tracker_id: habit_id as a foreign key referencing the primary key "habit_id" of the habit table
+    :param date_tracking: check-off date when the user has completed the habit which can either be the current datetime
+    or a manually entered datetime in the past
+    :param commit: whether the check-off should be committed immediately or together with further writes by the caller
+    """
+
+    cur = db.cursor()
+    if is_tracking_dedup(db):
+        first, last = tracking_period(get_habit_schedule_by_id(db, habit_tracker_id), date_tracking)
+        if not merge_archived_checkoff(db, habit_tracker_id, first, last, date_tracking):
+            cur.execute("""INSERT INTO tracking(habit_tracker_id, checkoff_date, period_key, checkoff_count,
+                last_checkoff_date) VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(habit_tracker_id, period_key) DO UPDATE SET
+                checkoff_count = checkoff_count + 1,
+                last_checkoff_date = max(COALESCE(last_checkoff_date, checkoff_date), excluded.last_checkoff_date)""",
+                        (int(habit_tracker_id), date_tracking, datetime.date.fromordinal(first).isoformat(),
+                         date_tracking))
+    else:
+        cur.execute("INSERT INTO tracking(habit_tracker_id, checkoff_date) VALUES (?, ?)",
+                    (int(habit_tracker_id), date_tracking))
+    update_habit_runs(db, habit_tracker_id, date_tracking)
+    if commit:
+        db.commit()
+
+
+# Functions for the deduplication of check-offs
+def tracking_period_key(schedule, date_tracking):
+
+    """
+    This function is a support function returning the period of a check-off for the deduplication of check-offs: the
+    first day (YYYY-MM-DD) of the check-off's period (see periodicity.Schedule.bucket), or the day of the check-off
+    itself if the period is only completed by check-offs on several different days (e.g. 3 times per week), as the
+    check-offs of different days then all count.
+
+    :param schedule: schedule (periodicity.Schedule or periodicity.ScheduleHistory) of the habit or None if the habit
+    does not exist
+    :param date_tracking: datetime or date (YYYY-MM-DD ...) of the check-off
+
+    :return: Period key of the check-off (YYYY-MM-DD)
+    """
+
+    return datetime.date.fromordinal(tracking_period(schedule, date_tracking)[0]).isoformat()
+
+
+def tracking_period(schedule, date_tracking):
+
+    """
+    This function is a support function returning the first and last day of the period of a check-off for the
+    deduplication of check-offs (see tracking_period_key).
+
+    :param schedule: schedule (periodicity.Schedule or periodicity.ScheduleHistory) of the habit or None if the habit
+    does not exist
+    :param date_tracking: datetime or date (YYYY-MM-DD ...) of the check-off
+
+    :return: Tuple of the first and last day of the period as proleptic Gregorian ordinals
+    """
+
+    day = datetime.date.fromisoformat(str(date_tracking)[:10]).toordinal()
+    if schedule is None:
+        return day, day
+    bucket = schedule.bucket(day)
+    if schedule.required_days(bucket) > 1:
+        return day, day
+    return schedule.period_start(bucket), schedule.period_end(bucket)
+
+
+def merge_archived_checkoff(db, habit_tracker_id, first, last, date_tracking):
+
+    """
+    This function is a support function which adds a repeated check-off to an archived check-off of the same habit and
+    period (see archive_tracking_data) in deduplication mode, as the unique index on habit id and period only covers
+    the tracking table. The check-off count and last check-off time of the archived row (or the check-off count of the
+    compressed check-off) as well as the archive summary and the rollup tables are updated.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_tracker_id: habit_id of the habit
+    :param first: first day of the period as proleptic Gregorian ordinal (see tracking_period)
+    :param last: last day of the period as proleptic Gregorian ordinal
+    :param date_tracking: datetime of the repeated check-off
+
+    :return: True if the check-off has been added to an archived check-off, otherwise False
+    """
+
+    cur = db.cursor()
+    start = datetime.date.fromordinal(first).isoformat()
+    end = datetime.date.fromordinal(last + 1).isoformat()
+    if get_tracking_source(db, start, habit_tracker_id) == "tracking":
+        return False
+    day = None
+    for table_name in get_archive_tables(db):
+        cur.execute("SELECT tracking_id, checkoff_date FROM " + table_name + " WHERE habit_tracker_id = ? "
+                    "AND checkoff_date >= ? AND checkoff_date < ? ORDER BY checkoff_date LIMIT 1",
+                    (int(habit_tracker_id), start, end))
+        row = cur.fetchone()
+        if row is not None:
+            cur.execute("UPDATE " + table_name + " SET checkoff_count = COALESCE(checkoff_count, 1) + 1, "
+                        "last_checkoff_date = max(COALESCE(last_checkoff_date, checkoff_date), ?) "
+                        "WHERE tracking_id = ?", (str(date_tracking), row[0]))
+            day = row[1][:10]
+            break
+    for blob in [] if day is not None else list(get_archive_blobs(db, habit_tracker_id, start[:4], end[:4])):
+        checkoffs = list(compression.decode_checkoffs(blob[2]))
+        index = next((i for i, x in enumerate(checkoffs) if first <= x[0] <= last), None)
+        if index is not None:
+            ids = get_archive_blob_ids(db, blob[0], blob[1], len(checkoffs))
+            checkoffs[index] = (checkoffs[index][0], checkoffs[index][1], checkoffs[index][2] + 1)
+            store_archive_blob(db, blob[0], blob[1], checkoffs, ids)
+            record_tracking_changes(db, "update", [ids[index]])
+            day = datetime.date.fromordinal(checkoffs[index][0]).isoformat()
+            break
+    if day is None:
+        return False
+    cur.execute("UPDATE tracking_archive_summary SET checkoff_count = checkoff_count + 1, "
+                "last_checkoff = max(last_checkoff, ?) WHERE habit_id = ?", (str(date_tracking), int(habit_tracker_id)))
+    cur.execute("UPDATE tracking_daily_rollup SET checkoff_count = checkoff_count + 1, "
+                "last_checkoff = max(last_checkoff, ?) WHERE habit_id = ? AND day = ?",
+                (str(date_tracking), int(habit_tracker_id), day))
+    cur.execute("UPDATE tracking_weekly_rollup SET checkoff_count = checkoff_count + 1, "
+                "last_checkoff = max(last_checkoff, ?) WHERE habit_id = ? AND week_start = date(?, '-6 days', "
+                "'weekday 1')", (str(date_tracking), int(habit_tracker_id), day))
+    return True
+
+
+def is_tracking_dedup(db):
+
+    """
+    This function checks whether the deduplication of check-offs is enabled for the database, i.e. whether the unique
+    index on habit id and period exists.
+
+    :param db: initialized sqlite3 database connection
+
+    :return: True if only one row per habit and period is stored, otherwise False
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'tracking_period_unique'")
+    return cur.fetchone() is not None
+
+
+def enable_tracking_dedup(db):
+
+    """
+    This function enables the deduplication of check-offs. Existing check-offs of the same habit within the same period
+    are compacted into one row (see merge_tracking_periods) before a unique index on habit id and period is created.
+    The rollup tables and the run index are rebuilt afterwards. As only one row of a period is kept, the check-offs of
+    a weekly habit within a week are counted on the day of the kept check-off in the daily rollup from then on.
+
+    :param db: initialized sqlite3 database connection
+
+    :return: Number of removed duplicated rows
+    """
+
+    create_table_tracking(db)
+    try:
+        drop_rollup_triggers(db)
+        removed = merge_tracking_periods(db)
+        db.cursor().execute("CREATE UNIQUE INDEX IF NOT EXISTS tracking_period_unique ON tracking(habit_tracker_id, "
+                            "period_key)")
+        create_rollup_triggers(db)
+    except sqlite3.Error:
+        db.rollback()
+        raise
+    db.commit()
+    backfill_rollups(db)
+    rebuild_habit_runs(db)
+    return removed
+
+
+def merge_tracking_periods(db, habit_id=None, start=None):
+
+    """
+    This function is a support function (re-)calculating the period key (see tracking_period_key) of the check-offs of
+    all habits (or of one selected habit from a given day on), e.g. after the periodicity of a habit has been modified.
+    Check-offs of a habit falling into the same period are merged into the row stored first, which keeps its checkoff
+    date; the check-offs of the other rows are added to its check-off count and its last check-off time is the latest
+    one of all rows. The changes are committed by the caller.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: optional habit_id to recalculate the check-offs of one habit only
+    :param start: optional first day (YYYY-MM-DD) of the check-offs to be recalculated, only together with habit_id
+
+    :return: Number of removed (merged) rows
+    """
+
+    cur = db.cursor()
+    schedules = get_habit_schedules(db)
+    if habit_id is None:
+        cur.execute("SELECT tracking_id, habit_tracker_id, checkoff_date FROM tracking")
+    else:
+        cur.execute("SELECT tracking_id, habit_tracker_id, checkoff_date FROM tracking WHERE habit_tracker_id = ? "
+                    "AND checkoff_date >= ?", (int(habit_id), str(start or "0001-01-01")[:10]))
+    keys = [(x[0], x[1], tracking_period_key(schedules[x[1]][1] if x[1] in schedules else None, x[2]))
+            for x in cur.fetchall()]
+    cur.execute("CREATE TEMP TABLE tracking_period(tracking_id INTEGER PRIMARY KEY, habit_id INTEGER, period_key TEXT)")
+    try:
+        cur.executemany("INSERT INTO tracking_period VALUES(?, ?, ?)", keys)
+        cur.execute("""CREATE TEMP TABLE tracking_dedup AS SELECT MIN(tracking.tracking_id) AS keep_id,
+            SUM(COALESCE(checkoff_count, 1)) AS checkoff_count,
+            MAX(COALESCE(last_checkoff_date, checkoff_date)) AS last_checkoff
+            FROM tracking JOIN tracking_period ON tracking_period.tracking_id = tracking.tracking_id
+            GROUP BY habit_id, tracking_period.period_key HAVING COUNT(*) > 1""")
+        cur.execute("UPDATE tracking SET period_key = NULL "
+                    "WHERE tracking_id IN (SELECT tracking_id FROM tracking_period)")
+        cur.execute("""DELETE FROM tracking WHERE tracking_id IN (SELECT tracking_period.tracking_id
+            FROM tracking_period JOIN tracking_period AS kept ON kept.habit_id = tracking_period.habit_id
+            AND kept.period_key = tracking_period.period_key JOIN tracking_dedup ON keep_id = kept.tracking_id
+            WHERE tracking_period.tracking_id != keep_id)""")
+        removed = cur.rowcount
+        cur.execute("""UPDATE tracking SET
+            checkoff_count = (SELECT checkoff_count FROM tracking_dedup WHERE keep_id = tracking_id),
+            last_checkoff_date = (SELECT last_checkoff FROM tracking_dedup WHERE keep_id = tracking_id)
+            WHERE tracking_id IN (SELECT keep_id FROM tracking_dedup)""")
+        cur.execute("""UPDATE tracking SET period_key = (SELECT period_key FROM tracking_period
+            WHERE tracking_period.tracking_id = tracking.tracking_id)
+            WHERE tracking_id IN (SELECT tracking_id FROM tracking_period)""")
+    finally:
+        cur.execute("DROP TABLE IF EXISTS temp.tracking_dedup")
+        cur.execute("DROP TABLE temp.tracking_period")
+    return removed
+
+
+# Functions for updating habits
+@retry_locked
+def update_habit_task(db, task, name):
+
+    """
+    This function is used for updating the task of a selected habit in the database. The datetime of modification will
+    be stored in the column "update_date".
+
+    :param db: initialized sqlite3 database connection
+    :param task: updated task specification
+    :param name: name of the habit for which the task specification should be modified
+    """
+    cur = db.cursor()
+    date_update = datetime.datetime.today()
+    cur.execute("UPDATE habit SET task = ? WHERE name = ?", (task, name))
+    cur.execute("UPDATE habit SET update_date = ? WHERE name = ?", (date_update, name))
+    db.commit()
+
+
+@retry_locked
+def update_habit_periodicity(db, periodicity, name, effective_from=None):
+
+    """
+    This function is used for updating the periodicity of a selected habit in the database. The datetime of modification
+    will be stored in the column "update_date". The new periodicity applies from the given day on, the check-offs
+    before keep counting with the former periodicity (see record_schedule_change).
+
+    :param db: initialized sqlite3 database connection
+    :param periodicity: updated periodicity (see add_habit_data)
+    :param name: name of the habit for which the periodicity should be modified
+    :param effective_from: first day (datetime.date or YYYY-MM-DD) of the new periodicity, by default today
+    """
+
+    cur = db.cursor()
+    date_update = datetime.datetime.today()
+    Schedule.parse(periodicity)
+    rows = cur.execute("SELECT habit_id, periodicity, schedule_type, schedule_interval, schedule_days, "
+                       "schedule_anchor FROM habit WHERE name = ?", (name,)).fetchall()
+    for row in rows:
+        previous = Schedule.from_row(*row[1:])
+        schedule = modified_schedule(previous, periodicity, effective_from or date_update)
+        cur.execute("UPDATE habit SET periodicity = ?, schedule_type = ?, schedule_interval = ?, schedule_days = ?, "
+                    "schedule_anchor = ?, update_date = ? WHERE habit_id = ?",
+                    (schedule.label(),) + schedule_columns(schedule) + (date_update, row[0]))
+        record_schedule_change(db, row[0], previous, schedule, effective_from or date_update)
+    db.commit()
+
+
+@retry_locked
+def update_habit(db, task, periodicity, name, effective_from=None):
+
+    """
+    This function is used for updating the task and periodicity of a selected habit in the database. The datetime of
+    modification will be stored in the column "update_date". The new periodicity applies from the given day on, the
+    check-offs before keep counting with the former periodicity (see record_schedule_change).
+
+    :param db: initialized sqlite3 database connection
+    :param task: updated task specification
+    :param periodicity: updated periodicity (see add_habit_data)
+    :param name: name of the habit for which the task and periodicity should be modified
+    :param effective_from: first day (datetime.date or YYYY-MM-DD) of the new periodicity, by default today
+    """
+
+    cur = db.cursor()
+    date_update = datetime.datetime.today()
+    Schedule.parse(periodicity)
+    rows = cur.execute("SELECT habit_id, periodicity, schedule_type, schedule_interval, schedule_days, "
+                       "schedule_anchor FROM habit WHERE name = ?", (name,)).fetchall()
+    for row in rows:
+        previous = Schedule.from_row(*row[1:])
+        schedule = modified_schedule(previous, periodicity, effective_from or date_update)
+        cur.execute("UPDATE habit SET task = ?, periodicity = ?, schedule_type = ?, schedule_interval = ?, "
+                    "schedule_days = ?, schedule_anchor = ?, update_date = ? WHERE habit_id = ?",
+                    (task, schedule.label()) + schedule_columns(schedule) + (date_update, row[0]))
+        record_schedule_change(db, row[0], previous, schedule, effective_from or date_update)
+    db.commit()
+
+
+def record_schedule_change(db, habit_id, previous, schedule, effective_from):
+
+    """
+    This function is a support function storing a modified periodicity in the schedule history of a habit: the new
+    schedule applies from the given day on and replaces all schedules which would have applied later. With the first
+    modification of a habit, its former schedule is stored as well (applying from 0001-01-01 on). Only the runs of the
+    habit from the period before the modification on are rebuilt (see rebuild_habit_runs); the check-offs are kept. If
+    the deduplication of check-offs is enabled, the check-offs from the modification on are assigned to the periods of
+    the new schedule (see merge_tracking_periods).
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: habit_id of the habit
+    :param previous: schedule (periodicity.Schedule) of the habit before the modification
+    :param schedule: new schedule (periodicity.Schedule) of the habit
+    :param effective_from: first day (datetime.date, datetime or YYYY-MM-DD) of the new schedule
+    """
+
+    cur = db.cursor()
+    day = str(effective_from)[:10]
+    cur.execute("SELECT COUNT(*) FROM habit_schedule_history WHERE habit_id = ?", (int(habit_id),))
+    if cur.fetchone()[0] == 0:
+        if schedule == previous:
+            return
+        cur.execute("INSERT INTO habit_schedule_history(habit_id, effective_from, periodicity, schedule_type, "
+                    "schedule_interval, schedule_days, schedule_anchor) VALUES(?, '0001-01-01', ?, ?, ?, ?, ?)",
+                    (int(habit_id), previous.label()) + schedule_columns(previous))
+    cur.execute("DELETE FROM habit_schedule_history WHERE habit_id = ? AND effective_from >= ?", (int(habit_id), day))
+    cur.execute("SELECT periodicity, schedule_type, schedule_interval, schedule_days, schedule_anchor "
+                "FROM habit_schedule_history WHERE habit_id = ? ORDER BY effective_from DESC LIMIT 1", (int(habit_id),))
+    row = cur.fetchone()
+    if row is None or Schedule.from_row(*row) != schedule:
+        cur.execute("INSERT INTO habit_schedule_history(habit_id, effective_from, periodicity, schedule_type, "
+                    "schedule_interval, schedule_days, schedule_anchor) VALUES(?, ?, ?, ?, ?, ?, ?)",
+                    (int(habit_id), day, schedule.label()) + schedule_columns(schedule))
+    if is_tracking_dedup(db):
+        merge_tracking_periods(db, habit_id, day)
+    rebuild_habit_runs(db, habit_id, commit=False, start=day)
+
+
+# Functions for deleting habits
+@retry_locked
+def delete_habit_data(db, name):
+
+    """
+    This function deletes a selected habit from the table "habit" as well as its runs from the run index and its
+    schedule history
+
+    :param db: initialized sqlite3 database connection
+    :param name: name of the habit which should be deleted
+    """
+
+    cur = db.cursor()
+    cur.execute("DELETE FROM habit_runs WHERE habit_id IN (SELECT habit_id FROM habit WHERE name = ?)", (name,))
+    cur.execute("DELETE FROM habit_schedule_history WHERE habit_id IN (SELECT habit_id FROM habit WHERE name = ?)",
+                (name,))
+    cur.execute("DELETE FROM habit WHERE name=?", (name,))
+    db.commit()
+
+
+@retry_locked
+def delete_tracking_data(db, name, commit=True):
+
+    """
+    This function deletes all check off dates and related data from the table "tracking", the archive as well as the run
+    index for a selected habit
+
+    :param db: initialized sqlite3 database connection
+    :param name: name of the habit for which the tracking data should be deleted
+    :param commit: whether the deletion should be committed immediately or together with further writes by the caller
+    """
+
+    cur = db.cursor()
+    habit_tracking_id = str(cur.execute("SELECT DISTINCT habit_id FROM habit WHERE name = ?", (name,)))
+    habit_tracking_id = cur.fetchone()[0]
+    cur.execute("DELETE FROM tracking WHERE habit_tracker_id=?", (habit_tracking_id,))
+    cur.execute("DELETE FROM habit_runs WHERE habit_id=?", (habit_tracking_id,))
+    for table_name in get_archive_tables(db):
+        cur.execute("DELETE FROM " + table_name + " WHERE habit_tracker_id=?", (habit_tracking_id,))
+    for blob in list(get_archive_blobs(db, habit_tracking_id)):
+        record_tracking_changes(db, "delete", get_archive_blob_ids(db, blob[0], blob[1], 0))
+    cur.execute("DELETE FROM tracking_archive_blob WHERE habit_id=?", (habit_tracking_id,))
+    cur.execute("DELETE FROM tracking_archive_summary WHERE habit_id=?", (habit_tracking_id,))
+    cur.execute("DELETE FROM tracking_daily_rollup WHERE habit_id=?", (habit_tracking_id,))
+    cur.execute("DELETE FROM tracking_weekly_rollup WHERE habit_id=?", (habit_tracking_id,))
+    refresh_archive_counts(db)
+    if commit:
+        db.commit()
+
+
+@retry_locked
+def delete_checkoff(db, habit_tracker_id, day):
+
+    """
+    This function deletes all check-offs of a habit on the selected day (e.g. a check-off entered by mistake), also if
+    they have already been archived, and updates the run index of the habit.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_tracker_id: habit_id of the habit
+    :param day: day of the check-offs to be deleted (datetime.date or YYYY-MM-DD)
+
+    :return: Number of deleted check-offs
+    """
+
+    cur = db.cursor()
+    day = str(day)[:10]
+    next_day = (datetime.date.fromisoformat(day) + datetime.timedelta(days=1)).isoformat()
+    cur.execute("DELETE FROM tracking WHERE habit_tracker_id = ? AND checkoff_date >= ? AND checkoff_date < ?",
+                (int(habit_tracker_id), day, next_day))
+    deleted = cur.rowcount
+    table_name = get_archive_table(db, day)
+    if table_name is not None:
+        cur.execute("SELECT SUM(COALESCE(checkoff_count, 1)) FROM " + table_name + " WHERE habit_tracker_id = ? "
+                    "AND checkoff_date >= ? AND checkoff_date < ?", (int(habit_tracker_id), day, next_day))
+        removed = cur.fetchone()[0]
+        cur.execute("DELETE FROM " + table_name + " WHERE habit_tracker_id = ? AND checkoff_date >= ? "
+                    "AND checkoff_date < ?", (int(habit_tracker_id), day, next_day))
+        if cur.rowcount > 0:
+            deleted += cur.rowcount
+            remove_archived_day(db, habit_tracker_id, day, removed)
+    for blob in list(get_archive_blobs(db, habit_tracker_id, int(day[:4]), int(day[:4]))):
+        checkoffs = list(compression.decode_checkoffs(blob[2]))
+        ordinal = datetime.date.fromisoformat(day).toordinal()
+        ids = get_archive_blob_ids(db, blob[0], blob[1], len(checkoffs))
+        kept = [i for i, x in enumerate(checkoffs) if x[0] != ordinal]
+        if len(kept) < len(checkoffs):
+            deleted += len(checkoffs) - len(kept)
+            store_archive_blob(db, blob[0], blob[1], [checkoffs[i] for i in kept], [ids[i] for i in kept])
+            record_tracking_changes(db, "delete", [x for i, x in enumerate(ids) if checkoffs[i][0] == ordinal])
+            remove_archived_day(db, habit_tracker_id, day, sum(x[2] for x in checkoffs if x[0] == ordinal))
+    update_habit_runs(db, habit_tracker_id, day)
+    db.commit()
+    return deleted
+
+
+@retry_locked
+def delete_all_habit_tracking_data(db, commit=True):
+
+    """
+    This function deletes all data from the habit as well as tracking table, the archive and the run index.
+
+    :param db: initialized sqlite3 database connection
+    :param commit: whether the deletion should be committed immediately or together with further writes by the caller
+    """
+
+    cur = db.cursor()
+    cur.execute("DELETE FROM tracking")
+    cur.execute("DELETE FROM habit_runs")
+    for table_name in get_archive_tables(db):
+        record_tracking_changes(db, "delete", [x[0] for x in cur.execute("SELECT tracking_id FROM " + table_name)])
+        cur.execute("DROP TABLE " + table_name)
+    for blob in list(get_archive_blobs(db)):
+        record_tracking_changes(db, "delete", get_archive_blob_ids(db, blob[0], blob[1], 0))
+    cur.execute("DELETE FROM tracking_archive")
+    cur.execute("DELETE FROM tracking_archive_blob")
+    cur.execute("DELETE FROM tracking_archive_summary")
+    cur.execute("DROP VIEW IF EXISTS tracking_all")
+    cur.execute("DELETE FROM tracking_daily_rollup")
+    cur.execute("DELETE FROM tracking_weekly_rollup")
+    cur.execute("DELETE FROM habit_schedule_history")
+    cur.execute("DELETE FROM habit")
+    if commit:
+        db.commit()
+
+
+# Functions for archiving old check-offs
+def archive_tracking_data(db, horizon):
+
+    """
+    This function moves all check-offs before the horizon from the table "tracking" into one archive table per year
+    (e.g. "tracking_archive_2021") so that the tracking table and its index only hold the recent check-offs. The rollup
+    tables and the run index are not changed by moving the check-offs, therefore all streaks and rollups stay exact.
+    The number as well as the first and last time of the archived check-offs are summed up per habit in the table
+    "tracking_archive_summary"; habits without archived check-offs are never read from the archive. Analyses reading the
+    check-offs (see get_tracking_source) only include the archive if they need check-offs before the horizon.
+    Check-offs of a year whose archive has already been compressed (see compress_archive) are added to its blobs.
+
+    :param db: initialized sqlite3 database connection
+    :param horizon: first day (datetime.date or YYYY-MM-DD) whose check-offs are kept in the tracking table
+
+    :return: Number of archived check-offs
+    """
+
+    cur = db.cursor()
+    horizon = str(horizon)[:10]
+    datetime.date.fromisoformat(horizon)
+    try:
+        drop_rollup_triggers(db)
+        drop_changelog_triggers(db, ("tracking",))
+        cur.execute("""INSERT INTO tracking_archive_summary
+            SELECT habit_tracker_id, SUM(COALESCE(checkoff_count, 1)), MIN(checkoff_date),
+            MAX(COALESCE(last_checkoff_date, checkoff_date))
+            FROM tracking WHERE checkoff_date < ? GROUP BY habit_tracker_id
+            ON CONFLICT(habit_id) DO UPDATE SET
+            checkoff_count = checkoff_count + excluded.checkoff_count,
+            first_checkoff = min(first_checkoff, excluded.first_checkoff),
+            last_checkoff = max(last_checkoff, excluded.last_checkoff)""", (horizon,))
+        cur.execute("SELECT DISTINCT CAST(STRFTIME('%Y', checkoff_date) AS INTEGER) FROM tracking "
+                    "WHERE checkoff_date < ?", (horizon,))
+        for year in [x[0] for x in cur.fetchall()]:
+            table_name = f"tracking_archive_{year}"
+            cur.execute("CREATE TABLE IF NOT EXISTS " + table_name + """(
+                tracking_id INTEGER PRIMARY KEY,
+                habit_tracker_id INTEGER,
+                checkoff_date DATETIME,
+                period_key TEXT,
+                checkoff_count INTEGER DEFAULT 1,
+                last_checkoff_date DATETIME)""")
+            cur.execute("CREATE INDEX IF NOT EXISTS " + table_name + "_habit_date ON " + table_name +
+                        "(habit_tracker_id, checkoff_date)")
+            cur.execute("INSERT INTO " + table_name + " SELECT tracking_id, habit_tracker_id, checkoff_date, period_key, "
+                        "checkoff_count, last_checkoff_date FROM tracking WHERE checkoff_date >= ? "
+                        "AND checkoff_date < min(?, ?)", (f"{year:04d}-01-01", f"{year + 1:04d}-01-01", horizon))
+            cur.execute("INSERT INTO tracking_archive VALUES(?, ?, 0, ?, 0) ON CONFLICT(year) DO UPDATE SET "
+                        "archived_until = max(archived_until, excluded.archived_until)", (year, table_name, horizon))
+            cur.execute("SELECT compressed FROM tracking_archive WHERE year = ?", (year,))
+            if cur.fetchone()[0]:
+                compress_archive_table(db, year, table_name)
+        cur.execute("DELETE FROM tracking WHERE checkoff_date < ?", (horizon,))
+        archived = cur.rowcount
+        cur.execute("UPDATE tracking_archive SET archived_until = max(archived_until, ?)", (horizon,))
+        refresh_archive_counts(db)
+        create_tracking_view(db)
+        create_rollup_triggers(db)
+        create_changelog_triggers(db, ("tracking",))
+    except sqlite3.Error:
+        db.rollback()
+        raise
+    db.commit()
+    return archived
+
+
+def refresh_archive_counts(db):
+
+    """
+    This function is a support function which recounts the check-offs of each archive table after archived check-offs
+    have been added or deleted.
+
+    :param db: initialized sqlite3 database connection
+    """
+
+    cur = db.cursor()
+    for table_name in get_archive_tables(db):
+        cur.execute("UPDATE tracking_archive SET checkoff_count = (SELECT COUNT(*) FROM " + table_name + ") "
+                    "WHERE table_name = ?", (table_name,))
+    cur.execute("UPDATE tracking_archive SET checkoff_count = (SELECT COALESCE(SUM(checkoff_count), 0) "
+                "FROM tracking_archive_blob WHERE tracking_archive_blob.year = tracking_archive.year) WHERE compressed = 1")
+    cur.execute("DELETE FROM tracking_archive_summary WHERE checkoff_count <= 0")
+
+
+def remove_archived_day(db, habit_tracker_id, day, removed):
+
+    """
+    This function is a support function which removes a day from the rollup tables and the archive summary after the
+    archived check-offs of a habit on that day have been deleted, as the rollup triggers only watch the tracking table.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_tracker_id: habit_id of the habit
+    :param day: day of the deleted check-offs (YYYY-MM-DD)
+    :param removed: number of deleted archived check-offs
+    """
+
+    cur = db.cursor()
+    cur.execute("DELETE FROM tracking_daily_rollup WHERE habit_id = ? AND day = ?", (int(habit_tracker_id), day))
+    cur.execute("""UPDATE tracking_weekly_rollup SET
+        checkoff_count = (SELECT SUM(checkoff_count) FROM tracking_daily_rollup AS daily
+            WHERE daily.habit_id = tracking_weekly_rollup.habit_id AND day >= week_start
+            AND day < date(week_start, '+7 days')),
+        first_checkoff = (SELECT MIN(first_checkoff) FROM tracking_daily_rollup AS daily
+            WHERE daily.habit_id = tracking_weekly_rollup.habit_id AND day >= week_start
+            AND day < date(week_start, '+7 days')),
+        last_checkoff = (SELECT MAX(last_checkoff) FROM tracking_daily_rollup AS daily
+            WHERE daily.habit_id = tracking_weekly_rollup.habit_id AND day >= week_start
+            AND day < date(week_start, '+7 days'))
+        WHERE habit_id = ? AND week_start = date(?, '-6 days', 'weekday 1')""", (int(habit_tracker_id), day))
+    cur.execute("DELETE FROM tracking_weekly_rollup WHERE checkoff_count IS NULL")
+    cur.execute("UPDATE tracking_archive_summary SET checkoff_count = checkoff_count - ? WHERE habit_id = ?",
+                (removed, int(habit_tracker_id)))
+    refresh_archive_counts(db)
+
+
+def compress_archive(db, year=None):
+
+    """
+    This function compresses the archive tables of all years (or of one selected year): the check-offs of each habit
+    within a year are stored as one blob (see compression.encode_checkoffs) in the table "tracking_archive_blob" and the
+    archive table of the year is dropped. The compressed check-offs are still read by all analyses. As the blobs only
+    keep the day, the time (in minutes) and the number of each check-off, the last check-off time of a deduplicated
+    check-off (see enable_tracking_dedup) is not kept. The space of the dropped tables is only given back to the file
+    system when the database is vacuumed.
+
+    :param db: initialized sqlite3 database connection
+    :param year: optional year whose archive should be compressed
+
+    :return: Number of compressed check-offs
+    """
+
+    cur = db.cursor()
+    if year is None:
+        cur.execute("SELECT year, table_name, checkoff_count FROM tracking_archive WHERE compressed = 0")
+    else:
+        cur.execute("SELECT year, table_name, checkoff_count FROM tracking_archive WHERE compressed = 0 AND year = ?",
+                    (int(year),))
+    compressed = 0
+    try:
+        for row in cur.fetchall():
+            compress_archive_table(db, row[0], row[1])
+            compressed += row[2]
+        create_tracking_view(db)
+        refresh_archive_counts(db)
+    except sqlite3.Error:
+        db.rollback()
+        raise
+    db.commit()
+    return compressed
+
+
+def compress_archive_table(db, year, table_name):
+
+    """
+    This function is a support function which adds the check-offs of an archive table to the blobs of its year and
+    drops the table.
+
+    :param db: initialized sqlite3 database connection
+    :param year: year of the archive table
+    :param table_name: name of the archive table
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT habit_tracker_id, CAST(julianday(date(checkoff_date)) - 1721424.5 AS INTEGER), "
+                "CAST(STRFTIME('%H', checkoff_date) AS INTEGER) * 60 + CAST(STRFTIME('%M', checkoff_date) AS INTEGER), "
+                "COALESCE(checkoff_count, 1), tracking_id FROM " + table_name +
+                " ORDER BY habit_tracker_id, checkoff_date")
+    for habit_id, rows in itertools.groupby(cur.fetchall(), key=lambda x: x[0]):
+        rows = list(rows)
+        checkoffs = [x[1:4] for x in rows]
+        ids = [x[4] for x in rows]
+        for blob in list(get_archive_blobs(db, habit_id, year, year)):
+            compressed = list(compression.decode_checkoffs(blob[2]))
+            checkoffs += compressed
+            ids += get_archive_blob_ids(db, habit_id, year, len(compressed))
+        store_archive_blob(db, habit_id, year, checkoffs, ids)
+    cur.execute("DROP TABLE " + table_name)
+    cur.execute("UPDATE tracking_archive SET compressed = 1 WHERE year = ?", (year,))
+
+
+def store_archive_blob(db, habit_id, year, checkoffs, tracking_ids):
+
+    """
+    This function is a support function storing the compressed check-offs of a habit within a year together with their
+    tracking ids, which are sorted along with the check-offs (see compression.encode_checkoffs). The blob is deleted if
+    no check-off is left.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: habit_id of the habit
+    :param year: year of the check-offs
+    :param checkoffs: list of tuples of day, minutes after midnight and number of check-offs
+    :param tracking_ids: list of the tracking ids of the check-offs in the same order
+    """
+
+    cur = db.cursor()
+    pairs = sorted(zip(checkoffs, tracking_ids))
+    if not pairs:
+        cur.execute("DELETE FROM tracking_archive_blob WHERE habit_id = ? AND year = ?", (habit_id, year))
+        return
+    cur.execute("INSERT OR REPLACE INTO tracking_archive_blob(habit_id, year, checkoff_count, data, tracking_ids, "
+                "min_tracking_id, max_tracking_id) VALUES(?, ?, ?, ?, ?, ?, ?)",
+                (habit_id, year, len(pairs), compression.encode_checkoffs([x[0] for x in pairs]),
+                 compression.encode_ids([x[1] for x in pairs])) + tracking_id_range(x[1] for x in pairs))
+
+
+def get_archive_blob_ids(db, habit_id, year, count):
+
+    """
+    This function is a support function selecting the tracking ids of the compressed check-offs of a habit within a
+    year in the order of the check-offs (see compression.decode_checkoffs).
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: habit_id of the habit
+    :param year: year of the check-offs
+    :param count: number of compressed check-offs, used for blobs compressed before the tracking ids were kept
+
+    :return: List of the tracking ids, 0 for each check-off of a blob without tracking ids
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT tracking_ids FROM tracking_archive_blob WHERE habit_id = ? AND year = ?", (habit_id, year))
+    row = cur.fetchone()
+    if row is None or row[0] is None:
+        return [0] * count
+    return compression.decode_ids(row[0])
+
+
+def get_archive_blobs(db, habit_id=None, first_year=None, last_year=None, reverse=False):
+
+    """
+    This function walks the compressed archive of all habits (or of one selected habit) ordered by habit and year.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: optional habit_id to select the blobs of one habit only
+    :param first_year: optional first year of the selected blobs
+    :param last_year: optional last year of the selected blobs
+    :param reverse: whether the blobs of a habit should be ordered latest year first
+
+    :return: Generator of tuples of habit id, year and blob (see compression.decode_checkoffs)
+    """
+
+    cur = db.cursor()
+    query = "SELECT habit_id, year, data FROM tracking_archive_blob WHERE 1"
+    parameters = []
+    if habit_id is not None:
+        query += " AND habit_id = ?"
+        parameters.append(int(habit_id))
+    if first_year is not None:
+        query += " AND year >= ?"
+        parameters.append(int(first_year))
+    if last_year is not None:
+        query += " AND year <= ?"
+        parameters.append(int(last_year))
+    query += " ORDER BY habit_id, year DESC" if reverse else " ORDER BY habit_id, year"
+    cur.execute(query, parameters)
+    for row in cur:
+        yield row
+
+
+def format_checkoff(day, minutes):
+
+    """
+    This function is a support function formatting the day and time of a compressed check-off like the checkoff dates
+    of the tracking table.
+
+    :param day: check-off day as proleptic Gregorian ordinal
+    :param minutes: check-off time as minutes after midnight
+
+    :return: Check-off date (YYYY-MM-DD HH:MM)
+    """
+
+    return f"{datetime.date.fromordinal(day).isoformat()} {minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def create_tracking_view(db):
+
+    """
+    This function (re-)creates the view "tracking_all" joining the check-offs of all archive tables and the tracking
+    table. SQLite passes conditions on the view (e.g. on habit id and checkoff date) on to each table and its index.
+
+    :param db: initialized sqlite3 database connection
+    """
+
+    cur = db.cursor()
+    columns = "tracking_id, habit_tracker_id, checkoff_date, period_key, checkoff_count, last_checkoff_date"
+    cur.execute("DROP VIEW IF EXISTS tracking_all")
+    cur.execute("CREATE VIEW tracking_all AS " + " UNION ALL ".join(
+        "SELECT " + columns + " FROM " + x for x in get_archive_tables(db) + ["tracking"]))
+
+
+def get_archive_tables(db):
+
+    """
+    This function selects the names of all (not compressed) archive tables ordered by year.
+
+    :param db: initialized sqlite3 database connection
+
+    :return: List of the names of the archive tables
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT table_name FROM tracking_archive WHERE compressed = 0 ORDER BY year")
+    return list(map(lambda x: x[0], cur.fetchall()))
+
+
+def get_archive_table(db, day):
+
+    """
+    This function selects the archive table of the year of a day.
+
+    :param db: initialized sqlite3 database connection
+    :param day: day (YYYY-MM-DD)
+
+    :return: Name of the archive table or None if no check-offs of the year have been archived or the archive of the
+    year has been compressed
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT table_name FROM tracking_archive WHERE year = ? AND compressed = 0", (int(str(day)[:4]),))
+    row = cur.fetchone()
+    return None if row is None else row[0]
+
+
+def get_archive_horizon(db):
+
+    """
+    This function selects the date until which check-offs have been archived.
+
+    :param db: initialized sqlite3 database connection
+
+    :return: First day (YYYY-MM-DD) whose check-offs are not archived or None if nothing has been archived
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT MAX(archived_until) FROM tracking_archive")
+    return cur.fetchone()[0]
+
+
+def get_tracking_source(db, start=None, habit_id=None):
+
+    """
+    This function selects the table check-offs should be read from: the tracking table if no check-offs before the
+    given day (or of the given habit) have been archived, otherwise the view "tracking_all" including the archive.
+
+    :param db: initialized sqlite3 database connection
+    :param start: optional first day (YYYY-MM-DD) of the check-offs to be read
+    :param habit_id: optional habit_id of the habit whose check-offs should be read
+
+    :return: "tracking" or "tracking_all"
+    """
+
+    horizon = get_archive_horizon(db)
+    if horizon is None or (start is not None and str(start) >= horizon):
+        return "tracking"
+    if habit_id is not None:
+        cur = db.cursor()
+        cur.execute("SELECT 1 FROM tracking_archive_summary WHERE habit_id = ?", (int(habit_id),))
+        if cur.fetchone() is None:
+            return "tracking"
+    return "tracking_all"
+
+
+# Functions for the analysis module
+def get_habit_data(db):
+
+    """
+    This function selects all data entries from the table "habit" as a basis for the analysis modules.
+
+    :param db: initialized sqlite3 database connection
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT habit_id, name, task, periodicity, STRFTIME('%Y-%m-%d %H:%M', creation_date), "
+                "STRFTIME('%Y-%m-%d %H:%M',update_date) FROM habit")
+    return cur.fetchall()
+
+
+# Columns by which a page of habits can be sorted (see get_habit_page)
+HABIT_SORT_COLUMNS = ("name", "periodicity", "creation_date", "update_date", "habit_id")
+
+
+def get_habit_page(db, periodicity=None, sort="name", descending=False, limit=None, offset=0):
+
+    """
+    This function walks the habits (or the habits of one periodicity) sorted and paged by the database, so that only
+    the rows of the requested page are read. The rows are yielded lazily.
+
+    :param db: initialized sqlite3 database connection
+    :param periodicity: optional periodicity of the selected habits
+    :param sort: column by which the habits are sorted (see HABIT_SORT_COLUMNS), ties are sorted by habit_id; a
+    ValueError is raised for any other column
+    :param descending: whether the habits should be sorted in descending order
+    :param limit: optional maximum number of habits
+    :param offset: number of habits skipped before the first selected habit
+
+    :return: Generator of tuples of name, task, periodicity as well as creation and update datetime of each habit
+    """
+
+    if sort not in HABIT_SORT_COLUMNS:
+        raise ValueError(f"Habits cannot be sorted by {sort}")
+    direction = " DESC" if descending else ""
+    query = ("SELECT name, task, periodicity, STRFTIME('%Y-%m-%d %H:%M', creation_date), "
+             "STRFTIME('%Y-%m-%d %H:%M', update_date) FROM habit")
+    parameters = []
+    if periodicity is not None:
+        query += " WHERE periodicity = ?"
+        parameters.append(periodicity)
+    query += " ORDER BY " + sort + direction + ", habit_id" + direction + " LIMIT ? OFFSET ?"
+    parameters += [-1 if limit is None else int(limit), int(offset)]
+    cur = db.cursor()
+    cur.execute(query, parameters)
+    for row in cur:
+        yield row
+
+
+def get_tracking_data(db):
+    """
+    This function selects all data entries from the table "tracking" (including archived check-offs) as a basis for the
+    analysis modules.
+
+    :param db: initialized sqlite3 database connection
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT habit_tracker_id AS habit_id, STRFTIME('%Y-%m-%d', checkoff_date) FROM " +
+                get_tracking_source(db))
+    data = cur.fetchall()
+    for habit_id, year, blob in get_archive_blobs(db):
+        data += [(habit_id, datetime.date.fromordinal(x).isoformat()) for x in compression.decode_days(blob)]
+    return data
+
+
+def get_habit_schedules(db):
+
+    """
+    This function selects the schedule of all habits as a basis for the streak calculations.
+
+    :param db: initialized sqlite3 database connection
+
+    :return: Dictionary of habit id to a tuple of name and schedule (periodicity.Schedule, or
+    periodicity.ScheduleHistory if the periodicity has been modified) of each habit
+    """
+
+    cur = db.cursor()
+    history = get_schedule_history(db)
+    cur.execute("SELECT habit_id, name, periodicity, schedule_type, schedule_interval, schedule_days, schedule_anchor "
+                "FROM habit")
+    return dict((x[0], (x[1], history.get(x[0]) or Schedule.from_row(*x[2:]))) for x in cur.fetchall())
+
+
+def get_habit_schedule(db, name):
+
+    """
+    This function selects the id and schedule of one habit by its name.
+
+    :param db: initialized sqlite3 database connection
+    :param name: name of the habit
+
+    :return: Tuple of habit id and schedule (periodicity.Schedule) of the habit or None if there is no habit with the
+    name
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT habit_id, periodicity, schedule_type, schedule_interval, schedule_days, schedule_anchor "
+                "FROM habit WHERE name = ?", (name,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return row[0], get_schedule_history(db, row[0]).get(row[0]) or Schedule.from_row(*row[1:])
+
+
+def get_habit_schedule_by_id(db, habit_id):
+
+    """
+    This function selects the schedule of one habit by its habit_id.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: habit_id of the habit
+
+    :return: Schedule (periodicity.Schedule or periodicity.ScheduleHistory) of the habit or None if there is no habit
+    with the habit_id
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT periodicity, schedule_type, schedule_interval, schedule_days, schedule_anchor FROM habit "
+                "WHERE habit_id = ?", (int(habit_id),))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return get_schedule_history(db, habit_id).get(int(habit_id)) or Schedule.from_row(*row)
+
+
+def get_schedule_history(db, habit_id=None):
+
+    """
+    This function selects the schedule history of all habits (or of one selected habit) whose periodicity has been
+    modified.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: optional habit_id to select the schedule history of one habit only
+
+    :return: Dictionary of habit id to the schedule history (periodicity.ScheduleHistory) of the habit
+    """
+
+    cur = db.cursor()
+    query = ("SELECT habit_id, effective_from, periodicity, schedule_type, schedule_interval, schedule_days, "
+             "schedule_anchor FROM habit_schedule_history")
+    if habit_id is None:
+        cur.execute(query + " ORDER BY habit_id, effective_from")
+    else:
+        cur.execute(query + " WHERE habit_id = ? ORDER BY effective_from", (int(habit_id),))
+    return dict((x, ScheduleHistory([(datetime.date.fromisoformat(y[1]).toordinal(), Schedule.from_row(*y[2:]))
+                                     for y in rows]))
+                for x, rows in itertools.groupby(cur.fetchall(), key=lambda x: x[0]))
+
+
+def get_tracking_days_habit(db, habit_tracker_id, start=None):
+
+    """
+    This function walks the check-offs of one habit ordered by checkoff date using the index on habit id and checkoff
+    date, i.e. only the rows of the selected habit are read. Archived check-offs are included if the habit has any.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_tracker_id: habit_id of the habit whose check-offs should be read
+    :param start: optional first day (datetime.date) of the check-offs to be read
+
+    :return: Generator of check-off days as proleptic Gregorian ordinals in ascending order
+    """
+
+    cur = db.cursor()
+    first = "0001-01-01" if start is None else start.isoformat()
+    source = get_tracking_source(db, None if start is None else first, habit_tracker_id)
+    cur.execute("SELECT CAST(julianday(date(checkoff_date)) - 1721424.5 AS INTEGER) FROM " + source +
+                " WHERE habit_tracker_id = ? AND checkoff_date >= ? ORDER BY checkoff_date",
+                (int(habit_tracker_id), first))
+    days = map(lambda x: x[0], cur)
+    if source == "tracking_all":
+        first_day = datetime.date.fromisoformat(first).toordinal()
+        days = heapq.merge(itertools.chain.from_iterable(
+            itertools.dropwhile(lambda y: y < first_day, compression.decode_days(x[2]))
+            for x in get_archive_blobs(db, habit_tracker_id, None if start is None else start.year)), days)
+    for day in days:
+        yield day
+
+
+def get_tracking_days(db):
+
+    """
+    This function walks the check-offs of all habits ordered by habit and checkoff date using the index on habit id
+    and checkoff date, including the archived check-offs. The rows are yielded lazily so that the check-offs do not need
+    to be held in memory at once.
+
+    :param db: initialized sqlite3 database connection
+
+    :return: Generator of tuples of habit id and check-off day as proleptic Gregorian ordinal
+    """
+
+    for chunk in get_tracking_day_chunks(db):
+        for row in chunk:
+            yield row
+
+
+def get_tracking_day_chunks(db, chunk_rows=TRACKING_CHUNK_ROWS):
+
+    """
+    This function reads the check-offs of all habits ordered by habit and checkoff date (see get_tracking_days) in
+    batches of a fixed number of rows, so that at most one batch is held in memory at once. The check-offs of one habit
+    can be split across subsequent batches.
+
+    :param db: initialized sqlite3 database connection
+    :param chunk_rows: maximum number of rows per batch
+
+    :return: Generator of lists of tuples of habit id and check-off day as proleptic Gregorian ordinal
+    """
+
+    cur = db.cursor()
+    source = get_tracking_source(db)
+    cur.execute("SELECT habit_tracker_id, CAST(julianday(date(checkoff_date)) - 1721424.5 AS INTEGER) FROM " +
+                source + " ORDER BY habit_tracker_id, checkoff_date")
+    if source == "tracking_all":
+        rows = heapq.merge(((x[0], day) for x in get_archive_blobs(db) for day in compression.decode_days(x[2])), cur)
+        chunks = iter(lambda: list(itertools.islice(rows, chunk_rows)), [])
+    else:
+        chunks = iter(lambda: cur.fetchmany(chunk_rows), [])
+    for chunk in chunks:
+        yield chunk
+
+
+def get_recent_tracking_days(db, habit_tracker_id):
+
+    """
+    This function walks the check-offs of one habit from the most recent to the oldest one by scanning the index on
+    habit id and checkoff date backwards. As the rows are yielded lazily, a caller can stop as soon as it has seen
+    enough check-offs without reading the remaining history of the habit. The archive is only read once all check-offs
+    after the archive horizon have been walked.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_tracker_id: habit_id of the habit whose check-offs should be read
+
+    :return: Generator of check-off days as proleptic Gregorian ordinals (see datetime.date.toordinal), latest first
+    """
+
+    cur = db.cursor()
+    horizon = get_archive_horizon(db)
+    if get_tracking_source(db, habit_id=habit_tracker_id) == "tracking":
+        cur.execute("SELECT CAST(julianday(date(checkoff_date)) - 1721424.5 AS INTEGER) FROM tracking "
+                    "WHERE habit_tracker_id = ? ORDER BY checkoff_date DESC", (int(habit_tracker_id),))
+        for row in cur:
+            yield row[0]
+        return
+    cur.execute("SELECT CAST(julianday(date(checkoff_date)) - 1721424.5 AS INTEGER) FROM tracking "
+                "WHERE habit_tracker_id = ? AND checkoff_date >= ? ORDER BY checkoff_date DESC",
+                (int(habit_tracker_id), horizon))
+    for row in cur:
+        yield row[0]
+    cur = db.cursor()
+    cur.execute("SELECT CAST(julianday(date(checkoff_date)) - 1721424.5 AS INTEGER) FROM tracking_all "
+                "WHERE habit_tracker_id = ? AND checkoff_date < ? ORDER BY checkoff_date DESC",
+                (int(habit_tracker_id), horizon))
+    archived = (day for x in get_archive_blobs(db, habit_tracker_id, reverse=True)
+                for day in compression.decode_days(x[2], reverse=True))
+    for day in heapq.merge(map(lambda x: x[0], cur), archived, reverse=True):
+        yield day
+
+
+def get_daily_rollup(db, start, end, habit_id=None):
+
+    """
+    This function selects the daily rollup of all habits (or of one selected habit) for the days within the given
+    window, ordered by habit and day.
+
+    :param db: initialized sqlite3 database connection
+    :param start: first day of the window (YYYY-MM-DD)
+    :param end: last day of the window (YYYY-MM-DD)
+    :param habit_id: optional habit_id to restrict the rollup to one habit
+
+    :return: List of habit id, day, number of check-offs as well as first and last check-off time
+    """
+
+    cur = db.cursor()
+    if habit_id is None:
+        cur.execute("SELECT habit_id, day, checkoff_count, first_checkoff, last_checkoff FROM tracking_daily_rollup "
+                    "WHERE day BETWEEN ? AND ? ORDER BY habit_id, day", (str(start), str(end)))
+    else:
+        cur.execute("SELECT habit_id, day, checkoff_count, first_checkoff, last_checkoff FROM tracking_daily_rollup "
+                    "WHERE habit_id = ? AND day BETWEEN ? AND ? ORDER BY day", (int(habit_id), str(start), str(end)))
+    return cur.fetchall()
+
+
+def get_weekly_rollup(db, start, end):
+
+    """
+    This function selects the weekly rollup of all habits for the weeks starting within the given window.
+
+    :param db: initialized sqlite3 database connection
+    :param start: first day of the window (YYYY-MM-DD)
+    :param end: last day of the window (YYYY-MM-DD)
+
+    :return: List of habit id, Monday of the week, ISO year, ISO week, number of check-offs as well as first and last
+    check-off time
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT habit_id, week_start, iso_year, iso_week, checkoff_count, first_checkoff, last_checkoff "
+                "FROM tracking_weekly_rollup WHERE week_start BETWEEN ? AND ?", (str(start), str(end)))
+    return cur.fetchall()
+
+
+def get_weekday_rollup(db):
+
+    """
+    This function sums up the daily rollup of all habits per weekday (0 = Sunday, ..., 6 = Saturday).
+
+    :param db: initialized sqlite3 database connection
+
+    :return: List of habit id, weekday and number of check-offs
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT habit_id, CAST(STRFTIME('%w', day) AS INTEGER), SUM(checkoff_count) "
+                "FROM tracking_daily_rollup GROUP BY habit_id, STRFTIME('%w', day)")
+    return cur.fetchall()
+
+
+def get_habit_runs(db, habit_id=None, min_length=1, start=None, end=None, limit=None):
+
+    """
+    This function selects runs from the run index, joined with the name and periodicity of their habits and ordered by
+    length (longest first).
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: optional habit_id to select the runs of one habit only
+    :param min_length: minimum length of the selected runs
+    :param start: optional first day (YYYY-MM-DD) a selected run has to reach
+    :param end: optional last day (YYYY-MM-DD) before which a selected run has to start
+    :param limit: optional maximum number of selected runs
+
+    :return: List of habit id, name, periodicity, first and last day of the run's periods and length of each run
+    """
+
+    cur = db.cursor()
+    query = ("SELECT habit_runs.habit_id, name, periodicity, run_start, run_end, length FROM habit_runs "
+             "JOIN habit ON habit.habit_id = habit_runs.habit_id WHERE length >= ?")
+    parameters = [int(min_length)]
+    if habit_id is not None:
+        query += " AND habit_runs.habit_id = ?"
+        parameters.append(int(habit_id))
+    if start is not None:
+        query += " AND run_end >= ?"
+        parameters.append(str(start))
+    if end is not None:
+        query += " AND run_start <= ?"
+        parameters.append(str(end))
+    query += " ORDER BY length DESC, name, run_start"
+    if limit is not None:
+        query += " LIMIT ?"
+        parameters.append(int(limit))
+    cur.execute(query, parameters)
+    return cur.fetchall()
+
+
+def get_best_runs(db, periodicity=None, per_habit=True):
+
+    """
+    This function walks the runs of the run index as candidates for a ranking of runs: either the longest run of each
+    habit (the latest one if a habit has several runs of the same length) or all runs. The runs are read lazily habit by
+    habit using the primary key of the run index, without sorting them (CROSS JOIN keeps the habit table as outer loop).
+
+    :param db: initialized sqlite3 database connection
+    :param periodicity: optional periodicity of the habits whose runs are selected
+    :param per_habit: whether only the longest run of each habit should be selected
+
+    :return: Generator of tuples of habit id, name, periodicity, first and last day of the run's periods and length of
+    each run
+    """
+
+    query = ("SELECT habit_runs.habit_id, name, periodicity, run_start, run_end, length FROM habit "
+             "CROSS JOIN habit_runs ON habit_runs.habit_id = habit.habit_id")
+    parameters = []
+    if periodicity is not None:
+        query += " WHERE periodicity = ?"
+        parameters.append(periodicity)
+    cur = db.cursor()
+    cur.execute(query, parameters)
+    if not per_habit:
+        for row in cur:
+            yield row
+        return
+    best = None
+    for row in cur:
+        if best is not None and row[0] != best[0]:
+            yield best
+            best = None
+        if best is None or (row[5], row[3]) > (best[5], best[3]):
+            best = row
+    if best is not None:
+        yield best
+
+
+def get_habit_run_at(db, habit_id, bucket):
+
+    """
+    This function selects the run of a habit which contains the given period.
+
+    :param db: initialized sqlite3 database connection
+    :param habit_id: habit_id of the habit
+    :param bucket: index of the period (see periodicity.Schedule.bucket)
+
+    :return: Tuple of the index of the first and last period of the run or None if the period is not part of a run
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT start_bucket, end_bucket FROM habit_runs WHERE habit_id = ? AND start_bucket <= ? "
+                "ORDER BY start_bucket DESC LIMIT 1", (int(habit_id), bucket))
+    run = cur.fetchone()
+    if run is None or run[1] < bucket:
+        return None
+    return run
+
+
+# Functions for the change-data feed
+def get_changelog_seq(db):
+
+    """
+    This function selects the sequence number of the latest change. A system starting to mirror the habits and
+    check-offs reads it before reading all habits and check-offs and afterwards only reads the changes since.
+
+    :param db: initialized sqlite3 database connection
+
+    :return: Sequence number of the latest change (0 if nothing has been changed yet)
+    """
+
+    cur = db.cursor()
+    cur.execute("SELECT COALESCE(MAX(seq), 0), (SELECT COALESCE(MAX(compacted_until), 0) FROM changelog_compaction) "
+                "FROM changelog")
+    return max(cur.fetchone())
+
+
+def changes_since(db, seq, limit=None):
+
+    """
+    This function lists the habits and check-offs which have been changed after the given sequence number, reading only
+    the changelog entries after it (primary key range) and the changed rows. Each changed row is listed once with its
+    latest change and its current values, ordered by the sequence number of that change. Check-offs which have been
+    archived in the meantime are read from the archive; only if compressed check-offs are listed, the tracking ids of
+    the compressed archive are read once. The rows are read within one read transaction, so that they match the
+    changelog.
+
+    :param db: initialized sqlite3 database connection
+    :param seq: sequence number of the last change already read (see get_changelog_seq), a ValueError is raised if the
+    changes after it have already been compacted
+    :param limit: optional maximum number of changed rows; the next rows are read with the sequence number of the last
+    listed change
+
+    :return: List of tuples of sequence number, table ("habit" or "tracking"), kind of change ("insert", "update" or
+    "delete"), id of the changed row and the current row (see get_habit_data and get_tracking_data, with the tracking
+    id in front and the check-off count at the end) or None if the row has been deleted
+    """
+
+    cur = db.cursor()
+    started = not db.in_transaction
+    if started:
+        cur.execute("BEGIN")
+    try:
+        cur.execute("SELECT COALESCE(MAX(compacted_until), 0) FROM changelog_compaction")
+        if int(seq) < cur.fetchone()[0]:
+            raise ValueError(f"The changes after {seq} have already been compacted, all data has to be read again")
+        cur.execute("SELECT MAX(seq), table_name, operation, row_id FROM changelog WHERE seq > ? "
+                    "GROUP BY table_name, row_id ORDER BY MAX(seq) LIMIT ?",
+                    (int(seq), -1 if limit is None else int(limit)))
+        changes = cur.fetchall()
+        queries = {"habit": "SELECT habit_id, name, task, periodicity, STRFTIME('%Y-%m-%d %H:%M', creation_date), "
+                            "STRFTIME('%Y-%m-%d %H:%M', update_date) FROM habit WHERE habit_id = ?",
+                   "tracking": "SELECT tracking_id, habit_tracker_id, STRFTIME('%Y-%m-%d', checkoff_date), "
+                               "COALESCE(checkoff_count, 1) FROM " + get_tracking_source(db) + " WHERE tracking_id = ?"}
+        rows = []
+        for change in changes:
+            row = None
+            if change[2] != "delete":
+                cur.execute(queries[change[1]], (change[3],))
+                row = cur.fetchone()
+            rows.append(change + (row,))
+        missing = set(x[3] for x in rows if x[1] == "tracking" and x[2] != "delete" and x[4] is None)
+        if missing:
+            compressed = get_compressed_checkoffs(db, missing)
+            rows = [x[:4] + (compressed.get(x[3]),) if x[3] in missing and x[1] == "tracking" else x for x in rows]
+    finally:
+        if started:
+            db.rollback()
+    return rows
+
+
+def get_compressed_checkoffs(db, tracking_ids):
+
+    """
+    This function is a support function looking up compressed check-offs by their tracking ids (see
+    store_archive_blob). Only the blobs whose range of tracking ids contains a tracking id which has not been found yet
+    are selected and decoded, so that the lookup stops once all tracking ids have been found.
+
+    :param db: initialized sqlite3 database connection
+    :param tracking_ids: set of the tracking ids
+
+    :return: Dictionary of tracking id to a tuple of tracking id, habit id, check-off day (YYYY-MM-DD) and check-off
+    count of each found check-off
+    """
+
+    cur = db.cursor()
+    checkoffs, decoded = {}, set()
+    for tracking_id in sorted(tracking_ids):
+        if tracking_id in checkoffs:
+            continue
+        cur.execute("SELECT habit_id, year, data, tracking_ids FROM tracking_archive_blob WHERE min_tracking_id <= ? "
+                    "AND max_tracking_id >= ?", (tracking_id, tracking_id))
+        for habit_id, year, data, ids in cur.fetchall():
+            if (habit_id, year) in decoded:
+                continue
+            decoded.add((habit_id, year))
+            for found, (day, minutes, count) in zip(compression.decode_ids(ids), compression.decode_checkoffs(data)):
+                if found in tracking_ids:
+                    checkoffs[found] = (found, habit_id, datetime.date.fromordinal(day).isoformat(), count)
+            if tracking_id in checkoffs:
+                break
+    return checkoffs
+
+
+def compact_changelog(db, until=None):
+
+    """
+    This function compacts the changelog: only the latest change of each habit and check-off is kept, as changes_since
+    only lists the latest change of each row anyway. If a sequence number is given (e.g. the one all mirroring systems
+    have read), all changes up to it are removed; changes_since raises a ValueError for older sequence numbers from
+    then on.
+
+    :param db: initialized sqlite3 database connection
+    :param until: optional sequence number up to which all changes are removed
+
+    :return: Number of removed changelog entries
+    """
+
+    cur = db.cursor()
+    cur.execute("DELETE FROM changelog WHERE seq NOT IN (SELECT MAX(seq) FROM changelog GROUP BY table_name, row_id)")
+    removed = cur.rowcount
+    if until is not None:
+        cur.execute("DELETE FROM changelog WHERE seq <= ?", (int(until),))
+        removed += cur.rowcount
+        cur.execute("SELECT COALESCE(MAX(compacted_until), 0) FROM changelog_compaction")
+        compacted_until = max(cur.fetchone()[0], int(until))
+        cur.execute("DELETE FROM changelog_compaction")
+        cur.execute("INSERT INTO changelog_compaction VALUES(?)", (compacted_until,))
+    db.commit()
+    return removed
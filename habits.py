@@ -4,13 +4,24 @@ instances of the habit class.
 
 itertools is imported to create an auto-incremented habit_id column due to database integrity reasons.
 datetime is needed for storing auto-creation and auto-update dates.
-For storing, updating, deleting and checking off habits, a connection to the database has to be established and thus
-the database file imported.
+For storing, updating, deleting and checking off habits, a connection to the database or any other storage backend has
+to be established and thus the storage file imported (see storage.Storage). If a reminder scheduler (see
+scheduler.Scheduler) is passed, it is updated as well. Many habits (e.g. several of the predefined habits listed in
+HABIT_TEMPLATES) can be stored at once.
 """
 
 import itertools
 import datetime
-import database
+import storage
+
+# Predefined habits which can be chosen from a list in the menu, as tuples of name, task and periodicity
+HABIT_TEMPLATES = (
+    ("Studying", "Study a specific or new subject for at least 10 hours per week", "weekly"),
+    ("Jogging", "Go jogging at least once per week", "weekly"),
+    ("Cleaning", "Clean all rooms", "weekly"),
+    ("Waking up", "Wake up at 5am every morning", "daily"),
+    ("Doing Workout", "Doing workout each day for at least 15 minutes", "daily"),
+)
 
 
 class Habit:
@@ -25,7 +36,8 @@ class Habit:
 
         :param name: name of the habit
         :param task: task of the habit
-        :param periodicity: periodicity (daily or weekly)
+        :param periodicity: periodicity, e.g. daily, weekly, every 3 days, 3 times per week, monthly or
+        weekdays: Mon, Wed, Fri (see periodicity.Schedule)
         """
         self.habit_id = next(self.new_id)+1  # set a unique id for each habit; add 1 to let id start at 1 instead of 0
         self.name = name
@@ -35,16 +47,42 @@ class Habit:
         self.update_date = datetime.date.today()
 
     # Function for storing a new habit
-    def store_habit(self, db):
+    def store_habit(self, db, scheduler=None):
 
         """
         This function refers to the database functions and adds any new habit instance to the habit table.
 
-        :param db: initialized sqlite3 database connection
+        :param db: initialized sqlite3 database connection or storage backend
+        :param scheduler: optional reminder scheduler to be updated
+        """
+
+        storage.get_storage(db).add_habit(self.name, self.task, self.periodicity)
+        self.update_scheduler(db, scheduler)
+
+    # Function for storing many new habits at once
+    @staticmethod
+    def store_habits_many(db, habits, scheduler=None):
+
         """
+        This function refers to the storage function adding many new habit instances at once (in one transaction for the
+        database, see database.store_habits_many). Habits whose name already exists are not stored.
 
-        database.create_table_habit(db)
-        database.add_habit_data(db, self.name, self.task, self.periodicity)
+        :param db: initialized sqlite3 database connection or storage backend
+        :param habits: list of habit instances
+        :param scheduler: optional reminder scheduler to be updated
+
+        :return: List of the names of the habits which have not been stored as a habit with the name already exists
+        """
+
+        store = storage.get_storage(db)
+        conflicts = store.add_habits([(x.name, x.task, x.periodicity) for x in habits])
+        if scheduler is not None:
+            store.read()
+            habit_ids = dict((x[1], x[0]) for x in store.get_habits())
+            for habit in habits:
+                if habit.name in habit_ids:
+                    scheduler.update(habit_ids[habit.name])
+        return conflicts
 
     # Function for updating a habit's task
     def modify_habit_task(self, db):
@@ -52,69 +90,103 @@ class Habit:
         """
         This function refers to the database function of updating an existing habit's task
 
-        :param db: initialized sqlite3 database connection
+        :param db: initialized sqlite3 database connection or storage backend
         """
 
-        database.update_habit_task(db, self.task, self.name)
+        storage.get_storage(db).update_habit(self.name, task=self.task)
 
     # Function for updating a habit's periodicity
-    def modify_habit_periodicity(self, db):
+    def modify_habit_periodicity(self, db, scheduler=None):
 
         """
         This function refers to the database function of updating an existing habit's periodicity
 
-        :param db: initialized sqlite3 database connection
+        :param db: initialized sqlite3 database connection or storage backend
+        :param scheduler: optional reminder scheduler to be updated
         """
 
-        database.update_habit_periodicity(db, self.periodicity, self.name)
+        storage.get_storage(db).update_habit(self.name, periodicity=self.periodicity)
+        self.update_scheduler(db, scheduler)
 
     # Function for updating a habit's task and periodicity
-    def modify_habit(self, db):
+    def modify_habit(self, db, scheduler=None):
 
         """
         This function refers to the database function of updating an existing habit's task and periodicity
 
-        :param db: initialized sqlite3 database connection
+        :param db: initialized sqlite3 database connection or storage backend
+        :param scheduler: optional reminder scheduler to be updated
         """
 
-        database.update_habit(db, self.task, self.periodicity, self.name)
+        storage.get_storage(db).update_habit(self.name, self.task, self.periodicity)
+        self.update_scheduler(db, scheduler)
 
     # Function for deleting a habit's tracking data
-    def delete_tracking_data(self, db):
+    def delete_tracking_data(self, db, scheduler=None):
 
         """
         This function refers to the database function of deleting a habit's tracking/check-off data
 
-        :param db: initialized sqlite3 database connection
+        :param db: initialized sqlite3 database connection or storage backend
+        :param scheduler: optional reminder scheduler to be updated
         """
 
-        database.delete_tracking_data(db, self.name)
+        storage.get_storage(db).delete_tracking(self.name)
+        self.update_scheduler(db, scheduler)
 
     # Function for deleting a habit
-    def delete_habit_data(self, db):
+    def delete_habit_data(self, db, scheduler=None):
 
         """
         This function refers to the database function of deleting a habit from the main habit table
 
-        :param db: initialized sqlite3 database connection
+        :param db: initialized sqlite3 database connection or storage backend
+        :param scheduler: optional reminder scheduler to be updated
         """
 
-        database.delete_habit_data(db, self.name)
+        store = storage.get_storage(db)
+        habit_id = store.get_habit_id(self.name)
+        store.delete_habit(self.name)
+        if scheduler is not None and habit_id is not None:
+            scheduler.remove(habit_id)
 
     # Function for checking-off an existing habit
     @staticmethod
-    def check_off_habit(db, name, date):
+    def check_off_habit(db, name, date, scheduler=None):
 
         """
         This function refers to the database function of adding a date to the tracking table
 
-        :param db: initialized sqlite3 database connection
+        :param db: initialized sqlite3 database connection or storage backend
         :param name: name of the habit
         :param date: check-off date
+        :param scheduler: optional reminder scheduler to be updated
         """
 
+        store = storage.get_storage(db)
         habit_tracker_id = int("".join(str(x) for x in
                                        (list(map(lambda x: x[0],
-                                                 (filter(lambda y: y[1] == name, database.get_habit_data(db))))))))
-        database.create_table_tracking(db)
-        database.tracking_habit(db, habit_tracker_id, date)
+                                                 (filter(lambda y: y[1] == name, store.get_habits())))))))
+        store.add_checkoff(habit_tracker_id, date)
+        if scheduler is not None:
+            store.read()
+            scheduler.update(habit_tracker_id)
+
+    # Function for updating the reminder scheduler
+    def update_scheduler(self, db, scheduler):
+
+        """
+        This function is a support function recalculating when the habit is due in the reminder scheduler (if any). The
+        scheduler reads from the connection of the storage backend (see storage.Storage.read).
+
+        :param db: initialized sqlite3 database connection or storage backend
+        :param scheduler: optional reminder scheduler to be updated
+        """
+
+        if scheduler is None:
+            return
+        store = storage.get_storage(db)
+        store.read()
+        habit_id = store.get_habit_id(self.name)
+        if habit_id is not None:
+            scheduler.update(habit_id)
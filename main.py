@@ -12,16 +12,19 @@ main menu options with additional sub-options as well as the option to exit the
 (2) Create new habits
 ------------------------
     2.1 Habit from List
-        Allows choosing a habit from a list of five pre-defined habits with pre-defined task and periodicity
+        Allows choosing one or more habits from a list of five pre-defined habits with pre-defined task and periodicity
+        (see habits.HABIT_TEMPLATES), which are stored at once
     2.2 New Habit
         Allows creating a new habit in terms of free-text field habit name and task as well as free periodicity choice
-        (daily or weekly)
+        (daily, weekly, every N days, N times per week, monthly or on selected weekdays only)
     In both cases, a checking mechanism is available making sure that the same habit name is not entered twice.
 
 (3) Modify habits
 ------------------------
     In a first instance, the habit to be modified has to be chosen from a list showing all available habit names.
     If tracking data is available for the selected habit, the user can choose whether it should be kept or deleted.
+    Kept check-offs are not affected by a modified periodicity: until the day of the modification, the run streaks are
+    calculated with the former periodicity and from then on with the new one.
     In a next step, the user can choose whether only the task, only the periodicity or both should be modified.
 
 (4) Delete habits
@@ -37,10 +40,24 @@ main menu options with additional sub-options as well as the option to exit the
 ------------------------
     5.1 List of all currently tracked habits
     5.2 List of all habits with the same periodicity
-        Choice between "daily" and "weekly"
+        Choice between all periodicities of the stored habits
+        Both lists are sorted by name; the tables of all analyses are shown page by page
     5.3 Longest run streak of all defined habits
     5.4 Longest run streak for a given habit
         Selection of a habit name from a list showing all available habits
+    5.5 Leaderboard of the longest run streaks
+        Ranks the k longest run streaks, either the longest one of each habit or all runs of all habits
+    5.6 Streak profile for a given habit
+        Shows the longest and current run streak as well as all runs of the selected habit
+    5.7 Current run streaks and habits at risk
+        Shows the current run streak of each habit as well as the habits which still need to be checked-off today
+        (daily), this week (weekly) or within their current period (other periodicities) to keep their run streak
+    5.8 Completion rate of all habits (last 4 weeks)
+    5.9 Check-offs per weekday
+    5.10 Monthly check-off calendar for a given habit
+        Selection of a habit name as well as entry of a month (YYYY-MM)
+    5.11 Habits due now
+        Shows the habits whose current period has not been completed yet and the habits which are due next
 
 (6) Exit
 ------------------------
@@ -51,25 +68,104 @@ Within each option, the possibility is given to return to the main menu without
 questionary is imported as an intuitive CLI thereby connecting respective choices and selection options to the habits
 being available in the database which is the reason why the database file is imported to this file as well.
 Additionally, the Habit class is imported from habits as well as the file "analyse" to provide the user with all the
-analysis functions.
+analysis functions, which can read from the in-memory copy of the database of the file "replica". The habits are
+stored by one of the storage backends of the file "storage". The due habits are known by the reminder scheduler of the
+file "scheduler", which is updated with every change of a habit.
 The imported datetime module is used for the storage as well as validation of check-off dates.
 Pandas is imported as a basis for manipulating the data and performing the respective analysis functions.
-Tabulate supports the displaying of the data in a clean tabular structure.
-
+The tables of all analyses are printed page by page by the file "render".
+
+Besides the interactive menu, maintenance commands can be run directly from the console via argparse:
+
+    python main.py backfill-rollups     Rebuilds the daily and weekly rollup tables from the tracking data
+    python main.py dedup-tracking       Compacts repeated check-offs of a habit within the same period (e.g. day,
+                                        week or month) into one row and keeps only one row per period from then on
+    python main.py rebuild-runs         Rebuilds the index of streak runs of all habits from the tracking data
+    python main.py archive-tracking     Moves the check-offs before a horizon (--before YYYY-MM-DD, by default one year
+                                        ago) into archive tables per year
+    python main.py compress-archive     Compresses the archive tables into blobs per habit and year and shrinks the
+                                        database file
+    python main.py backup FILE          Copies the database into a backup file while it can still be used
+                                        (--pages, --sleep: pages copied per step and pause between the steps)
+    python main.py restore FILE         Verifies a backup file and restores the database from it
+    python main.py verify [FILE]        Checks the integrity of the database (or of a backup file)
+    python main.py list-habits          Lists the habits (--periodicity, sorted by --sort [--desc], paged by --limit
+                                        and --offset)
+    python main.py list-runs            Lists the streak runs of all habits calculated from the check-offs, which are
+                                        read in batches within --memory-budget KB; the runs are printed as they
+                                        are calculated instead of being collected first
+    python main.py compact-changelog    Keeps only the latest change of each habit and check-off in the changelog
+                                        (--until SEQ: also removes all changes up to the sequence number)
+    python main.py remind               Reminds of each due habit once per period until stopped with Ctrl+C
+
+All commands and the menu accept --db FILE (default: main.db) and --timeout SECONDS, the time a write waits for
+another process holding the database lock before it is retried (default: 5). With --replica, the analyses of the menu
+read from an in-memory copy of the database which is refreshed whenever the database has been changed (see replica).
+With --storage memory or --storage log, the menu stores the habits in memory only or in an append-only log file
+instead of the database file (see storage); the maintenance commands always work on the database file.
 """
 
 
+import argparse
 import questionary
 import datetime
 
 import database
-from habits import Habit
+from habits import Habit, HABIT_TEMPLATES
+from periodicity import Schedule, WEEKDAYS
 import analyse
 import pandas as pd
-from tabulate import tabulate
+import render
+import replica
+import storage
+import scheduler
+
+
+# Column headers and number of rows per page of the habit and run lists
+HABIT_HEADERS = ["Name", "Specification", "Periodicity", "Creation Time", "Last Update Date"]
+RUN_HEADERS = ["Habit ID", "Name", "Periodicity", "Run Start", "Run End", "Streak"]
+PAGE_SIZE = 20
+
+
+def ask_next_page():
+
+    """
+    This function asks the user whether the next page of a table should be shown.
+
+    :return: True if the next page should be shown, otherwise False
+    """
+
+    return bool(questionary.confirm("Show the next page?").ask())
+
 
+def ask_periodicity(question):
+
+    """
+    This function asks the user for the periodicity of a habit. Besides daily and weekly, a habit can be scheduled
+    every N days, N times per week, monthly or on selected weekdays only, for which further details are asked.
+
+    :param question: question shown for the choice of the periodicity
+
+    :return: periodicity as textual periodicity (see periodicity.Schedule)
+    """
+
+    periodicity = str(questionary.select(question, choices=["daily", "weekly", "every N days", "N times per week",
+                                                            "monthly", "selected weekdays only"]).ask())
+    if periodicity == "every N days":
+        number = questionary.text("Every how many days?", validate=lambda x: x.isdigit() and int(x) >= 1).ask()
+        periodicity = Schedule("every_n_days", int(number)).label()
+    elif periodicity == "N times per week":
+        number = questionary.text("How many times per week (1-7)?",
+                                  validate=lambda x: x.isdigit() and 1 <= int(x) <= 7).ask()
+        periodicity = Schedule("times_per_week", int(number)).label()
+    elif periodicity == "selected weekdays only":
+        days = questionary.checkbox("On which weekdays?", choices=WEEKDAYS,
+                                    validate=lambda x: len(x) > 0 or "Please select at least one weekday").ask()
+        periodicity = Schedule("weekdays", days=sum(1 << WEEKDAYS.index(x) for x in days)).label()
+    return periodicity
 
-def cli():
+
+def cli(name="main.db", timeout=database.BUSY_TIMEOUT, use_replica=False, backend="sqlite"):
 
     start_message = """
     ***************************************************************
@@ -79,13 +175,15 @@ def cli():
     """
     print(start_message)
 
-    db = database.get_db()
+    store = storage.open_storage(backend, name, timeout)
+    read_replica = replica.ReadReplica(name, timeout) if use_replica and backend == "sqlite" else None
+    habit_scheduler = scheduler.Scheduler(store.read())
 
     stop = False
     while not stop:
 
         is_valid_list = True
-        list_db_habits = list(map(lambda x: x[1], database.get_habit_data(db)))
+        list_db_habits = list(map(lambda x: x[1], store.get_habits()))
         if not list_db_habits:
             is_valid_list = False
 
@@ -107,72 +205,17 @@ def cli():
                 is_valid_list = False
 
             if choice_sub == "Habit from List":
-                choice_sub_2 = questionary.select("Please choose a habit from below list:", choices=[
-                    "1. Studying | weekly | Study a specific or new subject for at least 10 hours per week",
-                    "2. Jogging | weekly | Go jogging at least once per week",
-                    "3. Cleaning | weekly | Clean all rooms",
-                    "4. Waking up | daily | Wake up at 5am every morning",
-                    "5. Doing Workout | daily | Doing workout each day for at least 15 minutes",
-                    "6. Back to Menu"]).ask()
-
-                if choice_sub_2 == "1. Studying | weekly | Study a specific or new subject for at least 10 " \
-                                   "hours per week":
-                    name = "Studying"
-                    if is_valid_list is True and name in list_db_habits:
-                        print(f"The habit with the name {name} does already exist. Please choose a different habit")
-                    else:
-                        task = "Study a specific or new subject for at least 10 hours per week"
-                        periodicity = "weekly"
-                        habit = Habit(name, task, periodicity)
-                        habit.store_habit(db)
-                        print(f"Habit {name} successfully created.")
-
-                elif choice_sub_2 == "2. Jogging | weekly | Go jogging at least once per week":
-                    name = "Jogging"
-                    if is_valid_list is True and name in list_db_habits:
+                list_templates = [f"{i}. {x[0]} | {x[2]} | {x[1]}" for i, x in enumerate(HABIT_TEMPLATES, 1)]
+                chosen = questionary.checkbox("Please choose one or more habits from below list (none to return to "
+                                              "the menu):", choices=list_templates).ask() or []
+                templates = [HABIT_TEMPLATES[list_templates.index(x)] for x in chosen]
+                conflicts = Habit.store_habits_many(store, [Habit(*x) for x in templates], habit_scheduler)
+                for name in map(lambda x: x[0], templates):
+                    if name in conflicts:
                         print(f"The habit with the name {name} does already exist. Please choose a different habit")
                     else:
-                        task = "Go jogging at least once per week"
-                        periodicity = "weekly"
-                        habit = Habit(name, task, periodicity)
-                        habit.store_habit(db)
                         print(f"Habit {name} successfully created.")
 
-                elif choice_sub_2 == "3. Cleaning | weekly | Clean all rooms":
-                    name = "Cleaning"
-                    if is_valid_list is True and name in list_db_habits:
-                        print(f"The habit with the name {name} does already exist. Please choose a different habit")
-                    else:
-                        task = "Clean all rooms"
-                        periodicity = "weekly"
-                        habit = Habit(name, task, periodicity)
-                        habit.store_habit(db)
-                        print(f"Habit {name} successfully created.")
-
-                elif choice_sub_2 == "4. Waking up | daily | Wake up at 5am every morning":
-                    name = "Waking up"
-                    if is_valid_list is True and name in list_db_habits:
-                        print(f"The habit with the name {name} does already exist. Please choose a different habit")
-                    else:
-                        task = "Wake up at 5am every morning"
-                        periodicity = "daily"
-                        habit = Habit(name, task, periodicity)
-                        habit.store_habit(db)
-                        print(f"Habit {name} successfully created.")
-
-                elif choice_sub_2 == "5. Doing Workout | daily | Doing workout each day for at least 15 minutes":
-                    name = "Doing Workout"
-                    if is_valid_list is True and name in list_db_habits:
-                        print(f"The habit with the name {name} does already exist. Please choose a different habit")
-                    else:
-                        task = "Doing workout each day for at least 15 minutes"
-                        periodicity = "daily"
-                        habit = Habit(name, task, periodicity)
-                        habit.store_habit(db)
-                        print(f"Habit {name} successfully created.")
-                else:
-                    ""
-
             elif choice_sub == "New Habit":
                 name = questionary.text("What's the name of the habit which you want to create?").ask()
 
@@ -180,9 +223,9 @@ def cli():
                     print(f"The habit with the name {name} does already exist. Please enter a different habit name")
                 else:
                     task = questionary.text("What's the task?").ask()
-                    periodicity = str(questionary.select("What's the periodicity?", choices=["daily", "weekly"]).ask())
+                    periodicity = ask_periodicity("What's the periodicity?")
                     habit = Habit(name, task, periodicity)
-                    habit.store_habit(db)
+                    habit.store_habit(store, habit_scheduler)
                     print(f"Habit {name} successfully created.")
             else:
                 ""
@@ -207,7 +250,7 @@ def cli():
                         datetime.datetime.today():
                     tracking = Habit(name, "null", "null")
                     print(f"Habit {name} successfully checked-off.")
-                    tracking.check_off_habit(db, name, date_chosen)
+                    tracking.check_off_habit(store, name, date_chosen, habit_scheduler)
                 elif is_valid_date is True and datetime.datetime.strptime(str(date_chosen), "%Y-%m-%d %H:%M") >= \
                         datetime.datetime.today():
                     print("Your entered date is in the future. "
@@ -218,7 +261,7 @@ def cli():
                 date_chosen = datetime.datetime.today()
                 tracking = Habit(name, "null", "null")
                 print(f"Habit {name} successfully checked-off.")
-                tracking.check_off_habit(db, name, date_chosen)
+                tracking.check_off_habit(store, name, date_chosen, habit_scheduler)
             else:
                 ""
 
@@ -227,14 +270,13 @@ def cli():
 
             habit_name_id = int("".join(str(x) for x in (list(map(lambda x: x[0],
                                                                   (filter(lambda y: y[1] == name,
-                                                                          database.get_habit_data(db))))))))
-
-            list_tracking_ids = list(map(lambda x: x[0], database.get_tracking_data(db)))
+                                                                          store.get_habits())))))))
 
             verify_tracking_deletion = ""
-            if habit_name_id in list_tracking_ids:
-                verify_tracking_deletion = questionary.select("Do you want to keep or delete the existing "
-                                                              "tracking data?",
+            if store.has_checkoffs(habit_name_id):
+                verify_tracking_deletion = questionary.select("Existing check-offs keep counting with the current "
+                                                              "periodicity until today. Do you want to keep or delete "
+                                                              "the existing tracking data?",
                                                               choices=["Keep", "Delete", "Back to Menu"]).ask()
             else:
                 ""
@@ -248,30 +290,28 @@ def cli():
                 if choice_sub == "Task":
                     task = questionary.text("Please enter an updated task specification:").ask()
                     habit = Habit(name, task, "null")
-                    habit.modify_habit_task(db)
+                    habit.modify_habit_task(store)
                     if verify_tracking_deletion == "Delete":
-                        habit.delete_tracking_data(db)
+                        habit.delete_tracking_data(store, habit_scheduler)
                     else:
                         ""
                     print(f"Task for Habit {name} successfully modified to: {task}")
                 elif choice_sub == "Periodicity":
-                    periodicity = str(questionary.select("Please select an updated periodicity:",
-                                                         choices=["daily", "weekly"]).ask())
+                    periodicity = ask_periodicity("Please select an updated periodicity:")
                     habit = Habit(name, "null", periodicity)
-                    habit.modify_habit_periodicity(db)
+                    habit.modify_habit_periodicity(store, habit_scheduler)
                     if verify_tracking_deletion == "Delete":
-                        habit.delete_tracking_data(db)
+                        habit.delete_tracking_data(store, habit_scheduler)
                     else:
                         ""
                     print(f"Periodicity for Habit {name} successfully modified to {periodicity}.")
                 elif choice_sub == "Task and Periodicity":
                     task = questionary.text("Please enter an updated task specification:").ask()
-                    periodicity = str(questionary.select("Please select an updated periodicity:",
-                                                         choices=["daily", "weekly"]).ask())
+                    periodicity = ask_periodicity("Please select an updated periodicity:")
                     habit = Habit(name, task, periodicity)
-                    habit.modify_habit(db)
+                    habit.modify_habit(store, habit_scheduler)
                     if verify_tracking_deletion == "Delete":
-                        habit.delete_tracking_data(db)
+                        habit.delete_tracking_data(store, habit_scheduler)
                     else:
                         ""
                     print(f"Periodicity for Habit {name} successfully modified to {periodicity} "
@@ -286,7 +326,8 @@ def cli():
                 verify = questionary.confirm("Do you really want to delete all your habits and respective "
                                              "tracking data?").ask()
                 if verify is True:
-                    database.delete_all_habit_tracking_data(db)
+                    store.delete_all()
+                    habit_scheduler.clear()
                     print(f"All habits have been deleted.")
                 else:
                     ""
@@ -298,13 +339,12 @@ def cli():
 
                 habit_name_id = int("".join(str(x) for x in (list(map(lambda x: x[0],
                                                                       (filter(lambda y: y[1] == name,
-                                                                              database.get_habit_data(db))))))))
-                list_tracking_ids = list(map(lambda x: x[0], database.get_tracking_data(db)))
-                if habit_name_id in list_tracking_ids:
-                    habit.delete_tracking_data(db)
-                    habit.delete_habit_data(db)
+                                                                              store.get_habits())))))))
+                if store.has_checkoffs(habit_name_id):
+                    habit.delete_tracking_data(store, habit_scheduler)
+                    habit.delete_habit_data(store, habit_scheduler)
                 else:
-                    habit.delete_habit_data(db)
+                    habit.delete_habit_data(store, habit_scheduler)
                 print(f"Habit {name} successfully deleted.")
             else:
                 ""
@@ -315,46 +355,119 @@ def cli():
                                                      "List of all habits with the same periodicity",
                                                      "Longest run streak of all defined habits",
                                                      "Longest run streak for a given habit",
+                                                     "Leaderboard of the longest run streaks",
+                                                     "Streak profile for a given habit",
+                                                     "Current run streaks and habits at risk",
+                                                     "Completion rate of all habits (last 4 weeks)",
+                                                     "Check-offs per weekday",
+                                                     "Monthly check-off calendar for a given habit",
+                                                     "Habits due now",
                                                      "Back to Menu"]).ask()
 
+            reader = read_replica.read() if read_replica is not None else store.read()
+
             if choice_sub == "List of all currently tracked habits":
-                data = analyse.all_habits(db)
-                df = pd.DataFrame(data)
-                df.drop(columns=[0], inplace=True)
-                print(tabulate(df, headers=["Name", "Specification", "Periodicity", "Creation Time",
-                                            "Last Update Date"], tablefmt='psql', showindex=False))
+                render.print_table(analyse.habits_page(reader), HABIT_HEADERS, PAGE_SIZE, ask_next_page)
 
             elif choice_sub == "List of all habits with the same periodicity":
+                list_periodicities = sorted(set(map(lambda x: x[3], database.get_habit_data(reader))))
                 periodicity = str(questionary.select("Please choose the periodicity of your choice:",
-                                                     choices=["daily", "weekly"]).ask())
-                data = analyse.all_habits_periodicity(db, periodicity)
-                df = pd.DataFrame(data)
-                if len(df) == 0:
-                    print(f"There are currently no habits stored with periodicity {periodicity}")
-                else:
-                    df.drop(columns=[0], inplace=True)
-                    print(tabulate(df, headers=["Name", "Specification", "Periodicity", "Creation Time",
-                                                "Last Update Date"],
-                                   tablefmt='psql', showindex=False))
+                                                     choices=list_periodicities).ask())
+                render.print_table(analyse.habits_page(reader, periodicity), HABIT_HEADERS, PAGE_SIZE, ask_next_page,
+                                   empty=f"There are currently no habits stored with periodicity {periodicity}")
 
             elif choice_sub == "Longest run streak of all defined habits":
-                data = analyse.max_streak(db)
+                data = analyse.max_streak(reader)
                 if str(data) == "There is currently no tracking data available":
                     print("There is currently no tracking data available")
                 else:
-                    df = pd.DataFrame(data)
-                    print(tabulate(df, headers=["Name", "Periodicity", "Longest Run Streak"], tablefmt='psql',
-                                   showindex=False))
+                    render.print_frame(pd.DataFrame(data), ["Name", "Periodicity", "Longest Run Streak"],
+                                       page_size=PAGE_SIZE, more=ask_next_page)
 
             elif choice_sub == "Longest run streak for a given habit":
                 name = str(questionary.select("Which habit do you want to analyse?", choices=list_db_habits).ask())
-                data = analyse.max_streak_habit(db, name)
+                data = analyse.max_streak_habit(reader, name)
+                if str(data) == f"There is no tracking data available for the habit {name}":
+                    print(f"There is no tracking data available for the habit {name}")
+                else:
+                    render.print_frame(pd.DataFrame(data), ["Name", "Periodicity", "Longest Run Streak"],
+                                       page_size=PAGE_SIZE, more=ask_next_page)
+
+            elif choice_sub == "Leaderboard of the longest run streaks":
+                k = questionary.text("How many run streaks should be ranked?", default="10",
+                                     validate=lambda x: x.isdigit() and int(x) >= 1).ask()
+                scope = str(questionary.select("Which run streaks should be ranked?",
+                                               choices=["Longest run streak of each habit", "All run streaks"]).ask())
+                data = analyse.top_streaks(reader, int(k), per_habit=scope == "Longest run streak of each habit",
+                                           ties=True)
+                if str(data) == "There is currently no tracking data available":
+                    print("There is currently no tracking data available")
+                else:
+                    render.print_frame(data, ["Rank", "Name", "Periodicity", "Run Start", "Run End", "Run Streak"],
+                                       page_size=PAGE_SIZE, more=ask_next_page)
+
+            elif choice_sub == "Streak profile for a given habit":
+                name = str(questionary.select("Which habit do you want to analyse?", choices=list_db_habits).ask())
+                data = analyse.streak_profile(reader, name)
                 if str(data) == f"There is no tracking data available for the habit {name}":
                     print(f"There is no tracking data available for the habit {name}")
                 else:
                     df = pd.DataFrame(data)
-                    print(tabulate(df, headers=["Name", "Periodicity", "Longest Run Streak"], tablefmt='psql',
-                                   showindex=False))
+                    df['at_risk'] = df['at_risk'].map({True: "yes", False: "no"})
+                    render.print_frame(df, ["Name", "Periodicity", "Longest Run Streak", "Current Run Streak",
+                                            "At Risk", "Current Period Until", "Runs"])
+                    df = analyse.streak_runs_habit(reader, name)
+                    render.print_frame(df[['run_start', 'run_end', 'streak_cum_count']],
+                                       ["Run Start", "Run End", "Run Streak"], page_size=PAGE_SIZE, more=ask_next_page)
+
+            elif choice_sub == "Current run streaks and habits at risk":
+                data = analyse.current_streaks(reader)
+                if str(data) == "There is currently no tracking data available":
+                    print("There is currently no tracking data available")
+                else:
+                    df = pd.DataFrame(data)
+                    at_risk = df.loc[df['at_risk']].drop(columns=['at_risk'])
+                    df['at_risk'] = df['at_risk'].map({True: "yes", False: "no"})
+                    render.print_frame(df, ["Name", "Periodicity", "Current Run Streak", "At Risk",
+                                            "Current Period Until"], page_size=PAGE_SIZE, more=ask_next_page)
+                    df = at_risk
+                    if len(df) == 0:
+                        print("None of your running streaks is at risk.")
+                    else:
+                        render.print_frame(df, ["Name", "Periodicity", "Current Run Streak", "Check Off Until"],
+                                           page_size=PAGE_SIZE, more=ask_next_page)
+
+            elif choice_sub == "Completion rate of all habits (last 4 weeks)":
+                df = analyse.completion_rate(reader)
+                render.print_frame(df, ["Name", "Periodicity", "Completed Periods", "Periods", "Completion Rate (%)"],
+                                   page_size=PAGE_SIZE, more=ask_next_page)
+
+            elif choice_sub == "Check-offs per weekday":
+                df = analyse.weekday_distribution(reader)
+                render.print_frame(df, index=True, page_size=PAGE_SIZE, more=ask_next_page)
+
+            elif choice_sub == "Monthly check-off calendar for a given habit":
+                name = str(questionary.select("Which habit do you want to analyse?", choices=list_db_habits).ask())
+                month_chosen = questionary.text("Please enter a month (YYYY-MM)").ask()
+                try:
+                    month = datetime.datetime.strptime(str(month_chosen), "%Y-%m")
+                except ValueError:
+                    print("This is not the correct month format (YYYY-MM)")
+                else:
+                    df = analyse.monthly_heatmap(reader, name, month.year, month.month)
+                    if str(df) == f"There is no tracking data available for the habit {name}":
+                        print(f"There is no tracking data available for the habit {name}")
+                    else:
+                        render.print_frame(df)
+
+            elif choice_sub == "Habits due now":
+                data = habit_scheduler.due_now()
+                if not data:
+                    print("None of your habits is due now.")
+                else:
+                    render.print_table([(x[2], x[0]) for x in data], ["Name", "Due Until"], PAGE_SIZE, ask_next_page)
+                data = habit_scheduler.next_due(PAGE_SIZE)
+                render.print_table([(x[2], x[0]) for x in data], ["Name", "Due From"])
 
             else:
                 ""
@@ -365,8 +478,165 @@ def cli():
         Keep up with tracking your habits or creating new ones.
     ***************************************************************
             """)
+            store.close()
             stop = True
 
 
+def print_progress(copied, total):
+
+    """
+    This function shows the progress of a backup or restore in the console.
+
+    :param copied: number of copied pages
+    :param total: total number of pages
+    """
+
+    print(f"\r{copied} of {total} pages copied ({100 * copied // max(total, 1)} %)", end="", flush=True)
+
+
+def print_reminder(habit_id, name, deadline):
+
+    """
+    This function shows a reminder of a due habit in the console.
+
+    :param habit_id: habit_id of the due habit
+    :param name: name of the due habit
+    :param deadline: end of the period within which the habit has to be checked-off (datetime.datetime)
+    """
+
+    print(f"{datetime.datetime.now():%Y-%m-%d %H:%M} Habit {name} is due until {deadline:%Y-%m-%d %H:%M}.")
+
+
+def main(argv=None):
+
+    """
+    This function parses the console arguments and either runs one of the maintenance commands or starts the
+    interactive menu if no command is given.
+
+    :param argv: list of console arguments, by default the arguments the program has been started with
+    """
+
+    parser = argparse.ArgumentParser(description="Habit Tracker")
+    parser.add_argument("--db", help="database file (default: main.db) or log file of the log storage "
+                                     "(default: main.log)")
+    parser.add_argument("--storage", choices=storage.BACKENDS, default="sqlite",
+                        help="storage of the habits and check-offs of the menu (default: sqlite)")
+    parser.add_argument("--replica", action="store_true",
+                        help="read the analyses of the menu from an in-memory copy of the database")
+    parser.add_argument("--timeout", type=float, default=database.BUSY_TIMEOUT,
+                        help="seconds a write waits for the database lock of another process before it is retried "
+                             "(default: %(default)s)")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("backfill-rollups", help="rebuild the daily and weekly rollup tables from the tracking data")
+    commands.add_parser("dedup-tracking", help="store only one check-off row per habit and period")
+    commands.add_parser("rebuild-runs", help="rebuild the index of streak runs from the tracking data")
+    archive = commands.add_parser("archive-tracking", help="move old check-offs into archive tables per year")
+    archive.add_argument("--before", type=datetime.date.fromisoformat,
+                         default=datetime.date.today() - datetime.timedelta(days=365),
+                         help="first day whose check-offs are kept (YYYY-MM-DD, default: one year ago)")
+    commands.add_parser("compress-archive", help="compress the archived check-offs and shrink the database file")
+    backup = commands.add_parser("backup", help="copy the database into a backup file while it is in use")
+    backup.add_argument("file", help="backup file")
+    restore = commands.add_parser("restore", help="restore the database from a backup file")
+    restore.add_argument("file", help="backup file")
+    for command in (backup, restore):
+        command.add_argument("--pages", type=int, default=256, help="pages copied per step (default: 256)")
+        command.add_argument("--sleep", type=float, default=0.005,
+                             help="pause in seconds between two steps (default: 0.005)")
+    habits = commands.add_parser("list-habits", help="list the habits sorted and page by page")
+    habits.add_argument("--periodicity", help="list the habits of this periodicity only")
+    habits.add_argument("--sort", choices=database.HABIT_SORT_COLUMNS, default="name",
+                        help="column by which the habits are sorted (default: name)")
+    habits.add_argument("--desc", action="store_true", help="sort in descending order")
+    habits.add_argument("--limit", type=int, help="maximum number of listed habits")
+    habits.add_argument("--offset", type=int, default=0, help="number of habits skipped (default: 0)")
+    runs = commands.add_parser("list-runs", help="list the streak runs of all habits calculated from the check-offs")
+    runs.add_argument("--memory-budget", type=int,
+                      help="memory in KB the check-offs read at once may take (default: 10000 check-offs)")
+    changelog = commands.add_parser("compact-changelog", help="keep only the latest change of each habit and check-off")
+    changelog.add_argument("--until", type=int, help="also remove all changes up to this sequence number")
+    commands.add_parser("remind", help="remind of the due habits until the program is stopped (Ctrl+C)")
+    verify = commands.add_parser("verify", help="check the integrity of the database or of a backup file")
+    verify.add_argument("file", nargs="?", help="database or backup file (default: the database)")
+    args = parser.parse_args(argv)
+    if args.db is None:
+        args.db = "main.log" if args.storage == "log" and args.command is None else "main.db"
+
+    if args.command == "backfill-rollups":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_tracking(db)
+        database.backfill_rollups(db)
+        print(f"Rollup tables of {args.db} successfully rebuilt.")
+    elif args.command == "dedup-tracking":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_habit(db)
+        removed = database.enable_tracking_dedup(db)
+        print(f"Deduplication of check-offs enabled for {args.db}, {removed} duplicated check-offs compacted.")
+    elif args.command == "rebuild-runs":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_habit(db)
+        database.create_table_tracking(db)
+        database.rebuild_habit_runs(db)
+        print(f"Streak runs of {args.db} successfully rebuilt.")
+    elif args.command == "archive-tracking":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_habit(db)
+        database.create_table_tracking(db)
+        archived = database.archive_tracking_data(db, args.before)
+        print(f"{archived} check-offs before {args.before} of {args.db} successfully archived.")
+    elif args.command == "compress-archive":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_habit(db)
+        database.create_table_tracking(db)
+        compressed = database.compress_archive(db)
+        db.execute("VACUUM")
+        print(f"{compressed} archived check-offs of {args.db} successfully compressed.")
+    elif args.command == "backup":
+        db = database.get_db(args.db, args.timeout)
+        pages = database.backup_db(db, args.file, args.pages, args.sleep, print_progress)
+        print(f"\nBackup of {args.db} ({pages} pages) successfully stored in {args.file}.")
+    elif args.command == "restore":
+        db = database.get_db(args.db, args.timeout)
+        try:
+            pages = database.restore_db(db, args.file, args.pages, args.sleep, print_progress)
+        except ValueError as error:
+            print(error)
+        else:
+            print(f"\n{args.db} ({pages} pages) successfully restored from {args.file}.")
+    elif args.command == "list-habits":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_habit(db)
+        render.print_table(analyse.habits_page(db, args.periodicity, args.sort, args.desc, args.limit, args.offset),
+                           HABIT_HEADERS, PAGE_SIZE)
+    elif args.command == "list-runs":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_habit(db)
+        database.create_table_tracking(db)
+        budget = args.memory_budget and args.memory_budget * 1024
+        render.print_table(analyse.iter_streak_runs(db, budget), RUN_HEADERS, PAGE_SIZE,
+                           empty="There is currently no tracking data available")
+    elif args.command == "compact-changelog":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_habit(db)
+        database.create_table_tracking(db)
+        removed = database.compact_changelog(db, args.until)
+        print(f"{removed} changes removed from the changelog of {args.db}, latest change: "
+              f"{database.get_changelog_seq(db)}.")
+    elif args.command == "remind":
+        db = database.get_db(args.db, args.timeout)
+        database.create_table_habit(db)
+        database.create_table_tracking(db)
+        habit_scheduler = scheduler.Scheduler(db)
+        try:
+            habit_scheduler.run(print_reminder)
+        except KeyboardInterrupt:
+            habit_scheduler.stop()
+    elif args.command == "verify":
+        problems = database.verify_db(args.file or args.db)
+        print("\n".join(problems) if problems else f"{args.file or args.db} is intact.")
+    else:
+        cli(args.db, args.timeout, args.replica, args.storage)
+
+
 if __name__ == '__main__':
-    cli()
+    main()
@@ -0,0 +1,482 @@
+"""
+This file implements the periodicities (schedules) of habits and the streak kernel shared by all analysis functions.
+
+A habit can be scheduled
+(1) daily,
+(2) weekly (Monday to Sunday),
+(3) every N days,
+(4) N times per week (on N different days of a week),
+(5) monthly or
+(6) on selected weekdays only (e.g. Monday to Friday).
+
+Each schedule maps a check-off day to the period (bucket) it belongs to, numbered such that two subsequent periods
+always differ by 1. Check-off days are handled as proleptic Gregorian ordinals (see datetime.date.toordinal) so that
+long check-off histories can be processed without creating date objects (months are calculated from the ordinals, see
+month_of). Day 1 (0001-01-01) is a Monday, therefore weeks start on Monday. Periods of N days are counted from the
+anchor day of the habit (by default the day the habit has been created, see database.add_habit_data), so that its first
+period starts with the habit. A check-off on a day which is not part of a weekday schedule counts for the last
+scheduled day before it (e.g. a Saturday check-off for the preceding Friday).
+
+If the periodicity of a habit has been modified, its schedule history consists of segments of days with their own
+schedule each (e.g. daily until the modification, weekly from then on). The periods of all segments are numbered
+subsequently, so that a run can continue across a modification and the streak kernel evaluates each segment with its
+own schedule in the same pass. The last period of a segment ends with the segment, even if it would have been longer.
+
+The streak kernel groups the check-off days of one habit (sorted by date) into periods and collects the runs of
+subsequent completed periods in one pass, independent of the type of schedule.
+
+re is imported for parsing the textual periodicity and bisect for finding the segment of a day or period within a
+schedule history.
+"""
+
+import bisect
+import re
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+class Schedule:
+
+    # Initialization of the schedule class
+    def __init__(self, schedule_type: str, interval: int = 1, days: int = 0, anchor: int = 1):
+
+        """
+        This function initializes the schedule class.
+
+        :param schedule_type: "daily", "weekly", "every_n_days", "times_per_week", "monthly" or "weekdays"
+        :param interval: number of days of a period (every_n_days) or required check-offs per week (times_per_week)
+        :param days: bit mask of the scheduled weekdays (weekdays), bit 0 = Monday, ..., bit 6 = Sunday
+        :param anchor: first day of a period as proleptic Gregorian ordinal (every_n_days), by default day 1
+        """
+
+        if schedule_type not in ("daily", "weekly", "every_n_days", "times_per_week", "monthly", "weekdays"):
+            raise ValueError(f"Unknown periodicity {schedule_type}")
+        if schedule_type == "every_n_days" and interval < 1:
+            raise ValueError("A habit can only be scheduled every 1 or more days")
+        if schedule_type == "times_per_week" and not 1 <= interval <= 7:
+            raise ValueError("A habit can only be scheduled 1 to 7 times per week")
+        if schedule_type == "weekdays" and not 0 < days < 128:
+            raise ValueError("At least one weekday has to be selected")
+        self.schedule_type = schedule_type
+        self.interval = interval if schedule_type in ("every_n_days", "times_per_week") else 1
+        self.days = days if schedule_type == "weekdays" else 0
+        self.anchor = anchor if schedule_type == "every_n_days" else 1
+        self.required = self.interval if schedule_type == "times_per_week" else 1
+        self.weekdays = [x for x in range(7) if self.days >> x & 1]
+        # number of scheduled weekdays up to and including each weekday
+        self.weekdays_until = [len([x for x in self.weekdays if x <= y]) for y in range(7)]
+
+    def __eq__(self, other):
+        return isinstance(other, Schedule) and (self.schedule_type, self.interval, self.days, self.anchor) == \
+            (other.schedule_type, other.interval, other.days, other.anchor)
+
+    def __repr__(self):
+        return f"Schedule({self.label()!r})"
+
+    # Functions for converting between schedules and their textual periodicity
+    @staticmethod
+    def parse(periodicity: str, anchor: int = 1):
+
+        """
+        This function creates a schedule from its textual periodicity as shown to the user, i.e. "daily", "weekly",
+        "every N days", "N times per week", "monthly" or "weekdays: Mon, Tue, ...".
+
+        :param periodicity: textual periodicity
+        :param anchor: first day of a period as proleptic Gregorian ordinal (every N days), by default day 1
+
+        :return: Schedule of the periodicity. A ValueError is raised if the periodicity is not valid.
+        """
+
+        text = str(periodicity).strip().lower()
+        if text in ("daily", "weekly", "monthly"):
+            return Schedule(text)
+        match = re.fullmatch(r"every (\d+) days?", text)
+        if match:
+            return Schedule("every_n_days", int(match.group(1)), anchor=anchor)
+        match = re.fullmatch(r"(\d+) times? (?:per|a) week", text)
+        if match:
+            return Schedule("times_per_week", int(match.group(1)))
+        match = re.fullmatch(r"weekdays:?(.*)", text)
+        if match:
+            names = [x.strip()[:3] for x in re.split(r"[,\s]+", match.group(1)) if x.strip()]
+            names = names or ['mon', 'tue', 'wed', 'thu', 'fri']
+            if any(x.capitalize() not in WEEKDAYS for x in names):
+                raise ValueError(f"Unknown weekday in periodicity {periodicity}")
+            return Schedule("weekdays", days=sum(1 << WEEKDAYS.index(x.capitalize()) for x in set(names)))
+        raise ValueError(f"Unknown periodicity {periodicity}")
+
+    @staticmethod
+    def from_row(periodicity, schedule_type=None, interval=None, days=None, anchor=None):
+
+        """
+        This function creates a schedule from the stored columns of a habit. Habits stored before the structured
+        schedule columns existed are parsed from their textual periodicity, habits stored before the anchor column
+        existed keep counting their periods of N days from day 1.
+
+        :param periodicity: textual periodicity
+        :param schedule_type: stored type of schedule (may be None)
+        :param interval: stored interval of the schedule
+        :param days: stored weekday bit mask of the schedule
+        :param anchor: stored anchor day of the schedule (YYYY-MM-DD, may be None)
+
+        :return: Schedule of the habit
+        """
+
+        anchor = day_ordinal(anchor) if anchor else 1
+        if schedule_type is None:
+            return Schedule.parse(periodicity, anchor)
+        return Schedule(schedule_type, interval or 1, days or 0, anchor)
+
+    def label(self):
+
+        """
+        This function returns the textual periodicity of the schedule as stored in the column "periodicity" and shown to
+        the user.
+
+        :return: Textual periodicity, e.g. "daily", "every 3 days" or "weekdays: Mon, Wed, Fri"
+        """
+
+        if self.schedule_type == "every_n_days":
+            return f"every {self.interval} days"
+        if self.schedule_type == "times_per_week":
+            return f"{self.interval} times per week"
+        if self.schedule_type == "weekdays":
+            return "weekdays: " + ", ".join(WEEKDAYS[x] for x in self.weekdays)
+        return self.schedule_type
+
+    # Functions for mapping days to periods and back
+    def bucket(self, day: int):
+
+        """
+        This function maps a day to the index of the period it belongs to.
+
+        :param day: day as proleptic Gregorian ordinal
+
+        :return: Index of the period
+        """
+
+        if self.schedule_type == "daily":
+            return day
+        if self.schedule_type in ("weekly", "times_per_week"):
+            return (day - 1) // 7
+        if self.schedule_type == "every_n_days":
+            return (day - self.anchor) // self.interval
+        if self.schedule_type == "monthly":
+            year, month = month_of(day)
+            return year * 12 + month - 1
+        week, weekday = divmod(day - 1, 7)
+        return week * len(self.weekdays) + self.weekdays_until[weekday] - 1
+
+    def period_start(self, bucket: int):
+
+        """
+        This function returns the first day of a period.
+
+        :param bucket: index of the period
+
+        :return: First day of the period as proleptic Gregorian ordinal
+        """
+
+        if self.schedule_type == "daily":
+            return bucket
+        if self.schedule_type in ("weekly", "times_per_week"):
+            return bucket * 7 + 1
+        if self.schedule_type == "every_n_days":
+            return bucket * self.interval + self.anchor
+        if self.schedule_type == "monthly":
+            return month_start(bucket // 12, bucket % 12 + 1)
+        week, index = divmod(bucket, len(self.weekdays))
+        return week * 7 + self.weekdays[index] + 1
+
+    def period_end(self, bucket: int):
+
+        """
+        This function returns the last day of a period, i.e. the last day on which a habit can be checked-off for it.
+
+        :param bucket: index of the period
+
+        :return: Last day of the period as proleptic Gregorian ordinal
+        """
+
+        return self.period_start(bucket + 1) - 1
+
+    def required_days(self, bucket: int):
+
+        """
+        This function returns the number of different days a habit has to be checked-off on within a period to complete
+        it.
+
+        :param bucket: index of the period
+
+        :return: Number of required check-off days
+        """
+
+        return self.required
+
+
+# Support functions converting between days and months without creating date objects
+def month_of(day: int):
+
+    """
+    This function returns the year and month of a day (civil calendar from days, counting years from March on so that
+    the leap day is the last day of a year).
+
+    :param day: day as proleptic Gregorian ordinal
+
+    :return: Tuple of year and month (1 to 12)
+    """
+
+    era, day_of_era = divmod(day + 305, 146097)
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    month = (5 * day_of_year + 2) // 153
+    month = month + 3 if month < 10 else month - 9
+    return era * 400 + year_of_era + (month <= 2), month
+
+
+def month_start(year: int, month: int):
+
+    """
+    This function returns the first day of a month (see month_of).
+
+    :param year: year
+    :param month: month (1 to 12)
+
+    :return: First day of the month as proleptic Gregorian ordinal
+    """
+
+    year -= month <= 2
+    era, year_of_era = divmod(year, 400)
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5
+    return era * 146097 + year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year - 305
+
+
+def day_ordinal(day):
+
+    """
+    This function converts a day (YYYY-MM-DD) into its proleptic Gregorian ordinal.
+
+    :param day: day (YYYY-MM-DD, further characters are ignored)
+
+    :return: Day as proleptic Gregorian ordinal
+    """
+
+    day = str(day)
+    year, month = int(day[:4]), int(day[5:7])
+    return month_start(year, month) + int(day[8:10]) - 1
+
+
+class ScheduleHistory:
+
+    # Initialization of the schedule history class
+    def __init__(self, segments):
+
+        """
+        This function initializes the schedule history of a habit whose periodicity has been modified. The periods of
+        the first segment keep the indexes of its schedule, the periods of each further segment are numbered on from the
+        last period of the segment before.
+
+        :param segments: list of tuples of the first day (proleptic Gregorian ordinal) from which on a schedule applies
+        and the schedule (Schedule), sorted by day; the first schedule also applies to all days before its first day
+        """
+
+        self.schedules = [x[1] for x in segments]
+        # first day and index of the first period of each segment after the first one
+        self.first_days = [x[0] for x in segments[1:]]
+        self.first_buckets = []
+        self.offsets = [0]
+        for schedule, previous, first_day in zip(self.schedules[1:], self.schedules, self.first_days):
+            first_bucket = previous.bucket(first_day - 1) + self.offsets[-1] + 1
+            self.first_buckets.append(first_bucket)
+            self.offsets.append(first_bucket - schedule.bucket(first_day))
+
+    def __repr__(self):
+        return "ScheduleHistory([" + ", ".join(
+            f"({x}, {y!r})" for x, y in zip([None] + self.first_days, self.schedules)) + "])"
+
+    def label(self):
+
+        """
+        This function returns the textual periodicity of the current (last) schedule.
+
+        :return: Textual periodicity
+        """
+
+        return self.schedules[-1].label()
+
+    # Functions for mapping days to periods and back
+    def bucket(self, day: int):
+
+        """
+        This function maps a day to the index of the period it belongs to within the segment of the day.
+
+        :param day: day as proleptic Gregorian ordinal
+
+        :return: Index of the period
+        """
+
+        segment = bisect.bisect_right(self.first_days, day)
+        return self.schedules[segment].bucket(day) + self.offsets[segment]
+
+    def period_start(self, bucket: int):
+
+        """
+        This function returns the first day of a period; the first period of a segment starts with the segment.
+
+        :param bucket: index of the period
+
+        :return: First day of the period as proleptic Gregorian ordinal
+        """
+
+        segment = bisect.bisect_right(self.first_buckets, bucket)
+        start = self.schedules[segment].period_start(bucket - self.offsets[segment])
+        return max(start, self.first_days[segment - 1]) if segment > 0 else start
+
+    def period_end(self, bucket: int):
+
+        """
+        This function returns the last day of a period; the last period of a segment ends with the segment.
+
+        :param bucket: index of the period
+
+        :return: Last day of the period as proleptic Gregorian ordinal
+        """
+
+        segment = bisect.bisect_right(self.first_buckets, bucket)
+        end = self.schedules[segment].period_end(bucket - self.offsets[segment])
+        return min(end, self.first_days[segment] - 1) if segment < len(self.first_days) else end
+
+    def required_days(self, bucket: int):
+
+        """
+        This function returns the number of different days a habit has to be checked-off on within a period to complete
+        it, which is at most the number of days of a shortened period at the start or end of a segment.
+
+        :param bucket: index of the period
+
+        :return: Number of required check-off days
+        """
+
+        segment = bisect.bisect_right(self.first_buckets, bucket)
+        required = self.schedules[segment].required
+        if required == 1:
+            return 1
+        return min(required, self.period_end(bucket) - self.period_start(bucket) + 1)
+
+
+class StreakKernel:
+
+    # Initialization of the streak kernel
+    def __init__(self, schedule: Schedule):
+
+        """
+        This function initializes the streak kernel for the check-offs of one habit. The check-off days have to be fed
+        in ascending order; repeated check-offs on the same day are counted once.
+
+        :param schedule: schedule (Schedule or ScheduleHistory) of the habit
+        """
+
+        self.schedule = schedule
+        self.runs = []
+        self.bucket = None
+        self.bucket_days = 0
+        self.last_day = None
+        self.run = None
+
+    def feed(self, day: int):
+
+        """
+        This function adds the next check-off day.
+
+        :param day: check-off day as proleptic Gregorian ordinal
+        """
+
+        if day == self.last_day:
+            return
+        bucket = self.schedule.bucket(day)
+        if bucket != self.bucket:
+            self.close_bucket()
+            self.bucket = bucket
+            self.bucket_days = 0
+        self.bucket_days += 1
+        self.last_day = day
+
+    def close_bucket(self):
+
+        """
+        This function is a support function which extends the current run by the current period or starts a new run if
+        the period has been completed, i.e. the habit has been checked-off on enough days within it.
+        """
+
+        if self.bucket is None or self.bucket_days < self.schedule.required_days(self.bucket):
+            return
+        if self.run is not None and self.run[1] == self.bucket - 1:
+            self.run[1] = self.bucket
+        else:
+            if self.run is not None:
+                self.runs.append(tuple(self.run))
+            self.run = [self.bucket, self.bucket]
+
+    def finish(self):
+
+        """
+        This function completes the last period and returns all runs.
+
+        :return: List of runs as tuples of the first and last period index of the run. The length of a run is the
+        difference between both plus 1.
+        """
+
+        self.close_bucket()
+        self.bucket = None
+        if self.run is not None:
+            self.runs.append(tuple(self.run))
+            self.run = None
+        return self.runs
+
+
+def periods(days, schedule: Schedule):
+
+    """
+    This function groups subsequent check-off days into the periods of a schedule. The days can be given in ascending
+    or descending order; the periods are returned in the same order and are read lazily from the days.
+
+    :param days: iterable of sorted check-off days as proleptic Gregorian ordinals
+    :param schedule: schedule (Schedule or ScheduleHistory) of the habit
+
+    :return: Generator of tuples of the period index, the number of different check-off days within the period and
+    whether the period has been completed
+    """
+
+    bucket = None
+    bucket_days = 0
+    last_day = None
+    for day in days:
+        if day == last_day:
+            continue
+        current = schedule.bucket(day)
+        if current != bucket:
+            if bucket is not None:
+                yield bucket, bucket_days, bucket_days >= schedule.required_days(bucket)
+            bucket = current
+            bucket_days = 0
+        bucket_days += 1
+        last_day = day
+    if bucket is not None:
+        yield bucket, bucket_days, bucket_days >= schedule.required_days(bucket)
+
+
+def streak_runs(days, schedule: Schedule):
+
+    """
+    This function calculates all runs of subsequent completed periods of one habit in one pass.
+
+    :param days: iterable of check-off days as proleptic Gregorian ordinals in ascending order
+    :param schedule: schedule (Schedule or ScheduleHistory) of the habit
+
+    :return: List of runs as tuples of the first and last period index of the run
+    """
+
+    kernel = StreakKernel(schedule)
+    for day in days:
+        kernel.feed(day)
+    return kernel.finish()
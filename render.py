@@ -0,0 +1,145 @@
+"""
+This file implements the rendering of large tables in the console. Instead of building and formatting the whole table
+at once, the rows are read and printed lazily, page by page, so that the first rows are shown right away independent
+of the number of rows of the table. The results of the analyses (pandas DataFrames) are printed in the same way (see
+print_frame).
+
+The width of each column is calculated from the headers and a bounded sample of the first rows only. Values of later
+rows which do not fit into their column are shortened. The layout follows the "psql" format of tabulate.
+
+itertools is imported for reading the sample and the pages from the rows.
+"""
+
+import itertools
+
+
+# Functions for laying out the table
+def column_widths(headers, sample, max_width=40):
+
+    """
+    This function calculates the width of each column from the headers and a sample of rows.
+
+    :param headers: list of the column headers
+    :param sample: list of rows (tuples of values)
+    :param max_width: maximum width of a column
+
+    :return: List of the widths of the columns
+    """
+
+    widths = [len(format_value(x)) for x in headers]
+    for row in sample:
+        widths = [max(x, len(format_value(y))) for x, y in zip(widths, row)]
+    return [min(x, max_width) for x in widths]
+
+
+def format_value(value):
+
+    """
+    This function is a support function converting a value into its text shown in the table.
+
+    :param value: value of a cell
+
+    :return: Text of the value (empty for None)
+    """
+
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
+
+
+def format_row(row, widths):
+
+    """
+    This function formats one row of the table. Numbers are aligned right, all other values left; values longer than
+    their column are shortened.
+
+    :param row: tuple of values
+    :param widths: list of the widths of the columns
+
+    :return: Line of the row
+    """
+
+    cells = []
+    for value, width in zip(row, widths):
+        text = format_value(value)
+        if len(text) > width:
+            text = text[:max(width - 3, 0)] + "..."[:width]
+        is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+        cells.append(text.rjust(width) if is_number else text.ljust(width))
+    return "| " + " | ".join(cells) + " |"
+
+
+def border_line(widths, edge="+"):
+
+    """
+    This function is a support function returning the border line of a table (edge "+") or the line separating the
+    headers from the rows (edge "|").
+
+    :param widths: list of the widths of the columns
+    :param edge: first and last character of the line
+
+    :return: Border line
+    """
+
+    return edge + "-" + "-+-".join("-" * x for x in widths) + "-" + edge
+
+
+# Function for printing a table page by page
+def print_table(rows, headers, page_size=20, more=None, sample_size=100, max_width=40, output=print, empty=None):
+
+    """
+    This function prints a table page by page. Only the first sample_size rows are read before the first line is
+    printed. After each full page, the function more is asked whether the next page should be printed as well.
+
+    :param rows: iterable of rows (tuples of values), e.g. a database cursor
+    :param headers: list of the column headers
+    :param page_size: number of rows per page
+    :param more: optional function without arguments returning whether the next page should be printed, by default all
+    pages are printed
+    :param sample_size: number of rows used for calculating the widths of the columns
+    :param max_width: maximum width of a column
+    :param output: function printing one line
+    :param empty: optional message printed instead of an empty table
+
+    :return: Number of printed rows
+    """
+
+    rows = iter(rows)
+    sample = list(itertools.islice(rows, sample_size))
+    if not sample and empty is not None:
+        output(empty)
+        return 0
+    widths = column_widths(headers, sample, max_width)
+    output(border_line(widths))
+    output(format_row(headers, widths))
+    output(border_line(widths, "|"))
+    printed = 0
+    for row in itertools.chain(sample, rows):
+        if printed > 0 and printed % page_size == 0 and more is not None and not more():
+            break
+        output(format_row(row, widths))
+        printed += 1
+    output(border_line(widths))
+    return printed
+
+
+def print_frame(df, headers=None, index=False, **kwargs):
+
+    """
+    This function prints a pandas DataFrame page by page (see print_table). Its rows are read one by one and numpy
+    values are converted into Python values, so that numbers are aligned right.
+
+    :param df: DataFrame
+    :param headers: optional list of the column headers, by default the names of the (index and) columns
+    :param index: whether the index should be printed as first column
+    :param kwargs: further arguments of print_table, e.g. page_size and more
+
+    :return: Number of printed rows
+    """
+
+    if headers is None:
+        headers = ([df.index.name or ""] if index else []) + [str(x) for x in df.columns]
+    rows = (tuple(x.item() if hasattr(x, "item") else x for x in row) for row in df.itertuples(index=index, name=None))
+    return print_table(rows, headers, **kwargs)
@@ -0,0 +1,212 @@
+"""
+This file implements an optional in-memory read replica of the database for analysis sessions. At the start of a
+session, the database is copied into an in-memory database in one step (see sqlite3.Connection.backup); all analysis
+functions can then read from the copy instead of the database file, so that long reports neither wait for the pages of
+the file nor block processes storing check-offs in the meantime.
+
+The copy is refreshed on demand (refresh) or whenever another connection has committed a change to the database file
+since the last refresh (read, see PRAGMA data_version). A refresh is incremental: the changelog entries after the last
+refresh name the habits and check-offs which have been added, modified or deleted (see database.changes_since), and
+only these rows are copied, together with the runs and schedule history of the affected habits. The rollup tables of
+the copy are updated by its own triggers. If archived check-offs have been changed, the changelog has been compacted
+past the last refresh, the copy differs from the database afterwards or the schema of the database has changed
+(PRAGMA schema_version, e.g. after check-offs have been archived), the whole database is copied again.
+
+sqlite3 is imported for the in-memory database and the database file for the connection to the database file.
+"""
+
+import sqlite3
+
+import database
+
+
+class ReadReplica:
+
+    # Initialization of the read replica
+    def __init__(self, name="main.db", timeout=database.BUSY_TIMEOUT):
+
+        """
+        This function initializes the read replica by copying the database into an in-memory database. The habit and
+        tracking tables of the database must already exist.
+
+        :param name: name of the database
+        :param timeout: time in seconds the replica waits for a lock held by another connection (see database.get_db)
+        """
+
+        self.name = name
+        self.source = database.get_db(name, timeout)
+        self.db = sqlite3.connect(":memory:")
+        self.data_version = None
+        self.schema_version = None
+        self.seq = 0
+        self.full_refreshes = 0
+        self.incremental_refreshes = 0
+        self.clone()
+
+    # Functions for reading from the replica
+    def read(self):
+
+        """
+        This function returns the in-memory database after refreshing it if the database has been changed by another
+        connection since the last refresh.
+
+        :return: sqlite3 connection of the in-memory database which can be passed to all analysis functions
+        """
+
+        if self.changed():
+            self.refresh()
+        return self.db
+
+    def changed(self):
+
+        """
+        This function checks whether another connection has committed a change to the database since the last refresh.
+
+        :return: True if the replica may be outdated, otherwise False
+        """
+
+        return self.source.execute("PRAGMA data_version").fetchone()[0] != self.data_version
+
+    # Functions for refreshing the replica
+    def clone(self):
+
+        """
+        This function copies the whole database into the in-memory database.
+        """
+
+        self.data_version = self.source.execute("PRAGMA data_version").fetchone()[0]
+        self.schema_version = self.source.execute("PRAGMA schema_version").fetchone()[0]
+        self.source.backup(self.db)
+        self.seq = database.get_changelog_seq(self.db)
+        database.drop_changelog_triggers(self.db)  # refreshes of the copy are no changes of the habits
+        self.full_refreshes += 1
+
+    def refresh(self):
+
+        """
+        This function refreshes the in-memory database incrementally, or copies the whole database again if the copy
+        cannot be refreshed incrementally. The changes are read from the database in one short read transaction and
+        only applied to the in-memory database afterwards, so that writers are not blocked while they are applied.
+
+        :return: True if the replica has been refreshed incrementally, False if the whole database has been copied
+        """
+
+        self.data_version = self.source.execute("PRAGMA data_version").fetchone()[0]
+        self.source.execute("BEGIN")  # reads all changes from the same snapshot of the database
+        try:
+            schema_version = self.source.execute("PRAGMA schema_version").fetchone()[0]
+            changes = self.read_changes() if schema_version == self.schema_version else None
+        finally:
+            self.source.rollback()
+        if changes is None or not self.apply_changes(*changes):
+            self.clone()
+            return False
+        self.incremental_refreshes += 1
+        return True
+
+    def read_changes(self):
+
+        """
+        This function is a support function reading the changes since the last refresh from the changelog of the
+        database (see database.changes_since) together with the changed habits and check-offs, the runs of all
+        affected habits and the schedule history of the changed habits. Only the changelog entries after the last
+        refresh and the changed rows are read, so that a refresh takes time proportional to the number of changes.
+
+        :return: Tuple of the added or modified habits, the ids of the deleted habits, the new or modified check-offs,
+        the ids of the deleted or modified check-offs, the runs of the affected habits per habit id, the schedule
+        history of the changed habits per habit id, the sequence number of the latest change and the fingerprint of
+        the database (see fingerprint), or None if the changes cannot be applied incrementally (e.g. changes of
+        archived check-offs or a compacted changelog)
+        """
+
+        compacted = self.source.execute("SELECT COALESCE(MAX(compacted_until), 0) FROM changelog_compaction")
+        if compacted.fetchone()[0] > self.seq:
+            return None
+        entries = self.source.execute("SELECT MAX(seq), table_name, operation, row_id FROM changelog WHERE seq > ? "
+                                      "GROUP BY table_name, row_id", (self.seq,)).fetchall()
+        seq = max([x[0] for x in entries], default=self.seq)
+        changed, deleted, checkoffs, removed, affected = [], [], [], [], set()
+        last = self.db.execute("SELECT COALESCE(MAX(tracking_id), 0) FROM tracking").fetchone()[0]
+        for _, table_name, operation, row_id in entries:
+            if table_name == "habit":
+                row = self.source.execute("SELECT * FROM habit WHERE habit_id = ?", (row_id,)).fetchone()
+                changed.append(row) if row else deleted.append((row_id,))
+                affected.add(row_id)
+                continue
+            copied = self.db.execute("SELECT habit_tracker_id FROM tracking WHERE tracking_id = ?",
+                                     (row_id,)).fetchone()
+            if copied is None and row_id <= last:
+                return None  # archived check-offs are only copied with the whole database
+            if copied:
+                removed.append((row_id,))
+                affected.add(copied[0])
+            row = self.source.execute("SELECT * FROM tracking WHERE tracking_id = ?", (row_id,)).fetchone()
+            if row:
+                checkoffs.append(row)
+                affected.add(row[1])
+        runs = {x: self.source.execute("SELECT * FROM habit_runs WHERE habit_id = ?", (x,)).fetchall()
+                for x in affected}
+        history = {x[0]: self.source.execute("SELECT * FROM habit_schedule_history WHERE habit_id = ?",
+                                             (x[0],)).fetchall() for x in changed}
+        return changed, deleted, checkoffs, removed, runs, history, seq, self.fingerprint(self.source)
+
+    def apply_changes(self, changed, deleted, checkoffs, removed, runs, history, seq, fingerprint):
+
+        """
+        This function is a support function applying the changes read from the database (see read_changes) to the
+        in-memory database. The rollup tables of the copy are updated by its triggers.
+
+        :return: True if the copy matches the database afterwards, otherwise False (the changes are rolled back)
+        """
+
+        with self.db:
+            if changed:
+                self.db.executemany("INSERT OR REPLACE INTO habit VALUES(" + ", ".join("?" * len(changed[0])) + ")",
+                                    changed)
+            self.db.executemany("DELETE FROM habit WHERE habit_id = ?", deleted)
+            self.db.executemany("DELETE FROM habit_runs WHERE habit_id = ?", deleted)
+            self.db.executemany("DELETE FROM habit_schedule_history WHERE habit_id = ?", deleted)
+            self.db.executemany("DELETE FROM tracking WHERE tracking_id = ?", removed)
+            if checkoffs:
+                self.db.executemany("INSERT INTO tracking VALUES(" + ", ".join("?" * len(checkoffs[0])) + ")",
+                                    checkoffs)
+            for habit_id, rows in runs.items():
+                self.db.execute("DELETE FROM habit_runs WHERE habit_id = ?", (habit_id,))
+                if rows:
+                    self.db.executemany("INSERT INTO habit_runs VALUES(" + ", ".join("?" * len(rows[0])) + ")", rows)
+            for habit_id, rows in history.items():
+                self.db.execute("DELETE FROM habit_schedule_history WHERE habit_id = ?", (habit_id,))
+                if rows:
+                    self.db.executemany("INSERT INTO habit_schedule_history VALUES("
+                                        + ", ".join("?" * len(rows[0])) + ")", rows)
+            if self.fingerprint(self.db) != fingerprint:
+                self.db.rollback()
+                return False
+        self.seq = seq
+        return True
+
+    @staticmethod
+    def fingerprint(db):
+
+        """
+        This function is a support function summarizing the tracking table of a database without scanning it: the
+        highest tracking id is read from the primary key and the total number of check-offs from the weekly rollup
+        table which is much smaller than the tracking table.
+
+        :param db: sqlite3 connection of the database or of the replica
+
+        :return: Tuple of the highest tracking id and the total number of check-offs
+        """
+
+        return db.execute("SELECT (SELECT COALESCE(MAX(tracking_id), 0) FROM tracking), "
+                          "(SELECT TOTAL(checkoff_count) FROM tracking_weekly_rollup)").fetchone()
+
+    # Function for closing the replica
+    def close(self):
+
+        """
+        This function closes the in-memory database and the connection to the database.
+        """
+
+        self.db.close()
+        self.source.close()
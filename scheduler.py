@@ -0,0 +1,347 @@
+"""
+This file implements the reminder scheduler which knows when each habit is next due without running the streak
+analysis. A habit is due from the start of its first period (from the current one on) which has not been completed yet
+until the end of that period (its deadline): a daily habit checked-off today is next due tomorrow, a daily habit not yet
+checked-off today is due now until midnight.
+
+The scheduler keeps a priority queue (binary heap) of the time from which on each habit is due. The entry of a habit is
+calculated from its schedule and its check-offs within the current period only, and is replaced in O(log n) whenever
+the habit is checked-off, created, modified or deleted (see habits.Habit). Replaced entries are only marked as removed
+and dropped once they make up half of the heap. If the deadline of a due habit passes without a check-off, the habit
+stays due for its next period.
+
+The due habits and the habits due next are read in the order of the heap without sorting all habits. The reminder loop
+sleeps until the next habit becomes due (or the deadline of a due habit passes) instead of polling the database, and
+wakes up early if a habit is updated in the meantime. Changes stored by other processes (e.g. check-offs from the menu
+while "python main.py remind" runs) are detected by the data version of the database whenever the due habits are read,
+and only the habits named by the changelog since are recalculated (see sync). Each due habit is checked again right
+before it is reminded of.
+
+heapq and itertools are imported for the priority queue, threading for the reminder loop and datetime for the due
+times. The database file is imported for reading the schedules and the most recent check-offs of the habits.
+"""
+
+import datetime
+import heapq
+import itertools
+import threading
+
+import database
+
+
+class Scheduler:
+
+    # Initialization of the scheduler
+    def __init__(self, db, clock=datetime.datetime.now):
+
+        """
+        This function initializes the scheduler with the due times of all habits of the database.
+
+        :param db: initialized sqlite3 database connection
+        :param clock: function returning the current time (datetime.datetime)
+        """
+
+        self.db = db
+        self.clock = clock
+        self.habits = {}
+        self.entries = {}
+        self.heap = []
+        self.removed = 0
+        self.reminded = {}
+        self.stopped = False
+        self.condition = threading.Condition(threading.RLock())
+        self._counter = itertools.count()
+        self.data_version = db.execute("PRAGMA data_version").fetchone()[0]
+        self.seq = database.get_changelog_seq(db)
+        now = clock()
+        for habit_id, (name, schedule) in database.get_habit_schedules(db).items():
+            self.habits[habit_id] = (name, schedule)
+            self.entries[habit_id] = self._entry(habit_id, *due_period(schedule, self._recent_days(habit_id), now))
+        self.heap = list(self.entries.values())
+        heapq.heapify(self.heap)
+
+    # Functions for updating the priority queue
+    def update(self, habit_id):
+
+        """
+        This function recalculates when a habit is due after it has been checked-off, created or modified.
+
+        :param habit_id: habit_id of the habit
+        """
+
+        with self.condition:
+            habit = database.get_habit_schedule_by_id(self.db, habit_id)
+            cur = self.db.cursor()
+            cur.execute("SELECT name FROM habit WHERE habit_id = ?", (int(habit_id),))
+            row = cur.fetchone()
+            if habit is None or row is None:
+                self.remove(habit_id)
+                return
+            self.habits[int(habit_id)] = (row[0], habit)
+            due, deadline = due_period(habit, self._recent_days(habit_id), self.clock())
+            self._push(int(habit_id), due, deadline)
+
+    def sync(self):
+
+        """
+        This function recalculates when the habits are due which have been changed by another connection since the
+        scheduler last read the database (PRAGMA data_version), e.g. by another process. The changed habits are read
+        from the changelog (see database.changes_since), so that each change is taken over in O(log n): the entries of
+        added, modified or deleted habits and of checked-off habits are replaced. A deleted check-off can only make a
+        habit due again, so the habits which are not due yet are recalculated. All habits are read again only if the
+        changelog has been compacted in the meantime. Changes made through this connection are passed on by update,
+        remove and clear instead.
+
+        :return: True if the habits have been read again, otherwise False
+        """
+
+        with self.condition:
+            version = self.db.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version:
+                return False
+            self.data_version = version
+            try:
+                changes = database.changes_since(self.db, self.seq)
+            except ValueError:
+                self.reload()
+                return True
+            changed = set()
+            for _, table_name, operation, row_id, row in changes:
+                if table_name == "habit":
+                    changed.add(row_id)
+                elif row is not None:
+                    changed.add(row[1])
+                else:
+                    now = self.clock()
+                    changed.update(x for x, entry in self.entries.items() if entry[0] > now)
+            for habit_id in changed:
+                self.update(habit_id)
+            self.seq = max([x[0] for x in changes], default=self.seq)
+            return True
+
+    def reload(self):
+
+        """
+        This function recalculates when each habit is due after reading the schedules of all habits again, e.g. if the
+        changes since the scheduler last read the database have been compacted (see database.compact_changelog).
+        """
+
+        with self.condition:
+            self.seq = database.get_changelog_seq(self.db)
+            schedules = database.get_habit_schedules(self.db)
+            for habit_id in [x for x in self.entries if x not in schedules]:
+                self.remove(habit_id)
+            now = self.clock()
+            for habit_id, (name, schedule) in schedules.items():
+                self.habits[habit_id] = (name, schedule)
+                self._push(habit_id, *due_period(schedule, self._recent_days(habit_id), now))
+
+    def remove(self, habit_id):
+
+        """
+        This function removes a deleted habit from the scheduler.
+
+        :param habit_id: habit_id of the habit
+        """
+
+        with self.condition:
+            entry = self.entries.pop(int(habit_id), None)
+            self.habits.pop(int(habit_id), None)
+            self.reminded.pop(int(habit_id), None)
+            if entry is not None:
+                self._discard(entry)
+            self.condition.notify_all()
+
+    def clear(self):
+
+        """
+        This function removes all habits from the scheduler, e.g. after all habits have been deleted.
+        """
+
+        with self.condition:
+            self.habits.clear()
+            self.entries.clear()
+            self.reminded.clear()
+            self.heap = []
+            self.removed = 0
+            self.condition.notify_all()
+
+    def _entry(self, habit_id, due, deadline):
+        return [due, next(self._counter), habit_id, deadline]
+
+    def _push(self, habit_id, due, deadline):
+        entry = self.entries.get(habit_id)
+        if entry is not None:
+            self._discard(entry)
+        self.entries[habit_id] = self._entry(habit_id, due, deadline)
+        heapq.heappush(self.heap, self.entries[habit_id])
+        self.condition.notify_all()
+
+    def _discard(self, entry):
+        entry[2] = None
+        self.removed += 1
+        if self.removed > len(self.heap) // 2:
+            self.heap = [x for x in self.heap if x[2] is not None]
+            heapq.heapify(self.heap)
+            self.removed = 0
+
+    def _recent_days(self, habit_id):
+        return database.get_recent_tracking_days(self.db, habit_id)
+
+    def _in_order(self):
+
+        """
+        This function is a support function walking the entries of the heap in ascending order of their due time
+        without changing the heap: starting at its root, the smallest entry seen so far is taken and its two children
+        are added to the candidates.
+
+        :return: Generator of the entries (due time, counter, habit id, deadline) of all habits in order of their due
+        time
+        """
+
+        candidates = [(self.heap[0], 0)] if self.heap else []
+        while candidates:
+            entry, index = heapq.heappop(candidates)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(self.heap):
+                    heapq.heappush(candidates, (self.heap[child], child))
+            if entry[2] is not None:
+                yield entry
+
+    # Functions for querying the due habits
+    def due_now(self, now=None):
+
+        """
+        This function lists the habits which are due, i.e. whose current period has not been completed yet. Only the
+        entries of the due habits are read, after changes of other connections have been taken over (see sync). Habits
+        whose deadline has passed are due again for their next period.
+
+        :param now: reference time (datetime.datetime), by default the current time of the clock
+
+        :return: List of tuples of the deadline, habit id and name of the due habits, ordered by deadline
+        """
+
+        now = now or self.clock()
+        with self.condition:
+            self.sync()
+            due = [x[2] for x in itertools.takewhile(lambda x: x[0] <= now, self._in_order())]
+            for habit_id in [x for x in due if self.entries[x][3] <= now]:
+                schedule = self.habits[habit_id][1]
+                bucket = schedule.bucket(now.toordinal())
+                self._push(habit_id, max(self.entries[habit_id][3], day_start(schedule.period_start(bucket))),
+                           day_start(schedule.period_end(bucket) + 1))
+            return sorted((self.entries[x][3], x, self.habits[x][0]) for x in due)
+
+    def next_due(self, k=1):
+
+        """
+        This function lists the k habits which are due next, including the habits which are already due.
+
+        :param k: number of habits
+
+        :return: List of tuples of the time from which on the habit is due, the habit id and the name of the habit,
+        ordered by due time
+        """
+
+        with self.condition:
+            return [(x[0], x[2], self.habits[x[2]][0]) for x in itertools.islice(self._in_order(), k)]
+
+    def next_wakeup(self, now=None):
+
+        """
+        This function returns when the reminder loop has to wake up next: immediately if a due habit has not been
+        reminded of yet, otherwise when the next habit becomes due or the deadline of a due habit passes.
+
+        :param now: reference time (datetime.datetime), by default the current time of the clock
+
+        :return: Time of the next wake-up (datetime.datetime) or None if there are no habits
+        """
+
+        now = now or self.clock()
+        with self.condition:
+            wakeup = None
+            for entry in self._in_order():
+                if entry[0] > now:
+                    return entry[0] if wakeup is None else min(wakeup, entry[0])
+                if self.reminded.get(entry[2]) != entry[3]:
+                    return now
+                wakeup = entry[3] if wakeup is None else min(wakeup, entry[3])
+            return wakeup
+
+    # Reminder loop
+    def run(self, remind):
+
+        """
+        This function runs the reminder loop until stop() is called: each due habit is reminded of once per period,
+        then the loop sleeps until the next wake-up (see next_wakeup) or until a habit is updated. Right before a habit
+        is reminded of, its entry is recalculated (see update), so that a habit checked-off in the meantime is skipped.
+
+        :param remind: function called with the habit id, name and deadline (datetime.datetime) of each due habit
+        """
+
+        while True:
+            with self.condition:
+                if self.stopped:
+                    return
+                due = [x for x in self.due_now() if self.reminded.get(x[1]) != x[0]]
+                for habit_id in [x[1] for x in due]:
+                    self.update(habit_id)
+                now = self.clock()
+                due = [x for x in due if x[1] in self.entries and self.entries[x[1]][0] <= now]
+                for deadline, habit_id, _ in due:
+                    self.reminded[habit_id] = deadline
+            for deadline, habit_id, name in due:
+                remind(habit_id, name, deadline)
+            with self.condition:
+                if self.stopped:
+                    return
+                now = self.clock()
+                wakeup = self.next_wakeup(now)
+                self.condition.wait(None if wakeup is None else max((wakeup - now).total_seconds(), 0))
+
+    def stop(self):
+
+        """
+        This function stops the reminder loop.
+        """
+
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+
+# Support functions calculating the due period of a habit
+def day_start(day):
+
+    """
+    This function is a support function returning midnight at the start of a day.
+
+    :param day: day as proleptic Gregorian ordinal
+
+    :return: Start of the day (datetime.datetime)
+    """
+
+    return datetime.datetime.fromordinal(day)
+
+
+def due_period(schedule, days, now):
+
+    """
+    This function calculates from when until when a habit is due: within its current period if the period has not been
+    completed yet, otherwise within its next period.
+
+    :param schedule: schedule (periodicity.Schedule or periodicity.ScheduleHistory) of the habit
+    :param days: check-off days of the habit as proleptic Gregorian ordinals, latest first (only the days of the current
+    period are read)
+    :param now: reference time (datetime.datetime)
+
+    :return: Tuple of the start of the due period and its deadline, i.e. the end of its last day (datetime.datetime)
+    """
+
+    today = now.toordinal()
+    bucket = schedule.bucket(today)
+    start = schedule.period_start(bucket)
+    checked = set(itertools.takewhile(lambda x: x >= start, filter(lambda x: x <= today, days)))
+    if len(checked) >= schedule.required_days(bucket):
+        bucket += 1
+    return day_start(schedule.period_start(bucket)), day_start(schedule.period_end(bucket) + 1)
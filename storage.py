@@ -0,0 +1,682 @@
+"""
+This file implements the storage backends of the Habit Tracker. All backends implement the same interface (Storage)
+for storing, modifying and deleting habits, storing single check-offs or many check-offs at once and reading the
+check-offs, so that the habit class, the analysis functions and the menu can be used with each of them:
+
+(1) SQLiteStorage stores the habits in the database file (see database) and is used by default,
+(2) MemoryStorage keeps the habits and the check-offs of each habit (sorted by date) in dictionaries of lists in memory
+    only, e.g. for tests or embedded use, and
+(3) LogStorage appends each change as one line to a log file and keeps the data in memory like MemoryStorage. The log
+    file is replayed when it is opened again.
+
+The analysis functions read from a sqlite3 connection (see read): the SQLite backend returns its database connection,
+the other backends copy the changes since it was last read into an in-memory database, so that the rollup tables and
+the run index are built by the same functions as for the database file. The analysis
+functions accept a storage backend instead of a connection (see reader).
+
+abc is imported for the interface, functools for the decorator of the analysis functions, bisect for keeping the
+check-offs of a habit sorted, json and os for the lines of the log file and sqlite3 for the in-memory database. The
+database file is imported for the SQLite backend and for building the in-memory database, heapq and compression for
+reading the compressed archive of the SQLite backend together with its tracking table.
+"""
+
+import abc
+import bisect
+import datetime
+import functools
+import heapq
+import json
+import os
+import sqlite3
+
+import compression
+import database
+from periodicity import Schedule, day_ordinal
+
+# Storage backends which can be selected in the menu (see open_storage)
+BACKENDS = ("sqlite", "memory", "log")
+
+# Version of the tables of the SQLite backend stored in the database file (PRAGMA user_version) once they have been
+# created, so that wrapping a connection only reads it (see SQLiteStorage.create_tables)
+SCHEMA_VERSION = 1
+
+
+class Storage(abc.ABC):
+
+    # Functions for storing, modifying and deleting habits
+    @abc.abstractmethod
+    def add_habit(self, name, task, periodicity):
+
+        """
+        This function stores a new habit.
+
+        :param name: name of the habit
+        :param task: task specification of the habit
+        :param periodicity: periodicity of the habit (see periodicity.Schedule.parse); a ValueError is raised for an
+        unknown periodicity
+        """
+
+    @abc.abstractmethod
+    def update_habit(self, name, task=None, periodicity=None, effective_from=None):
+
+        """
+        This function modifies the task and/or the periodicity of a habit. The new periodicity applies from the given
+        day on, the check-offs before keep counting with the former periodicity (see database.record_schedule_change).
+
+        :param name: name of the habit
+        :param task: optional updated task specification
+        :param periodicity: optional updated periodicity
+        :param effective_from: first day (datetime.date or YYYY-MM-DD) of the new periodicity, by default today
+        """
+
+    @abc.abstractmethod
+    def delete_habit(self, name):
+
+        """
+        This function deletes a habit and its schedule history.
+
+        :param name: name of the habit
+        """
+
+    @abc.abstractmethod
+    def delete_tracking(self, name):
+
+        """
+        This function deletes all check-offs of a habit.
+
+        :param name: name of the habit
+        """
+
+    @abc.abstractmethod
+    def delete_all(self):
+
+        """
+        This function deletes all habits and check-offs.
+        """
+
+    @abc.abstractmethod
+    def get_habits(self):
+
+        """
+        This function lists all habits.
+
+        :return: List of tuples of habit id, name, task, periodicity as well as creation and update datetime
+        (YYYY-MM-DD hh:mm) of each habit (see database.get_habit_data)
+        """
+
+    def add_habits(self, habits):
+
+        """
+        This function stores many new habits at once. The periodicities are validated before any habit is stored, the
+        names are checked against the stored habits once (see database.split_new_habits).
+
+        :param habits: list of tuples of name, task and periodicity of the new habits
+
+        :return: List of the names of the habits which have not been stored as a habit with the name already exists
+        """
+
+        habits, conflicts = database.split_new_habits(habits, (x[1] for x in self.get_habits()))
+        for name, task, schedule in habits:
+            self.add_habit(name, task, schedule.label())
+        return conflicts
+
+    # Functions for storing and reading check-offs
+    @abc.abstractmethod
+    def add_checkoff(self, habit_id, date):
+
+        """
+        This function stores a check-off of a habit.
+
+        :param habit_id: habit_id of the habit
+        :param date: check-off datetime (datetime.datetime or YYYY-MM-DD hh:mm)
+        """
+
+    def add_checkoffs(self, checkoffs):
+
+        """
+        This function stores many check-offs at once.
+
+        :param checkoffs: iterable of tuples of habit id and check-off datetime
+        """
+
+        for habit_id, date in checkoffs:
+            self.add_checkoff(habit_id, date)
+
+    @abc.abstractmethod
+    def get_checkoffs(self, habit_id=None):
+
+        """
+        This function walks the check-offs of all habits (or of one selected habit) ordered by habit and checkoff date.
+
+        :param habit_id: optional habit_id of the habit whose check-offs should be read
+
+        :return: Iterable of tuples of habit id and check-off datetime
+        """
+
+    # Functions for the analysis functions
+    @abc.abstractmethod
+    def read(self):
+
+        """
+        This function returns a sqlite3 connection holding the current habits and check-offs of the backend which can
+        be passed to all analysis functions and database getters.
+
+        :return: sqlite3 connection
+        """
+
+    def get_habit_id(self, name):
+
+        """
+        This function looks up the habit_id of a habit by its name.
+
+        :param name: name of the habit
+
+        :return: habit_id of the habit or None if there is no habit with the name
+        """
+
+        return next((x[0] for x in self.get_habits() if x[1] == name), None)
+
+    def has_checkoffs(self, habit_id):
+
+        """
+        This function checks whether a habit has been checked-off at least once.
+
+        :param habit_id: habit_id of the habit
+
+        :return: True if check-offs are stored for the habit, otherwise False
+        """
+
+        return next(iter(self.get_checkoffs(habit_id)), None) is not None
+
+    def close(self):
+
+        """
+        This function closes the backend.
+        """
+
+
+class SQLiteStorage(Storage):
+
+    # Initialization of the SQLite backend
+    def __init__(self, db):
+
+        """
+        This function initializes the SQLite backend for a database connection and creates the tables once.
+
+        :param db: initialized sqlite3 database connection
+        """
+
+        self.db = db
+        self.create_tables()
+
+    def create_tables(self):
+
+        """
+        This function creates the habit and tracking tables together with the archive, rollup, run index and changelog
+        tables if the database has not been created with the current SCHEMA_VERSION yet, so that storing a habit or a
+        check-off afterwards only inserts it.
+        """
+
+        if self.db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        database.create_table_habit(self.db)
+        database.create_table_tracking(self.db)
+        self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.commit()
+
+    def add_habit(self, name, task, periodicity):
+        database.add_habit_data(self.db, name, task, periodicity, commit=not self.db.in_transaction)
+
+    def add_habits(self, habits):
+        return database.store_habits_many(self.db, list(habits))
+
+    def update_habit(self, name, task=None, periodicity=None, effective_from=None):
+        if periodicity is None:
+            database.update_habit_task(self.db, task, name)
+        elif task is None:
+            database.update_habit_periodicity(self.db, periodicity, name, effective_from)
+        else:
+            database.update_habit(self.db, task, periodicity, name, effective_from)
+
+    def delete_habit(self, name):
+        database.delete_habit_data(self.db, name)
+
+    def delete_tracking(self, name):
+        database.delete_tracking_data(self.db, name)
+
+    def delete_all(self):
+        database.delete_all_habit_tracking_data(self.db)
+
+    def get_habits(self):
+        return database.get_habit_data(self.db)
+
+    def add_checkoff(self, habit_id, date):
+        database.tracking_habit(self.db, habit_id, date, commit=not self.db.in_transaction)
+
+    def add_checkoffs(self, checkoffs):
+
+        """
+        This function stores many check-offs in one transaction (see store_checkoffs).
+
+        :param checkoffs: iterable of tuples of habit id and check-off datetime
+        """
+
+        store_checkoffs(self.db, list(checkoffs))
+
+    def get_checkoffs(self, habit_id=None):
+        cur = self.db.cursor()
+        source = database.get_tracking_source(self.db, habit_id=habit_id)
+        query = "SELECT habit_tracker_id, checkoff_date FROM " + source
+        if habit_id is None:
+            cur.execute(query + " ORDER BY habit_tracker_id, checkoff_date")
+        else:
+            cur.execute(query + " WHERE habit_tracker_id = ? ORDER BY checkoff_date", (int(habit_id),))
+        archive = ((x[0], database.format_checkoff(day, minutes)) for x in database.get_archive_blobs(self.db, habit_id)
+                   for day, minutes, count in compression.decode_checkoffs(x[2]) for _ in range(count))
+        return heapq.merge(archive, cur)
+
+    def read(self):
+        return self.db
+
+    def close(self):
+        self.db.close()
+
+
+class MemoryStorage(Storage):
+
+    # Initialization of the in-memory backend
+    def __init__(self):
+
+        """
+        This function initializes an empty in-memory backend. All changes are applied as records (see apply), so that
+        they can be logged (see LogStorage). The changes not yet copied into the in-memory database are collected in
+        changes (see read); refill is set if the in-memory database has to be filled from scratch instead.
+        """
+
+        self.habits = {}
+        self.history = {}
+        self.checkoffs = {}
+        self.next_id = 1
+        self.version = 0
+        self.changes = []
+        self.refill = True
+        self.db = sqlite3.connect(":memory:")
+        database.create_table_habit(self.db)
+        database.create_table_tracking(self.db)
+        database.drop_changelog_triggers(self.db)  # the in-memory database is refilled, not changed
+
+    # Functions for storing, modifying and deleting habits
+    def add_habit(self, name, task, periodicity):
+        self.apply({"op": "add_habit", "habit_id": self.next_id, "name": name, "task": task,
+                    "periodicity": Schedule.parse(periodicity).label(), "date": str(datetime.datetime.today())})
+
+    def add_habits(self, habits):
+
+        """
+        This function stores many new habits as one record (see Storage.add_habits). No record is applied if none of
+        the habits can be stored.
+
+        :param habits: list of tuples of name, task and periodicity of the new habits
+
+        :return: List of the names of the habits which have not been stored as a habit with the name already exists
+        """
+
+        date = str(datetime.datetime.today())
+        habits, conflicts = database.split_new_habits(habits, (x[1] for x in self.habits.values()))
+        if habits:
+            self.apply({"op": "add_habits", "habits": [{"habit_id": self.next_id + i, "name": name, "task": task,
+                                                        "periodicity": schedule.label(), "date": date}
+                                                       for i, (name, task, schedule) in enumerate(habits)]})
+        return conflicts
+
+    def update_habit(self, name, task=None, periodicity=None, effective_from=None):
+        date = datetime.datetime.today()
+        self.apply({"op": "update_habit", "name": name, "task": task,
+                    "periodicity": None if periodicity is None else Schedule.parse(periodicity).label(),
+                    "effective_from": str(effective_from or date)[:10], "date": str(date)})
+
+    def delete_habit(self, name):
+        self.apply({"op": "delete_habit", "name": name})
+
+    def delete_tracking(self, name):
+        self.apply({"op": "delete_tracking", "name": name})
+
+    def delete_all(self):
+        self.apply({"op": "delete_all"})
+
+    def get_habits(self):
+        return [(x[0], x[1], x[2], x[3], x[4][:16], x[5][:16]) for x in self.habits.values()]
+
+    # Functions for storing and reading check-offs
+    def add_checkoff(self, habit_id, date):
+        self.apply({"op": "add_checkoffs", "checkoffs": [[int(habit_id), str(date)]]})
+
+    def add_checkoffs(self, checkoffs):
+
+        """
+        This function stores many check-offs as one record.
+
+        :param checkoffs: iterable of tuples of habit id and check-off datetime
+        """
+
+        self.apply({"op": "add_checkoffs", "checkoffs": [[int(x), str(y)] for x, y in checkoffs]})
+
+    def get_checkoffs(self, habit_id=None):
+        if habit_id is not None:
+            return [(int(habit_id), x) for x in self.checkoffs.get(int(habit_id), [])]
+        return [(x, y) for x in sorted(self.checkoffs) for y in self.checkoffs[x]]
+
+    # Functions for applying the records of changes
+    def apply(self, record):
+
+        """
+        This function applies one change to the habits and check-offs in memory.
+
+        :param record: dictionary of the operation ("op") and its arguments
+        """
+
+        getattr(self, "apply_" + record["op"])(record)
+        self.version += 1
+
+    def apply_add_habit(self, record):
+        self.habits[record["habit_id"]] = [record["habit_id"], record["name"], record["task"], record["periodicity"],
+                                           record["date"], record["date"],
+                                           Schedule.parse(record["periodicity"], day_ordinal(record["date"]))]
+        self.next_id = max(self.next_id, record["habit_id"] + 1)
+        self.mirror("habit", record["habit_id"], True)
+
+    def apply_add_habits(self, record):
+        for habit in record["habits"]:
+            self.apply_add_habit(habit)
+
+    def apply_update_habit(self, record):
+        for habit in [x for x in self.habits.values() if x[1] == record["name"]]:
+            if record["task"] is not None:
+                habit[2] = record["task"]
+            if record["periodicity"] is not None:
+                schedule = database.modified_schedule(habit[6], record["periodicity"], record["effective_from"])
+                self.change_schedule(habit[0], habit[6], schedule, record["effective_from"])
+                habit[3], habit[6] = schedule.label(), schedule
+            habit[5] = record["date"]
+            self.mirror("habit", habit[0], record["periodicity"] is not None)
+
+    def change_schedule(self, habit_id, previous, schedule, day):
+
+        """
+        This function is a support function storing a modified periodicity in the schedule history of a habit in the
+        same way as database.record_schedule_change.
+
+        :param habit_id: habit_id of the habit
+        :param previous: schedule (periodicity.Schedule) of the habit before the modification
+        :param schedule: new schedule (periodicity.Schedule) of the habit
+        :param day: first day (YYYY-MM-DD) of the new schedule
+        """
+
+        history = self.history.setdefault(habit_id, [])
+        if not history:
+            if schedule == previous:
+                return
+            history.append(("0001-01-01", previous))
+        history[:] = [x for x in history if x[0] < day]
+        if not history or history[-1][1] != schedule:
+            history.append((day, schedule))
+
+    def apply_delete_habit(self, record):
+        for habit_id in [x[0] for x in self.habits.values() if x[1] == record["name"]]:
+            del self.habits[habit_id]
+            self.history.pop(habit_id, None)
+            self.mirror("habit", habit_id, True)
+
+    def apply_delete_tracking(self, record):
+        for habit_id in [x[0] for x in self.habits.values() if x[1] == record["name"]]:
+            self.checkoffs.pop(habit_id, None)
+            self.mirror("delete_tracking", record["name"])
+
+    def apply_delete_all(self, record):
+        self.habits.clear()
+        self.history.clear()
+        self.checkoffs.clear()
+        self.changes.clear()
+        self.refill = True
+
+    def apply_add_checkoffs(self, record):
+        for habit_id, date in record["checkoffs"]:
+            bisect.insort(self.checkoffs.setdefault(habit_id, []), date)
+        self.mirror("checkoffs", record["checkoffs"])
+
+    def mirror(self, *change):
+
+        """
+        This function is a support function noting a change which has to be copied into the in-memory database by the
+        next read, unless the in-memory database is filled from scratch anyway.
+
+        :param change: name of the change followed by its arguments (see read_<name>)
+        """
+
+        if not self.refill:
+            self.changes.append(change)
+
+    # Functions for the analysis functions
+    def read(self):
+
+        """
+        This function returns the in-memory database after copying the changes since it was last read into it, in one
+        transaction. Only the changed habits and the new or deleted check-offs are copied, so that the cost of a read
+        after a check-off does not grow with the number of stored check-offs. The in-memory database is only filled
+        from scratch at the first read and after all data has been deleted. The rollup tables are filled by the
+        triggers of the tracking table, the run index is updated like in the database file.
+
+        :return: sqlite3 connection of the in-memory database
+        """
+
+        if not self.refill and not self.changes:
+            return self.db
+        with self.db:
+            if self.refill:
+                self.read_all()
+            for change in self.changes:
+                getattr(self, "read_" + change[0])(*change[1:])
+        self.changes.clear()
+        self.refill = False
+        return self.db
+
+    def read_all(self):
+
+        """
+        This function is a support function filling the in-memory database from scratch with all habits and
+        check-offs and rebuilding the run index (see database.rebuild_habit_runs).
+        """
+
+        database.delete_all_habit_tracking_data(self.db, commit=False)
+        for habit_id in self.habits:
+            self.read_habit(habit_id, False)
+        self.db.executemany("INSERT INTO tracking(habit_tracker_id, checkoff_date) VALUES(?, ?)",
+                            self.get_checkoffs())
+        database.rebuild_habit_runs(self.db, commit=False)
+
+    def read_habit(self, habit_id, rebuild):
+
+        """
+        This function is a support function copying the current state of one habit and its schedule history into the
+        in-memory database, or deleting it there if the habit has been deleted.
+
+        :param habit_id: habit_id of the habit
+        :param rebuild: whether the schedule of the habit has changed, so that its run index has to be rebuilt
+        """
+
+        cur = self.db.cursor()
+        cur.execute("DELETE FROM habit_schedule_history WHERE habit_id = ?", (habit_id,))
+        cur.execute("DELETE FROM habit WHERE habit_id = ?", (habit_id,))
+        if habit_id not in self.habits:
+            cur.execute("DELETE FROM habit_runs WHERE habit_id = ?", (habit_id,))
+            return
+        _, name, task, periodicity, creation_date, update_date, schedule = self.habits[habit_id]
+        cur.execute("INSERT INTO habit VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (habit_id, name, task, periodicity, creation_date, update_date)
+                    + database.schedule_columns(schedule))
+        cur.executemany("INSERT INTO habit_schedule_history VALUES(?, ?, ?, ?, ?, ?, ?)",
+                        [(habit_id, x[0], x[1].label()) + database.schedule_columns(x[1])
+                         for x in self.history.get(habit_id, [])])
+        if rebuild:
+            database.rebuild_habit_runs(self.db, habit_id, commit=False)
+
+    def read_delete_tracking(self, name):
+
+        """
+        This function is a support function deleting the check-offs of a habit from the in-memory database (see
+        database.delete_tracking_data).
+
+        :param name: name of the habit
+        """
+
+        database.delete_tracking_data(self.db, name, commit=False)
+
+    def read_checkoffs(self, checkoffs):
+
+        """
+        This function is a support function inserting new check-offs into the in-memory database and updating the run
+        index of their habits: a single check-off updates the run of its period (see database.update_habit_runs), many
+        check-offs of a habit rebuild its runs from the earliest new check-off on.
+
+        :param checkoffs: list of habit id and check-off datetime of the new check-offs
+        """
+
+        self.db.executemany("INSERT INTO tracking(habit_tracker_id, checkoff_date) VALUES(?, ?)", checkoffs)
+        if len(checkoffs) == 1:
+            database.update_habit_runs(self.db, checkoffs[0][0], checkoffs[0][1])
+            return
+        first = {}
+        for habit_id, date in checkoffs:
+            first[habit_id] = min(first.get(habit_id, date), date)
+        for habit_id, date in first.items():
+            database.rebuild_habit_runs(self.db, habit_id, commit=False, start=date)
+
+    def close(self):
+        self.db.close()
+
+
+class LogStorage(MemoryStorage):
+
+    # Initialization of the log file backend
+    def __init__(self, name="main.log", sync=False):
+
+        """
+        This function initializes the log file backend by replaying all changes of the log file (if it exists). A last
+        line which has not been written completely (e.g. after a crash) is removed from the log file, an incomplete
+        line before the last line raises a ValueError.
+
+        :param name: name of the log file
+        :param sync: whether each change should be written to disk (os.fsync) before apply returns
+        """
+
+        super().__init__()
+        self.name = name
+        self.sync = sync
+        offset = 0
+        try:
+            with open(name, "rb") as log:
+                for number, line in enumerate(log, 1):
+                    try:
+                        record = json.loads(line) if line.strip() else None
+                    except ValueError:
+                        record = line
+                    if isinstance(record, bytes) or not line.endswith(b"\n"):
+                        if log.read(1):
+                            raise ValueError(f"Line {number} of the log file {name} is not a complete change")
+                        break
+                    if record is not None:
+                        super().apply(record)
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+        else:
+            if offset < os.path.getsize(name):
+                os.truncate(name, offset)
+        self.log = open(name, "a", encoding="utf-8")
+
+    def apply(self, record):
+
+        """
+        This function applies one change to the habits and check-offs in memory and appends it to the log file. The
+        change is applied first, so that a change which cannot be applied is never logged.
+
+        :param record: dictionary of the operation ("op") and its arguments
+        """
+
+        line = json.dumps(record) + "\n"
+        super().apply(record)
+        self.log.write(line)
+        self.log.flush()
+        if self.sync:
+            os.fsync(self.log.fileno())
+
+    def close(self):
+        self.log.close()
+        super().close()
+
+
+# Support function for storing many check-offs in the database
+@database.retry_locked
+def store_checkoffs(db, checkoffs):
+
+    """
+    This function stores many check-offs in the table "tracking" in one transaction, which is retried as a whole if the
+    database stays locked (see database.retry_locked).
+
+    :param db: initialized sqlite3 database connection
+    :param checkoffs: list of tuples of habit id and check-off datetime
+    """
+
+    for habit_id, date in checkoffs:
+        database.tracking_habit(db, habit_id, date, commit=False)
+    db.commit()
+
+
+# Support functions for selecting a backend
+def open_storage(backend="sqlite", name="main.db", timeout=database.BUSY_TIMEOUT):
+
+    """
+    This function opens a storage backend.
+
+    :param backend: "sqlite", "memory" or "log" (see BACKENDS); a ValueError is raised for any other backend
+    :param name: name of the database file (sqlite) or of the log file (log)
+    :param timeout: time in seconds a write waits for a lock held by another connection (sqlite, see database.get_db)
+
+    :return: Storage backend
+    """
+
+    if backend == "sqlite":
+        return SQLiteStorage(database.get_db(name, timeout))
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "log":
+        return LogStorage(name)
+    raise ValueError(f"Unknown storage backend {backend}")
+
+
+def get_storage(db):
+
+    """
+    This function returns the storage backend of a database connection or storage backend.
+
+    :param db: initialized sqlite3 database connection or storage backend
+
+    :return: Storage backend
+    """
+
+    return db if isinstance(db, Storage) else SQLiteStorage(db)
+
+
+def reader(function):
+
+    """
+    This function is a decorator for the analysis functions which allows passing a storage backend instead of a
+    database connection: the function reads from the connection returned by the backend (see Storage.read).
+
+    :param function: function whose first argument is a database connection
+    """
+
+    @functools.wraps(function)
+    def wrapper(db, *args, **kwargs):
+        return function(db.read() if isinstance(db, Storage) else db, *args, **kwargs)
+    return wrapper
@@ -1,9 +1,27 @@
 
 from database import get_db, add_habit_data, tracking_habit, create_table_tracking, create_table_habit, \
-    get_habit_data, get_tracking_data, delete_all_habit_tracking_data
-from analyse import all_habits, all_habits_periodicity, max_streak, max_streak_habit
-from habits import Habit
+    get_habit_data, get_tracking_data, delete_all_habit_tracking_data, delete_tracking_data, backfill_rollups, \
+    enable_tracking_dedup, delete_checkoff, rebuild_habit_runs, get_habit_runs, update_habit_periodicity, \
+    archive_tracking_data, get_archive_tables, get_tracking_source, compress_archive, backup_db, restore_db, \
+    verify_db, get_tracking_days, get_tracking_day_chunks, TRACKING_ROW_BYTES, get_changelog_seq, changes_since, \
+    compact_changelog, update_habit_task, get_habit_schedule_by_id, retry_locked, get_compressed_checkoffs
+from analyse import all_habits, all_habits_periodicity, max_streak, max_streak_habit, current_streaks, \
+    habits_at_risk, completion_rate, weekday_distribution, monthly_heatmap, streak_runs_habit, streak_profile, \
+    streak_on_date, runs_longer_than, top_runs, habits_page, top_streaks
+import analyse
+from habits import Habit, HABIT_TEMPLATES
+from writer import BufferedWriter
+from periodicity import Schedule, periods, streak_runs
+from compression import encode_checkoffs, decode_checkoffs, decode_days
+from render import print_table, print_frame
+from replica import ReadReplica
+from storage import SQLiteStorage, MemoryStorage, LogStorage
+from scheduler import Scheduler
 import datetime
+import queue
+import sqlite3
+import threading
+import pytest
 
 
 class TestHabit:
@@ -99,6 +117,707 @@ class TestHabit:
         data = max_streak_habit(self.db, name)
         assert int(data['streak_cum_count']) == 4
 
+    def test_current_streaks(self):
+        # Testing "Current run streaks" on the last day of the tracking data (Tuesday)
+        data = current_streaks(self.db, datetime.date(2021, 11, 30))
+        streaks = dict(zip(data['name'], data['current_streak']))
+        assert streaks == {"Studying": 4, "Jogging": 0, "Cleaning": 1, "Waking up": 0, "Doing Workout": 1}
+
+        # Testing "Habits at risk": weekly habits with a streak which have not been checked-off this week yet
+        data = habits_at_risk(self.db, datetime.date(2021, 11, 30))
+        assert sorted(data['name']) == ["Cleaning", "Studying"]
+        assert set(data['deadline']) == {"2021-12-05"}
+
+        # A daily habit checked-off yesterday is at risk today
+        data = habits_at_risk(self.db, datetime.date(2021, 12, 1))
+        assert "Doing Workout" in list(data['name'])
+
+    def test_rollups(self):
+        # Testing "Completion rate" for November 2021 (30 days, 5 weeks from Monday 2021-11-01)
+        data = completion_rate(self.db, datetime.date(2021, 11, 1), datetime.date(2021, 11, 30))
+        rates = dict(zip(data['name'], zip(data['completed'], data['periods'])))
+        assert rates["Doing Workout"] == (22, 30)
+        assert rates["Studying"] == (4, 5)
+
+        # Testing "Check-offs per weekday"
+        data = weekday_distribution(self.db)
+        assert data.loc["Waking up"].sum() == 15
+        assert data.loc["Waking up", "Wed"] == 3
+
+        # Testing "Monthly calendar": 2021-11-03 (Wednesday of the first week) has two check-offs of "Waking up"
+        data = monthly_heatmap(self.db, "Waking up", 2021, 11)
+        assert data.loc[0, "Wed"] == 2
+        assert data.loc[4, "Tue"] == 0
+        assert monthly_heatmap(self.db, "Knitting", 2021, 11) == "There is no tracking data available for the habit " \
+                                                                  "Knitting"
+
+        # Deleting tracking data keeps the rollups in sync, rebuilding them from scratch gives the same result
+        delete_tracking_data(self.db, "Waking up")
+        data = weekday_distribution(self.db)
+        assert data.loc["Waking up"].sum() == 0
+        before = completion_rate(self.db, datetime.date(2021, 11, 1), datetime.date(2021, 11, 30))
+        backfill_rollups(self.db)
+        after = completion_rate(self.db, datetime.date(2021, 11, 1), datetime.date(2021, 11, 30))
+        assert before.equals(after)
+
+    def test_tracking_dedup(self):
+        tracking_habit(self.db, 4, "2021-11-30 21:00")
+        before = weekday_distribution(self.db)
+        streak = int(max_streak(self.db)['streak_cum_count'].iloc[0])
+        # 53 check-offs of which 7 are repeated within the same day (daily) or week (weekly) are compacted
+        assert enable_tracking_dedup(self.db) == 7
+        assert len(get_tracking_data(self.db)) == 46
+        assert int(max_streak(self.db)['streak_cum_count'].iloc[0]) == streak
+        # Check-offs of weekly habits are counted on the first day of the week, the totals per habit stay the same
+        assert weekday_distribution(self.db).sum(axis=1).equals(before.sum(axis=1))
+
+        # Repeated check-offs within the same period are merged into the existing row, which keeps its checkoff date
+        tracking_habit(self.db, 4, "2021-11-30 05:00")
+        tracking_habit(self.db, 1, "2021-11-24 10:00")
+        tracking_habit(self.db, 1, "2021-11-20 10:00")
+        assert len(get_tracking_data(self.db)) == 46
+        row = self.db.execute("SELECT checkoff_date, checkoff_count, last_checkoff_date FROM tracking "
+                              "WHERE habit_tracker_id = 4 AND period_key = '2021-11-30'").fetchone()
+        assert row == ("2021-11-30 21:00", 2, "2021-11-30 21:00")
+        assert weekday_distribution(self.db).loc["Waking up", "Tue"] == before.loc["Waking up", "Tue"] + 1
+        assert weekday_distribution(self.db).loc["Studying"].sum() == before.loc["Studying"].sum() + 2
+
+        # Modifying the periodicity merges the check-offs into the periods of the new schedule
+        update_habit_periodicity(self.db, "weekly", "Waking up", "2021-11-01")
+        rows = self.db.execute("SELECT period_key, checkoff_date, checkoff_count FROM tracking "
+                               "WHERE habit_tracker_id = 4 ORDER BY checkoff_date").fetchall()
+        assert [x[0] for x in rows] == ["2021-11-01", "2021-11-08", "2021-11-15", "2021-11-22", "2021-11-29"]
+        assert rows[0][1] == "2021-11-03 19:27" and sum(x[2] for x in rows) == 17
+        assert weekday_distribution(self.db).loc["Waking up"].sum() == 17
+        assert int(max_streak_habit(self.db, "Waking up")['streak_cum_count'].iloc[0]) == 5
+
+        # Periods completed by check-offs on several days keep one row per day
+        add_habit_data(self.db, "Swimming", "Swim at least 1 km", "3 times per week")
+        for date in ("2021-11-29 07:00", "2021-11-29 19:00", "2021-11-30 07:00", "2021-12-01 07:00"):
+            tracking_habit(self.db, 6, date)
+        assert self.db.execute("SELECT period_key, checkoff_count FROM tracking WHERE habit_tracker_id = 6 "
+                               "ORDER BY checkoff_date").fetchall() == [("2021-11-29", 2), ("2021-11-30", 1),
+                                                                        ("2021-12-01", 1)]
+        assert int(max_streak_habit(self.db, "Swimming")['streak_cum_count'].iloc[0]) == 1
+
+        # A repeated check-off within an archived period is added to the archived row, tracking ids are not reused
+        last_id = self.db.execute("SELECT MAX(tracking_id) FROM tracking").fetchone()[0]
+        total = weekday_distribution(self.db).loc["Jogging"].sum()
+        archive_tracking_data(self.db, "2021-12-02")
+        tracking_habit(self.db, 2, "2021-11-20 10:00")
+        assert self.db.execute("SELECT checkoff_date, checkoff_count, last_checkoff_date FROM tracking_all "
+                               "WHERE habit_tracker_id = 2 AND checkoff_date >= '2021-11-15' "
+                               "AND checkoff_date < '2021-11-22'").fetchall() == [("2021-11-19 20:15", 3,
+                                                                                   "2021-11-21 08:24")]
+        compress_archive(self.db)
+        tracking_habit(self.db, 2, "2021-11-21 10:00")
+        tracking_habit(self.db, 2, "2021-12-06 10:00")
+        assert self.db.execute("SELECT tracking_id FROM tracking").fetchone()[0] == last_id + 1
+        assert weekday_distribution(self.db).loc["Jogging"].sum() == total + 3
+        assert self.db.execute("SELECT checkoff_count FROM tracking_archive_summary WHERE habit_id = 2").fetchone()[0] \
+            == total + 2
+
+    def test_buffered_writer(self):
+        # Testing the group commit of pending check-offs and habits
+        writer = BufferedWriter("test.db", max_batch=50, max_delay=1)
+        writer.add_habit_data("Reading", "Read at least 20 pages", "daily")
+        for day in range(1, 101):
+            writer.tracking_habit(6, datetime.datetime(2021, 12, 1) + datetime.timedelta(days=day))
+        writer.flush()
+        assert len(get_habit_data(self.db)) == 6
+        assert len(list(filter(lambda x: x[0] == 6, get_tracking_data(self.db)))) == 100
+        assert writer.commits <= 3
+
+        # Testing backpressure and the closed writer
+        writer.close()
+        with pytest.raises(ValueError):
+            writer.tracking_habit(6, "2022-01-01 10:00")
+        self.db.execute("BEGIN IMMEDIATE")  # lets the writer wait for the database lock with its first check-off
+        writer = BufferedWriter("test.db", max_batch=1, max_queue=1)
+        writer.tracking_habit(6, "2022-01-01 10:00")
+        writer.tracking_habit(6, "2022-01-02 10:00")
+        with pytest.raises(queue.Full):
+            writer.tracking_habit(6, "2022-01-03 10:00", timeout=0.01)
+        # A producer waiting for space in the queue does not block the other producers
+        blocked = threading.Thread(target=writer.tracking_habit, args=(6, "2022-01-03 10:00"))
+        blocked.start()
+        with pytest.raises(queue.Full):
+            writer.tracking_habit(6, "2022-01-04 10:00", timeout=0.01)
+        self.db.rollback()
+        writer.close()
+        blocked.join()
+        assert len(list(filter(lambda x: x[0] == 6, get_tracking_data(self.db)))) == 103
+
+        # Writes racing with close() are either committed or rejected
+        writer = BufferedWriter("test.db", max_batch=10)
+        accepted = []
+
+        def produce(day):
+            try:
+                writer.tracking_habit(6, datetime.datetime(2022, 2, 1) + datetime.timedelta(days=day))
+                accepted.append(day)
+            except ValueError:
+                pass
+        threads = [threading.Thread(target=produce, args=(x,)) for x in range(50)]
+        for thread in threads:
+            thread.start()
+        writer.close()
+        for thread in threads:
+            thread.join()
+        assert len(list(filter(lambda x: x[0] == 6, get_tracking_data(self.db)))) == 103 + len(accepted)
+
+        # A database which cannot be opened raises the error instead of blocking flush()
+        writer = BufferedWriter("missing/test.db")
+        with pytest.raises(sqlite3.OperationalError):
+            writer.tracking_habit(6, "2022-01-04 10:00")
+            writer.flush()
+        with pytest.raises(sqlite3.OperationalError):
+            writer.close()
+
+    def test_locked_writes(self, monkeypatch):
+        # Testing the retries of a check-off while another connection holds the write lock
+        locked = threading.Event()
+
+        def hold_lock(seconds):
+            other = get_db("test.db")
+            other.execute("BEGIN IMMEDIATE")
+            locked.set()
+            threading.Event().wait(seconds)
+            other.rollback()
+            other.close()
+
+        db = get_db("test.db", timeout=0.01)
+        thread = threading.Thread(target=hold_lock, args=(0.2,))
+        thread.start()
+        locked.wait()
+        tracking_habit(db, 5, "2021-11-16 21:30")
+        thread.join()
+        assert len(list(filter(lambda x: x[0] == 5, get_tracking_data(self.db)))) == 24
+
+        # A group of the buffered writer is retried as a whole
+        writer = BufferedWriter("test.db", timeout=0.01)
+        locked.clear()
+        thread = threading.Thread(target=hold_lock, args=(0.2,))
+        thread.start()
+        locked.wait()
+        writer.tracking_habit(5, "2021-11-17 21:30")
+        writer.tracking_habit(5, "2021-11-18 21:30")
+        writer.flush()
+        writer.close()
+        thread.join()
+        assert len(list(filter(lambda x: x[0] == 5, get_tracking_data(self.db)))) == 26
+
+        # A write within a transaction of the caller is not retried, also if commit=False is passed by position
+        calls = []
+
+        @retry_locked
+        def write(connection, value, commit=True):
+            calls.append(value)
+            raise sqlite3.OperationalError("database is locked")
+        with pytest.raises(sqlite3.OperationalError):
+            write(db, 1, False)
+        assert calls == [1]
+
+        # Testing that the write fails once the retries are used up
+        monkeypatch.setattr("database.LOCK_RETRIES", 1)
+        locked.clear()
+        thread = threading.Thread(target=hold_lock, args=(0.5,))
+        thread.start()
+        locked.wait()
+        with pytest.raises(sqlite3.OperationalError):
+            add_habit_data(db, "Reading", "Read at least 20 pages", "daily")
+        thread.join()
+        assert not db.in_transaction and len(get_habit_data(self.db)) == 5
+        db.close()
+
+    def test_read_replica(self):
+        # Testing analyses read from the in-memory copy of the database
+        replica = ReadReplica("test.db")
+        assert max_streak(replica.read()).equals(max_streak(self.db)) and not replica.changed()
+
+        # Testing the incremental refresh after new check-offs and a new habit
+        tracking_habit(self.db, 4, "2021-11-22 05:10")
+        add_habit_data(self.db, "Reading", "Read at least 20 pages", "daily")
+        tracking_habit(self.db, 6, "2021-11-22 21:00")
+        assert replica.changed()
+        assert replica.read().execute("SELECT COUNT(*) FROM habit").fetchone()[0] == 6
+        assert replica.incremental_refreshes == 1 and replica.full_refreshes == 1
+        assert max_streak(replica.read()).equals(max_streak(self.db))
+        assert completion_rate(replica.read(), datetime.date(2021, 11, 1), datetime.date(2021, 11, 28)).equals(
+            completion_rate(self.db, datetime.date(2021, 11, 1), datetime.date(2021, 11, 28)))
+
+        # Testing the incremental refresh after deleted check-offs
+        delete_checkoff(self.db, 4, "2021-11-08")
+        assert streak_runs_habit(replica.read(), "Waking up").equals(streak_runs_habit(self.db, "Waking up"))
+        assert replica.incremental_refreshes == 2 and replica.full_refreshes == 1
+
+        # Testing the full refresh after the changelog has been compacted past the last refresh
+        tracking_habit(self.db, 4, "2021-11-23 05:10")
+        compact_changelog(self.db, get_changelog_seq(self.db))
+        assert max_streak(replica.read()).equals(max_streak(self.db))
+        assert replica.full_refreshes == 2
+        replica.close()
+
+    def test_schedule_history(self):
+        # Testing that the check-offs before a modified periodicity keep counting with the former periodicity
+        update_habit_periodicity(self.db, "weekly", "Waking up", "2021-11-10")
+        runs = get_habit_runs(self.db, habit_id=4)
+        assert [x[3:] for x in runs] == [("2021-11-02", "2021-11-08", 7), ("2021-11-10", "2021-11-28", 3)]
+        assert list(streak_runs_habit(self.db, "Waking up")['streak_cum_count']) == [7, 3]
+        assert len(list(filter(lambda x: x[0] == 4, get_tracking_data(self.db)))) == 15
+
+        # Testing a run continuing across the modification and the check-offs after it
+        update_habit_periodicity(self.db, "weekly", "Waking up", "2021-11-06")
+        assert [x[3:] for x in get_habit_runs(self.db, habit_id=4)] == [("2021-11-02", "2021-11-28", 8)]
+        tracking_habit(self.db, 4, "2021-11-29 05:10")
+        assert [x[3:] for x in get_habit_runs(self.db, habit_id=4)] == [("2021-11-02", "2021-12-05", 9)]
+        rebuild_habit_runs(self.db)
+        assert [x[3:] for x in get_habit_runs(self.db, habit_id=4)] == [("2021-11-02", "2021-12-05", 9)]
+        df = current_streaks(self.db, datetime.date(2021, 11, 30))
+        assert df.loc[df['name'] == "Waking up"].values.tolist() == [["Waking up", "weekly", 9, False, "2021-12-05"]]
+
+    def test_storage_backends(self, tmp_path):
+        # The same habits and check-offs give the same analyses with each storage backend
+        def analyses(store):
+            as_of = datetime.date(2021, 11, 30)
+            return ([x[1:4] for x in store.get_habits()], list(store.get_checkoffs(4)),
+                    max_streak(store).values.tolist(), analyse.streak_runs(store).values.tolist(),
+                    current_streaks(store, as_of).values.tolist(),
+                    completion_rate(store, datetime.date(2021, 11, 1), as_of).values.tolist(),
+                    weekday_distribution(store).values.tolist())
+        stores = [SQLiteStorage(self.db), MemoryStorage(), LogStorage(str(tmp_path / "habits.log"))]
+        for store in stores[1:]:
+            for habit_id, name, task, periodicity, _, _ in stores[0].get_habits():
+                Habit(name, task, periodicity).store_habit(store)
+            store.add_checkoffs(stores[0].get_checkoffs())
+        for store in stores:
+            Habit("Reading", "Read at least 20 pages", "3 times per week").store_habit(store)
+            Habit.check_off_habit(store, "Reading", "2021-11-29 21:00")
+            store.update_habit("Waking up", periodicity="weekly", effective_from="2021-11-10")
+            Habit("Cleaning", "null", "null").delete_tracking_data(store)
+            assert not store.has_checkoffs(3) and store.get_habit_id("Reading") == 6
+        expected = analyses(stores[0])
+        assert expected[1][0] == (4, "2021-11-02 05:04") and len(expected[3]) == 9
+        assert all(analyses(x) == expected for x in stores[1:])
+
+        # The log file is replayed when it is opened again, also after a change has been torn by a crash
+        stores[2].close()
+        path = tmp_path / "habits.log"
+        with open(path, "a", encoding="utf-8") as log:
+            log.write('{"op": "add_checkoffs", "checkoffs": [[4, "2021-11-')
+        store = LogStorage(str(path))
+        assert analyses(store) == expected and path.read_text(encoding="utf-8").endswith("}\n")
+        size = path.stat().st_size
+        with pytest.raises(AttributeError):
+            store.apply({"op": "rename_habit"})
+        assert path.stat().st_size == size
+
+        # Testing that a check-off of the SQLite backend only inserts it within the transaction of the caller
+        statements = []
+        self.db.set_trace_callback(statements.append)
+        self.db.execute("BEGIN")
+        SQLiteStorage(self.db).add_checkoff(6, "2021-11-30 06:00")
+        assert self.db.in_transaction and not any(x.startswith(("CREATE", "ALTER")) for x in statements)
+        self.db.rollback()
+        self.db.set_trace_callback(None)
+        assert list(stores[0].get_checkoffs(6)) == [(6, "2021-11-29 21:00")]
+
+        # Only the new check-off is copied into the in-memory database after it has been read
+        statements = []
+        store.db.set_trace_callback(statements.append)
+        Habit.check_off_habit(store, "Reading", "2021-11-30 21:00")
+        store.read()
+        assert not any(x.startswith(("DELETE FROM tracking", "INSERT INTO habit ")) for x in statements)
+        assert len(set(x for x in statements if x.startswith("INSERT INTO tracking("))) == 1
+        store.db.set_trace_callback(None)
+        assert list(store.get_checkoffs(6)) == [(6, "2021-11-29 21:00"), (6, "2021-11-30 21:00")]
+        Habit("Reading", "null", "null").delete_habit_data(store)
+        store.delete_all()
+        store.close()
+        store = LogStorage(str(tmp_path / "habits.log"))
+        assert store.get_habits() == []
+        store.close()
+
+    def test_scheduler(self):
+        # Testing the due habits and the habits due next
+        now = datetime.datetime(2021, 11, 22, 20, 0)
+        clock = [now]
+        scheduler = Scheduler(self.db, lambda: clock[0])
+        assert scheduler.due_now(now) == [(datetime.datetime(2021, 11, 23), 5, "Doing Workout"),
+                                          (datetime.datetime(2021, 11, 29), 2, "Jogging")]
+        assert [x[1] for x in scheduler.next_due(3)] == [2, 5, 4]
+        assert scheduler.next_wakeup(now) == now
+
+        # Testing the updates on check-off, creation, modification and deletion
+        Habit.check_off_habit(self.db, "Doing Workout", "2021-11-22 20:30", scheduler)
+        assert [x[1] for x in scheduler.due_now(now)] == [2]
+        habit = Habit("Reading", "Read at least 20 pages", "daily")
+        habit.store_habit(self.db, scheduler)
+        assert [x[2] for x in scheduler.due_now(now)] == ["Reading", "Jogging"]
+        update_habit_periodicity(self.db, "monthly", "Jogging", "2021-11-01")
+        scheduler.update(2)
+        assert [x[2] for x in scheduler.due_now(now)] == ["Reading"]
+        habit.delete_habit_data(self.db, scheduler)
+        assert scheduler.due_now(now) == [] and len(scheduler.entries) == 5
+
+        # Check-offs stored by another connection (e.g. another process) are taken over
+        other = get_db("test.db")
+        delete_checkoff(other, 4, "2021-11-22")
+        assert [x[2] for x in scheduler.due_now(now)] == ["Waking up"]
+        updated, update = [], scheduler.update
+        scheduler.update = lambda habit_id: updated.append(habit_id) or update(habit_id)
+        tracking_habit(other, 4, "2021-11-22 05:00")
+        assert scheduler.due_now(now) == [] and not scheduler.sync() and updated == [4]
+
+        # Testing that all habits are read again if the changelog has been compacted in the meantime
+        tracking_habit(other, 1, "2021-11-22 06:00")
+        compact_changelog(other, get_changelog_seq(other))
+        other.close()
+        assert scheduler.sync() and updated == [4] and scheduler.seq == get_changelog_seq(self.db)
+        del scheduler.update
+
+        # Testing that a missed deadline makes the habit due for its next period
+        later = clock[0] = datetime.datetime(2021, 11, 24, 8, 0)
+        assert scheduler.due_now() == [(datetime.datetime(2021, 11, 25), 4, "Waking up"),
+                                            (datetime.datetime(2021, 11, 25), 5, "Doing Workout")]
+
+        # Testing the reminder loop
+        reminders = []
+
+        def remind(habit_id, name, deadline):
+            reminders.append(name)
+            if len(reminders) == 2:
+                scheduler.stop()
+        scheduler.run(remind)
+        assert sorted(reminders) == ["Doing Workout", "Waking up"]
+
+    def test_periodicities(self):
+        # Testing the textual and structured periodicities
+        assert Schedule.parse("Every 2 days") == Schedule("every_n_days", 2)
+        assert Schedule.parse("weekdays: Mon, Wed, Fri").label() == "weekdays: Mon, Wed, Fri"
+        assert Schedule.parse(Schedule("times_per_week", 3).label()) == Schedule("times_per_week", 3)
+        with pytest.raises(ValueError):
+            Schedule.parse("fortnightly")
+        with pytest.raises(ValueError):
+            add_habit_data(self.db, "Sleeping", "Sleep", "8 times per week")
+
+        add_habit_data(self.db, "Reading", "Read at least 20 pages", "every 2 days", anchor="2021-11-01")
+        add_habit_data(self.db, "Swimming", "Swim at least 1 km", "3 times per week")
+        add_habit_data(self.db, "Budget", "Review the monthly budget", "monthly")
+        add_habit_data(self.db, "Gym", "Go to the gym", "weekdays: Mon, Wed, Fri")
+        for habit_id, date in [(6, "2021-11-01"), (6, "2021-11-04"), (6, "2021-11-05"), (6, "2021-11-09"),
+                               (7, "2021-11-01"), (7, "2021-11-02"), (7, "2021-11-04"), (7, "2021-11-08"),
+                               (7, "2021-11-08"), (7, "2021-11-10"), (7, "2021-11-15"), (7, "2021-11-17"),
+                               (7, "2021-11-19"), (7, "2021-11-23"), (7, "2021-11-24"), (7, "2021-11-27"),
+                               (8, "2021-09-30"), (8, "2021-10-15"), (8, "2021-11-02"), (8, "2022-01-05"),
+                               (9, "2021-11-01"), (9, "2021-11-03"), (9, "2021-11-06"), (9, "2021-11-08"),
+                               (9, "2021-11-12")]:
+            tracking_habit(self.db, habit_id, date + " 18:00")
+
+        # Testing "Longest run streak for a given habit" with each type of schedule
+        for name, streak in [("Reading", 3), ("Swimming", 2), ("Budget", 3), ("Gym", 4)]:
+            assert int(max_streak_habit(self.db, name)['streak_cum_count'].iloc[0]) == streak
+        assert list(max_streak_habit(self.db, "Gym")['periodicity']) == ["weekdays: Mon, Wed, Fri"]
+
+        # Testing "Current run streaks": the Saturday check-off counts for Friday, Monday is still open on Tuesday
+        data = current_streaks(self.db, datetime.date(2021, 11, 14)).set_index('name')
+        assert data.loc["Gym", "current_streak"] == 1 and not data.loc["Gym", "at_risk"]
+        data = habits_at_risk(self.db, datetime.date(2021, 11, 16)).set_index('name')
+        assert data.loc["Gym", "current_streak"] == 1 and data.loc["Gym", "deadline"] == "2021-11-16"
+
+        # The periods of N days are counted from the anchor day of the habit
+        anchor = datetime.date(2021, 11, 2).toordinal()
+        assert get_habit_schedule_by_id(self.db, 6).anchor == datetime.date(2021, 11, 1).toordinal()
+        assert Schedule("every_n_days", 3, anchor=anchor).period_start(0) == anchor
+        assert Schedule("every_n_days", 3, anchor=anchor).bucket(anchor - 1) == -1
+
+        # The same check-off days give the same runs for a daily habit; the periods are read in either order
+        days = [datetime.date(2021, 11, x).toordinal() for x in (1, 2, 2, 3, 5, 6)]
+        assert streak_runs(days, Schedule("daily")) == [(days[0], days[3]), (days[4], days[5])]
+        ascending = list(periods(days, Schedule("every_n_days", 2, anchor=days[0])))
+        assert list(periods(reversed(days), Schedule("every_n_days", 2, anchor=days[0]))) == ascending[::-1]
+
+    def test_streak_profile(self):
+        # Testing "Streak profile for a given habit": all runs of "Doing Workout" and its current run streak
+        data = streak_runs_habit(self.db, "Doing Workout")
+        assert list(data['streak_cum_count']) == [5, 13, 3, 1]
+        assert list(data['run_start'])[1] == "2021-11-08"
+        data = streak_profile(self.db, "Doing Workout", datetime.date(2021, 12, 1))
+        assert data.loc[0, ['longest_streak', 'current_streak', 'at_risk', 'runs']].tolist() == [13, 1, True, 4]
+
+        # Only the rows of the selected habit are read: the check-offs are read using the index on habit and date
+        statements = []
+        self.db.set_trace_callback(statements.append)
+        streak_profile(self.db, "Doing Workout", datetime.date(2021, 12, 1))
+        self.db.set_trace_callback(None)
+        statements = [x for x in statements if "FROM tracking WHERE habit_tracker_id" in x]
+        assert statements
+        for statement in statements:
+            assert "tracking_habit_date" in str(self.db.execute("EXPLAIN QUERY PLAN " + statement).fetchall())
+        add_habit_data(self.db, "Reading", "Read at least 20 pages", "daily")
+        assert streak_profile(self.db, "Reading") == "There is no tracking data available for the habit Reading"
+
+    def test_run_index(self):
+        # The maintained run index equals the runs calculated from the full tracking history
+        def index_runs():
+            return sorted((x[0], x[3], x[4], x[5]) for x in get_habit_runs(self.db))
+
+        def kernel_runs():
+            df = analyse.streak_runs(self.db)
+            return sorted(zip(df['habit_id'], df['run_start'], df['run_end'], df['streak_cum_count']))
+        assert index_runs() == kernel_runs()
+
+        # Checking-off the missing days merges runs, deleting a check-off splits a run
+        tracking_habit(self.db, 5, "2021-11-28 10:00")
+        tracking_habit(self.db, 5, "2021-11-29 10:00")
+        assert streak_on_date(self.db, "Doing Workout", datetime.date(2021, 11, 30)) == 6
+        assert delete_checkoff(self.db, 5, "2021-11-14") == 1
+        assert streak_on_date(self.db, "Doing Workout", datetime.date(2021, 11, 14)) == 0
+        assert streak_on_date(self.db, "Doing Workout", datetime.date(2021, 11, 20)) == 6
+        assert index_runs() == kernel_runs()
+
+        # Point-in-time and range queries
+        assert streak_on_date(self.db, "Studying", datetime.date(2021, 11, 24)) == 4
+        assert list(runs_longer_than(self.db, 3)['streak_cum_count']) == [7, 6, 6, 6, 5, 4]
+        data = top_runs(self.db, datetime.date(2021, 11, 1), datetime.date(2021, 11, 7), k=2)
+        assert list(zip(data['name'], data['streak_cum_count'])) == [("Waking up", 7), ("Doing Workout", 5)]
+
+        # Modifying the periodicity rebuilds the run index of the habit
+        update_habit_periodicity(self.db, "weekly", "Doing Workout")
+        assert index_runs() == kernel_runs()
+        rebuild_habit_runs(self.db)
+        assert index_runs() == kernel_runs()
+
+    def test_top_streaks(self):
+        # Leaderboard of the longest run of each habit, of one periodicity and of all runs
+        data = top_streaks(self.db, 3)
+        assert list(zip(data['rank'], data['name'], data['streak_cum_count'])) == \
+            [(1, "Doing Workout", 13), (2, "Waking up", 7), (3, "Studying", 4)]
+        data = top_streaks(self.db, 2, periodicity="weekly")
+        assert list(zip(data['name'], data['streak_cum_count'])) == [("Studying", 4), ("Cleaning", 2)]
+        data = top_streaks(self.db, 3, per_habit=False)
+        assert list(zip(data['name'], data['streak_cum_count'])) == \
+            [("Doing Workout", 13), ("Waking up", 7), ("Doing Workout", 5)]
+
+        # Runs as long as the last ranked run share its rank if ties are included
+        data = top_streaks(self.db, 5, per_habit=False)
+        assert list(data['streak_cum_count']) == [13, 7, 5, 4, 3] and list(data['name'])[-1] == "Doing Workout"
+        data = top_streaks(self.db, 5, per_habit=False, ties=True)
+        assert list(zip(data['rank'], data['name'], data['streak_cum_count']))[4:] == \
+            [(5, "Doing Workout", 3), (5, "Waking up", 3)]
+        data = top_streaks(self.db, 9, per_habit=False, ties=True)
+        assert list(zip(data['name'], data['run_start']))[8:] == \
+            [("Cleaning", "2021-11-22"), ("Doing Workout", "2021-11-30"), ("Jogging", "2021-11-01"),
+             ("Jogging", "2021-11-15"), ("Waking up", "2021-11-17"), ("Waking up", "2021-11-28")]
+        assert len(top_streaks(self.db, 0)) == 0
+
+        # The runs are read in the order of the run index, without sorting them
+        statements = []
+        self.db.set_trace_callback(statements.append)
+        top_streaks(self.db, 3)
+        top_streaks(self.db, 3, periodicity="weekly")
+        self.db.set_trace_callback(None)
+        statements = [x for x in statements if "habit_runs" in x]
+        assert len(statements) == 2
+        assert statements
+        for statement in statements:
+            assert "TEMP B-TREE" not in str(self.db.execute("EXPLAIN QUERY PLAN " + statement).fetchall())
+        delete_all_habit_tracking_data(self.db)
+        assert top_streaks(self.db, 3) == "There is currently no tracking data available"
+
+    def test_chunked_streak_runs(self):
+        # Reading the check-offs in small batches splits the check-offs of a habit across batches without changing
+        # the runs, also if part of the check-offs is read from the compressed archive
+        def chunked_runs(rows):
+            return analyse.streak_runs(self.db, memory_budget=rows * TRACKING_ROW_BYTES).values.tolist()
+        expected = analyse.streak_runs(self.db).values.tolist()
+        chunks = list(get_tracking_day_chunks(self.db, 4))
+        assert max(map(len, chunks)) == 4 and sum(chunks, []) == list(get_tracking_days(self.db))
+        assert all(chunked_runs(x) == expected for x in (1, 3, 4, 7, 1000))
+        archive_tracking_data(self.db, "2021-11-17")
+        compress_archive(self.db)
+        chunks = list(get_tracking_day_chunks(self.db, 5))
+        assert max(map(len, chunks)) == 5 and len(sum(chunks, [])) == 52
+        assert all(chunked_runs(x) == expected for x in (1, 2, 5, 1000))
+        # The runs can also be streamed one by one within the memory budget
+        runs = analyse.iter_streak_runs(self.db, TRACKING_ROW_BYTES)
+        assert next(runs) == expected[0] and [expected[0]] + list(runs) == expected
+        delete_all_habit_tracking_data(self.db)
+        assert analyse.streak_runs(self.db, memory_budget=1) == "No data"
+        assert list(analyse.iter_streak_runs(self.db, memory_budget=1)) == []
+
+    def test_store_habits_many(self):
+        # Many habits are stored at once, habits with existing or repeated names are reported instead
+        habits = [Habit(*x) for x in HABIT_TEMPLATES] + [Habit("Reading", "Read at least 20 pages", "daily"),
+                                                          Habit("Reading", "Read at least 30 pages", "weekly")]
+        scheduler = Scheduler(self.db, lambda: datetime.datetime(2021, 11, 22, 20, 0))
+        assert Habit.store_habits_many(self.db, habits, scheduler) == [x[0] for x in HABIT_TEMPLATES] + ["Reading"]
+        assert get_habit_data(self.db)[5][1:4] == ("Reading", "Read at least 20 pages", "daily")
+        assert [x[2] for x in scheduler.due_now()] == ["Doing Workout", "Reading", "Jogging"]
+        with pytest.raises(ValueError):
+            Habit.store_habits_many(self.db, [Habit("Writing", "Write a page", "daily"), Habit("x", "x", "hourly")])
+        store = MemoryStorage()
+        assert Habit.store_habits_many(store, habits[3:]) == ["Reading"]
+        assert Habit.store_habits_many(store, habits) == [x[0] for x in HABIT_TEMPLATES[3:]] + ["Reading", "Reading"]
+        assert [x[:4] for x in store.get_habits()] == [x[:4] for x in get_habit_data(store.read())]
+        assert len(store.get_habits()) == 6
+        version = store.version
+        assert Habit.store_habits_many(store, habits[:2]) == [x.name for x in habits[:2]] and store.version == version
+
+        # Provisioning many habits in one transaction
+        habits = [Habit(f"Habit {x}", "Check off every day", "daily") for x in range(2000)]
+        assert Habit.store_habits_many(self.db, habits + habits[:10]) == [x.name for x in habits[:10]]
+        assert len(get_habit_data(self.db)) == 2006
+
+    def test_changelog(self):
+        # Each changed habit and check-off is listed once with its latest change and current values
+        seq = get_changelog_seq(self.db)
+        assert seq == 52 and len(changes_since(self.db, 0)) == 52
+        Habit("Reading", "Read at least 20 pages", "daily").store_habit(self.db)
+        Habit.check_off_habit(self.db, "Reading", "2021-11-29 21:00")
+        update_habit_task(self.db, "Read at least 30 pages", "Reading")
+        assert delete_checkoff(self.db, 5, "2021-11-30") == 1
+        tracking_habit(self.db, 2, "2021-11-30 07:00")
+        changes = changes_since(self.db, seq)
+        assert [x[:4] for x in changes] == [(54, "tracking", "insert", 53), (56, "habit", "update", 6),
+                                            (57, "tracking", "delete", 49), (58, "tracking", "insert", 54)]
+        assert changes[0][4] == (53, 6, "2021-11-29", 1) and changes[1][4][1:4] == ("Reading", "Read at least 30 pages",
+                                                                                  "daily")
+        assert changes[2][4] is None
+        assert changes_since(self.db, seq, limit=2) == changes[:2]
+        assert changes_since(self.db, 56) == changes[2:] and changes_since(self.db, 58) == []
+
+        # Archiving check-offs does not change them, compacting keeps the latest change of each row
+        assert archive_tracking_data(self.db, "2021-11-17") == 33
+        assert get_changelog_seq(self.db) == 58
+        assert compact_changelog(self.db) == 3
+        assert changes_since(self.db, seq) == changes
+        assert compact_changelog(self.db, 56) == 53
+        assert changes_since(self.db, 56) == changes[2:]
+        with pytest.raises(ValueError):
+            changes_since(self.db, seq)
+
+        # Deleting and changing archived and compressed check-offs is recorded with their tracking ids
+        assert delete_checkoff(self.db, 1, "2021-11-01") == 1
+        compress_archive(self.db)
+        assert delete_checkoff(self.db, 1, "2021-11-06") == 1
+        assert changes_since(self.db, 58) == [(59, "tracking", "delete", 1, None), (60, "tracking", "delete", 6, None)]
+        enable_tracking_dedup(self.db)
+        seq = get_changelog_seq(self.db)
+        tracking_habit(self.db, 1, "2021-11-12 10:00")
+        tracking_habit(self.db, 2, "2021-11-30 08:00")
+        assert changes_since(self.db, seq) == [(seq + 1, "tracking", "update", 7, (7, 1, "2021-11-11", 2)),
+                                               (seq + 2, "tracking", "update", 54, (54, 2, "2021-11-30", 2))]
+        ranges = self.db.execute("SELECT min_tracking_id, max_tracking_id FROM tracking_archive_blob").fetchall()
+        assert ranges and all(x[0] <= x[1] for x in ranges)
+        assert get_compressed_checkoffs(self.db, {7, 1000}) == {7: (7, 1, "2021-11-11", 2)}
+        delete_all_habit_tracking_data(self.db)
+        changes = changes_since(self.db, 58)
+        assert len(changes) == 6 + 53 and all(x[2] == "delete" for x in changes)
+
+    def test_archive(self):
+        # Archiving the check-offs before a horizon in the middle of a week and of several runs
+        tracking_habit(self.db, 4, "2020-12-31 05:30")
+
+        def analyses():
+            as_of = datetime.date(2021, 11, 30)
+            return (list(max_streak(self.db)['streak_cum_count']), analyse.streak_runs(self.db).values.tolist(),
+                    current_streaks(self.db, as_of).values.tolist(),
+                    completion_rate(self.db, datetime.date(2021, 11, 1), as_of).values.tolist(),
+                    weekday_distribution(self.db).values.tolist(), sorted(get_tracking_data(self.db)))
+        before = analyses()
+        assert archive_tracking_data(self.db, "2021-11-17") == 34
+        assert get_archive_tables(self.db) == ["tracking_archive_2020", "tracking_archive_2021"]
+        assert self.db.execute("SELECT COUNT(*) FROM tracking").fetchone()[0] == 19
+        assert get_tracking_source(self.db, "2021-11-20") == "tracking"
+        assert get_tracking_source(self.db, "2021-11-01") == "tracking_all"
+        assert analyses() == before
+
+        # Compressing the archive tables into blobs per habit and year keeps all analyses unchanged
+        assert delete_checkoff(self.db, 4, "2020-12-31") == 1
+        before = analyses()
+        assert compress_archive(self.db) == 33
+        assert get_archive_tables(self.db) == []
+        assert analyses() == before
+        checkoffs = [(738000, 0, 1), (738001, 1439, 3), (738001, 1200, 1), (738400, 75, 1)]
+        assert list(decode_checkoffs(encode_checkoffs(checkoffs))) == sorted(checkoffs)
+        assert list(decode_days(encode_checkoffs(checkoffs), reverse=True)) == [738400, 738001, 738001, 738000]
+        checkoffs[1] = (738001, 1439, 70000)
+        assert list(decode_checkoffs(encode_checkoffs(checkoffs))) == sorted(checkoffs)
+        with pytest.raises(ValueError):
+            encode_checkoffs([(738000, 0, 2 ** 32)])
+
+        # Check-offs on both sides of the horizon still extend and split the runs crossing it, also if the archived
+        # check-offs are compressed
+        tracking_habit(self.db, 4, "2021-11-09 05:10")
+        tracking_habit(self.db, 4, "2021-11-10 05:05")
+        tracking_habit(self.db, 4, "2021-11-11 05:15")
+        assert streak_on_date(self.db, "Waking up", datetime.date(2021, 11, 13)) == 12
+        assert delete_checkoff(self.db, 4, "2021-11-05") == 1
+        assert streak_on_date(self.db, "Waking up", datetime.date(2021, 11, 13)) == 8
+        data = monthly_heatmap(self.db, "Waking up", 2021, 11)
+        assert (data.loc[1, "Tue"], data.loc[0, "Fri"], data.loc[1, "Fri"]) == (1, 0, 1)
+        rebuild_habit_runs(self.db)
+        assert streak_on_date(self.db, "Waking up", datetime.date(2021, 11, 13)) == 8
+
+        # Deleting the tracking data of a habit also deletes its archived check-offs
+        backfill_rollups(self.db)
+        assert weekday_distribution(self.db).loc["Waking up"].sum() == 17
+        delete_tracking_data(self.db, "Waking up")
+        assert 4 not in [x[0] for x in get_tracking_data(self.db)]
+        delete_all_habit_tracking_data(self.db)
+        assert get_archive_tables(self.db) == []
+        assert get_tracking_source(self.db) == "tracking"
+
+    def test_backup(self, tmp_path):
+        # Backing up the database in small steps while it is in use
+        progress = []
+        target = str(tmp_path / "backup.db")
+        pages = backup_db(self.db, target, pages=1, sleep=0, progress=lambda x, y: progress.append((x, y)))
+        assert progress[-1] == (pages, pages) and len(progress) == pages
+        assert verify_db(target) == []
+        backup = get_db(target)
+        assert sorted(get_tracking_data(backup)) == sorted(get_tracking_data(self.db))
+        backup.close()
+
+        # Restoring the backup discards the later check-offs, a damaged backup is not restored
+        tracking_habit(self.db, 4, "2021-12-01 05:00")
+        restore_db(self.db, target)
+        assert streak_on_date(self.db, "Waking up", datetime.date(2021, 11, 8)) == 7
+        assert len(get_tracking_data(self.db)) == 52
+        with open(target, "r+b") as file:
+            file.write(b"damaged")
+        assert verify_db(target) != []
+        with pytest.raises(ValueError):
+            restore_db(self.db, target)
+        assert verify_db(str(tmp_path / "missing.db")) != []
+
+    def test_paged_rendering(self):
+        # Sorting and paging of the habit list is done by the database
+        assert [x[0] for x in habits_page(self.db)] == ["Cleaning", "Doing Workout", "Jogging", "Studying", "Waking up"]
+        assert [x[0] for x in habits_page(self.db, "weekly", descending=True, limit=2, offset=1)] == \
+            ["Jogging", "Cleaning"]
+        assert [x[0] for x in habits_page(self.db, sort="periodicity", limit=2)] == ["Waking up", "Doing Workout"]
+        with pytest.raises(ValueError):
+            list(habits_page(self.db, sort="task; DROP TABLE habit"))
+
+        # The table is printed page by page with column widths taken from the first rows only
+        lines = []
+        answers = iter([True, False])
+        rows = ((x, "x" * (50 if x > 3 else 5)) for x in range(1, 100))
+        assert print_table(rows, ["Id", "Text"], page_size=2, more=lambda: next(answers), sample_size=3,
+                           output=lines.append) == 4
+        assert lines[0] == "+----+-------+" and lines[1] == "| Id | Text  |" and lines[-1] == lines[0]
+        assert lines[3:] == ["|  1 | xxxxx |", "|  2 | xxxxx |", "|  3 | xxxxx |", "|  4 | xx... |", lines[0]]
+
+        # Analysis results are printed in the same way, numbers aligned right; empty tables are replaced by a message
+        lines = []
+        assert print_frame(weekday_distribution(self.db), index=True, output=lines.append) == 5
+        assert lines[1].startswith("| name ") and lines[3].startswith("| Studying      |   2 |")
+        lines = []
+        assert print_table(habits_page(self.db, "monthly"), ["Name"], output=lines.append, empty="None") == 0
+        assert lines == ["None"]
+
     def test_habit(self):
         # Testing of habit storage
         habit = Habit("Do meditation", "At least 30 minutes each day", "daily")
@@ -0,0 +1,215 @@
+"""
+This file implements an optional buffered writer for habits and check-offs which are stored by scripts or services in
+large numbers. Instead of committing each habit or check-off on its own, the writes are put into a queue and a
+dedicated background thread stores all pending writes in one transaction (group commit). A group is committed as soon
+as it reaches the maximum batch size or the maximum delay after its first write has passed.
+
+The queue is bounded: if the background thread cannot keep up, producers are blocked until there is space in the
+queue again (backpressure). Pending writes are committed on flush(), on close() and - as long as the writer has not
+been closed - when the program exits. A write is either enqueued before the writer is closed (and then committed) or
+rejected. If the background thread cannot open the database, the error is raised by flush(), close() and every
+further write instead of blocking them. A group which cannot be committed because another process holds the database
+lock is rolled back and retried as a whole, like the single writes of the database file (see database.retry_locked).
+
+queue, threading and time are imported for the queue, the background thread and the maximum delay of a group, sqlite3
+for detecting a locked database.
+atexit is imported to commit pending writes when the program exits.
+The database file is imported for the table creation and the insert statements which are reused without their own
+commit.
+"""
+
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+
+import database
+
+
+class BufferedWriter:
+
+    # Initialization of the buffered writer
+    def __init__(self, name="main.db", max_batch=500, max_delay=0.05, max_queue=10000, timeout=database.BUSY_TIMEOUT):
+
+        """
+        This function initializes the buffered writer and starts its background thread which holds its own connection
+        to the database.
+
+        :param name: name of the database
+        :param max_batch: maximum number of writes committed in one transaction
+        :param max_delay: maximum time in seconds a write waits for further writes before its group is committed
+        :param max_queue: maximum number of pending writes before producers are blocked
+        :param timeout: time in seconds a group waits for the lock held by another connection before it is retried
+        """
+
+        self.name = name
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.error = None
+        self.closed = False
+        self.commits = 0
+        self._setup_error = None
+        self._producers = 0
+        self._lock = threading.Condition()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="habit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Functions for enqueueing writes
+    def add_habit_data(self, name, task, periodicity, timeout=None):
+
+        """
+        This function enqueues a new habit to be stored in the table "habit".
+
+        :param name: name of the habit
+        :param task: task specification of the habit
+        :param periodicity: periodicity (daily or weekly)
+        :param timeout: maximum time in seconds to wait for space in a full queue, by default no limit (queue.Full is
+        raised once the time has passed)
+        """
+
+        self._put((database.add_habit_data, (name, task, periodicity)), timeout)
+
+    def tracking_habit(self, habit_tracker_id, date_tracking, timeout=None):
+
+        """
+        This function enqueues a new check-off date to be stored in the table "tracking".
+
+        :param habit_tracker_id: habit_id of the checked-off habit
+        :param date_tracking: check-off date
+        :param timeout: maximum time in seconds to wait for space in a full queue, by default no limit (queue.Full is
+        raised once the time has passed)
+        """
+
+        self._put((database.tracking_habit, (habit_tracker_id, date_tracking)), timeout)
+
+    def _put(self, item, timeout):
+
+        """
+        This function is a support function enqueueing a write. The state of the writer is checked under the lock, but
+        the (possibly blocking) put happens outside of it, so that producers waiting for space in the queue do not
+        block each other; close() waits for these producers before it enqueues the end of the queue.
+
+        :param item: tuple of function and arguments
+        :param timeout: maximum time in seconds to wait for space in a full queue
+        """
+
+        with self._lock:
+            if self._setup_error is not None:
+                raise self._setup_error
+            if self.closed:
+                raise ValueError("The buffered writer has already been closed")
+            self._producers += 1
+        try:
+            self._queue.put(item, timeout=timeout)
+        finally:
+            with self._lock:
+                self._producers -= 1
+                self._lock.notify_all()
+
+    # Functions for committing pending writes
+    def flush(self):
+
+        """
+        This function blocks until all writes enqueued so far have been committed. If a group could not be committed,
+        the error is raised (once) and the writes of the failed group are lost.
+        """
+
+        self._queue.join()
+        if self._setup_error is not None:
+            raise self._setup_error
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+
+        """
+        This function commits all pending writes, stops the background thread and closes its database connection.
+        Calling it more than once has no effect.
+        """
+
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            atexit.unregister(self.close)
+            self._lock.wait_for(lambda: self._producers == 0)
+        self._queue.put(None)
+        self._thread.join()
+        if self._setup_error is not None:
+            raise self._setup_error
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    # Background thread collecting the pending writes into groups
+    def _run(self):
+        try:
+            db = database.get_db(self.name, self.timeout)
+            database.create_table_habit(db)
+            database.create_table_tracking(db)
+        except Exception as e:
+            self._setup_error = e
+            self._drain()
+            return
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            try:
+                self._commit(db, batch)
+                self.commits += 1
+            except Exception as e:
+                self.error = e
+            for _ in batch:
+                self._queue.task_done()
+        db.close()
+
+    def _commit(self, db, batch):
+
+        """
+        This function is a support function storing the writes of a group in one transaction. If the database is still
+        locked by another connection, the group is rolled back and retried after a growing pause (see
+        database.lock_backoff); any other error is raised after the rollback.
+
+        :param db: database connection of the background thread
+        :param batch: list of the writes (tuples of function and arguments, None for the end of the queue)
+        """
+
+        for retry in range(database.LOCK_RETRIES + 1):
+            try:
+                for item in batch:
+                    if item is not None:
+                        function, args = item
+                        function(db, *args, commit=False)
+                db.commit()
+                return
+            except Exception as e:
+                db.rollback()
+                if not isinstance(e, sqlite3.OperationalError) or retry == database.LOCK_RETRIES or \
+                        not database.is_locked_error(e):
+                    raise
+            time.sleep(database.lock_backoff(retry))
+
+    def _drain(self):
+
+        """
+        This function is a support function discarding all writes enqueued after the database could not be opened, so
+        that neither flush() nor producers waiting for space in the queue are blocked, until the writer is closed.
+        """
+
+        while True:
+            item = self._queue.get()
+            self._queue.task_done()
+            if item is None:
+                return